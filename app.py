@@ -1,9 +1,28 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
 import pandas as pd
-import numpy as np
-import joblib
-from datetime import datetime
-import matplotlib.pyplot as plt
+
+import timing
+
+from data_loader import CountyIndex, load_county_manifest, load_dataset, read_county_manifest
+from fingerprints import file_fingerprint
+from forecast_cache import ForecastCache
+from forecast_store import ForecastStore
+from forest import FOREST_DIR, load_model as load_forecasting_model
+from charts import comparison_frame, comparison_png, downsample, trajectory_png
+from forecasting import BAND_QUANTILES, FORECAST_HORIZON, MIN_HISTORY, forecast_bands
+from leaderboard import LeaderboardCache, from_store
+from reports import build_report, report_path
+from direct_model import DIRECT_FOREST_DIR, DIRECT_MODEL_PATH
+
+MODEL_PATH = 'forecasting_ev_model.pkl'
+# The preprocessed CSV, or ingest.py's State/County-partitioned dataset directory;
+# EV_DATASET_STATES (comma-separated) loads only those states' rows
+DATA_PATH = os.environ.get('EV_DATASET_DIR') or 'preprocessed_ev_data.csv'
+DATA_STATES = sorted(filter(None, os.environ.get('EV_DATASET_STATES', '').replace(' ', '').split(','))) or None
+# Serve the precomputed table from build_forecasts.py instead of running the model
+FORECAST_ARTIFACT = os.environ.get('EV_FORECAST_ARTIFACT')
 
 # Set Streamlit page config first thing
 st.set_page_config(
@@ -13,12 +32,86 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# === Load model ===
+# Timing spans for this script run (see timing.py; EV_APP_PROFILE / EV_APP_METRICS_DIR).
+# The session keeps the run so the next rerun finishes it if this one never ends.
+run_timings = timing.start_run(st.session_state.get('timing_run'))
+st.session_state['timing_run'] = run_timings
+
+
+def stop_run():
+    """st.stop() once this run's timings are finished."""
+    timing.finish_run(run_timings)
+    st.stop()
+
+# === Precomputed forecasts (optional) ===
+@st.cache_resource
+def load_forecast_store(path, artifact_key):
+    return ForecastStore(path)
+
+forecast_store = None
+if FORECAST_ARTIFACT:
+    store = load_forecast_store(FORECAST_ARTIFACT, file_fingerprint(FORECAST_ARTIFACT))
+    model_path = MODEL_PATH if os.path.exists(MODEL_PATH) else None
+    if store.is_current(model_path, DATA_PATH):
+        forecast_store = store
+    else:
+        st.warning("⚠️ Precomputed forecasts are out of date with the model or data; forecasting live instead.")
+
+# === Background loading ===
+# The model and the indexed dataset load on worker threads while the header and
+# sidebar render; the forecast section waits on the futures.
+@st.cache_resource
+def get_loader():
+    return ThreadPoolExecutor(max_workers=2, thread_name_prefix='ev-loader')
+
+# Keyed by the file's content hash so a retrained model replaces the cached one.
+# Uses the flattened export from `python forest.py export` when it matches the pickle.
+@st.cache_resource
+def load_model(model_path, forest_dir, model_key):
+    return get_loader().submit(timing.traced('load_model', load_forecasting_model, model_path, forest_dir))
+
+# Indexed once per data version and shared read-only across sessions
 @st.cache_resource
-def load_model():
-    return joblib.load('forecasting_ev_model.pkl')
+def load_data(data_key):
+    return get_loader().submit(timing.traced('load_data', lambda: CountyIndex(load_dataset(DATA_PATH, states=DATA_STATES))))
 
-model = load_model()
+# The sidebar's forecast mode, read ahead of the widget so the right model starts loading now.
+# Direct mode needs the horizon model from `python direct_model.py train`.
+direct_available = forecast_store is None and os.path.exists(DIRECT_MODEL_PATH)
+forecast_mode = 'direct' if direct_available and st.session_state.get('forecast_mode') == "Direct" else 'recursive'
+
+model_future = model_key = None
+if forecast_store is None:
+    model_path, forest_dir = ((DIRECT_MODEL_PATH, DIRECT_FOREST_DIR) if forecast_mode == 'direct'
+                              else (MODEL_PATH, FOREST_DIR))
+    model_key = file_fingerprint(model_path)
+    model_future = load_model(model_path, forest_dir, model_key)
+
+data_key = file_fingerprint(DATA_PATH) + ('' if DATA_STATES is None else '-' + '-'.join(DATA_STATES))
+county_index_future = load_data(data_key)
+
+# County list and dataset summary for the sidebar, without waiting on the dataset
+@st.cache_data
+def load_manifest(data_key):
+    manifest = read_county_manifest(DATA_PATH, states=DATA_STATES)
+    if manifest is None:  # first start on this data version
+        manifest = load_county_manifest(DATA_PATH, index=load_data(data_key).result(), states=DATA_STATES)
+    return manifest
+
+with timing.span('manifest'):
+    manifest = load_manifest(data_key)
+
+# Forecasts are shared across sessions and keyed by model + data fingerprints
+@st.cache_resource
+def get_forecast_cache():
+    return ForecastCache(maxsize=1024)
+
+forecast_cache = get_forecast_cache()
+
+# Growth of every county; a new model or data version refreshes only what changed
+@st.cache_resource
+def get_leaderboard_cache():
+    return LeaderboardCache()
 
 # === Enhanced Styling ===
 st.markdown("""
@@ -208,15 +301,33 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 
-# === Load data (must contain historical values, features, etc.) ===
-@st.cache_data
-def load_data():
-    with st.spinner("Loading data..."):
-        df = pd.read_csv("preprocessed_ev_data.csv")
-        df['Date'] = pd.to_datetime(df['Date'])
-    return df
+# Forecasts come from the model, or from the precomputed table when one is served
+forecast_key = model_key if forecast_store is None else file_fingerprint(FORECAST_ARTIFACT)
+
+# === Rendered charts ===
+# PNG bytes keyed by county set plus data and forecast fingerprints; reruns that
+# change nothing the chart shows reuse the image instead of redrawing it.
+CHART_CACHE_ENTRIES = 64
 
-df = load_data()
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def trajectory_chart(county, data_key, forecast_key, with_bands, _combined, _latest_date, _historical_total,
+                     _forecasted_total, _bands):
+    return trajectory_png(_combined, county, _latest_date, _historical_total, _forecasted_total, bands=_bands)
+
+@st.cache_data(max_entries=CHART_CACHE_ENTRIES, show_spinner=False)
+def comparison_chart(counties, data_key, forecast_key, _comp_df):
+    return comparison_png(_comp_df)
+
+def get_forecasts(counties):
+    if forecast_store is not None:
+        return forecast_store.get_many(counties)
+    return forecast_cache.get_many(model, county_index, counties, model_key, data_key, horizon=FORECAST_HORIZON,
+                                   mode=forecast_mode)
+
+# Percentile bands from the per-tree trajectories; the key names the model and data they came from
+@st.cache_data(max_entries=256, show_spinner=False)
+def get_bands(county, model_key, data_key):
+    return forecast_bands(model, county_index, [county], horizon=FORECAST_HORIZON)[county]
 
 # === Sidebar Controls ===
 with st.sidebar:
@@ -226,16 +337,49 @@ with st.sidebar:
         </div>
     """, unsafe_allow_html=True)
     
-    county_list = sorted(df['County'].dropna().unique().tolist())
+    county_list = manifest['counties']
     county = st.selectbox(
         "🏙️ Select a County", 
         county_list,
         help="Choose a Washington State county to view EV adoption forecasts"
     )
+
+    interactive_charts = st.toggle(
+        "🖱️ Interactive charts",
+        help="Draw charts in the browser from the numbers alone instead of sending rendered images"
+    )
+
+    st.radio(
+        "🧭 Forecast mode",
+        ["Recursive", "Direct"],
+        key="forecast_mode",
+        horizontal=True,
+        help="Recursive predicts one month at a time from the previous months' predictions; "
+             "Direct predicts all 36 months at once with the horizon model from `python direct_model.py train`",
+        disabled=not direct_available
+    )
+
+    show_bands = st.toggle(
+        "📐 Uncertainty bands",
+        help="Shade the range the forest's individual trees forecast (P{}-P{} of cumulative EVs)".format(
+            BAND_QUANTILES[0], BAND_QUANTILES[-1]),
+        disabled=forecast_store is not None or forecast_mode == 'direct'
+    )
+
+    show_timings = st.toggle(
+        "⏱️ Show timings",
+        help="Break down where this page's last run spent its time"
+    )
     
     # Add download functionality
-    if st.button("📥 Download Report", key="download_btn"):
-        st.success("Report download feature coming soon!")
+    report_scope = st.radio(
+        "📥 Report scope",
+        ["Selected county", "All counties"],
+        horizontal=True,
+        help="Forecast tables (CSV/Excel) and trajectory charts, bundled as a ZIP"
+    )
+    build_report_clicked = st.button("📥 Download Report", key="download_btn")
+    report_slot = st.empty()
     
     st.markdown("---")
     
@@ -250,7 +394,7 @@ with st.sidebar:
                 <strong>Model Type:</strong> Random Forest
             </p>
         </div>
-    """.format(len(county_list), df['Date'].max().strftime('%B %Y')), unsafe_allow_html=True)
+    """.format(len(county_list), pd.Timestamp(manifest['latest_date']).strftime('%B %Y')), unsafe_allow_html=True)
     
     # Quick Stats
     st.markdown("""
@@ -258,11 +402,15 @@ with st.sidebar:
             <h4 style='margin-top: 0; color: white;'>⚡ Quick Stats</h4>
             <p style='margin: 0; color: rgba(255, 255, 255, 0.9);'>
                 <strong>Total Records:</strong> {:,}<br>
+                <strong>States:</strong> {}<br>
+                <strong>EVs Registered:</strong> {:,} ({:,} BEV / {:,} PHEV)<br>
                 <strong>Data Range:</strong> {} to {}<br>
                 <strong>Accuracy:</strong> 95%+
             </p>
         </div>
-    """.format(len(df), df['Date'].min().strftime('%Y'), df['Date'].max().strftime('%Y')), unsafe_allow_html=True)
+    """.format(manifest['rows'], manifest['states'], manifest['totals']['ev'], manifest['totals']['bev'],
+               manifest['totals']['phev'], pd.Timestamp(manifest['first_date']).strftime('%Y'),
+               pd.Timestamp(manifest['latest_date']).strftime('%Y')), unsafe_allow_html=True)
     
     # About section
     st.markdown("""
@@ -290,72 +438,77 @@ with st.sidebar:
         </div>
     """, unsafe_allow_html=True)
 
-if county not in df['County'].unique():
-    st.error(f"❌ County '{county}' not found in dataset.")
-    st.stop()
+# === Wait for the background loads ===
+with st.spinner("Loading data..."), timing.span('wait.data'):
+    county_index = county_index_future.result()
+model = None
+if model_future is not None:
+    with st.spinner("Loading model..."), timing.span('wait.model'):
+        model = model_future.result()
 
-county_df = df[df['County'] == county].sort_values("Date")
-county_code = county_df['county_encoded'].iloc[0]
+if county not in county_index:
+    st.error(f"❌ County '{county}' not found in dataset.")
+    stop_run()
+
+# === Report Download ===
+# Built once per scope and data/forecast version under artifacts/reports; charts
+# for all counties are rendered by a process pool while the bar follows along.
+if report_scope == "All counties":
+    report_counties = [c for c, n in zip(county_index.counties, county_index.tail_lengths) if n >= MIN_HISTORY]
+    report_name = "ev_forecast_report_all_counties.zip"
+else:
+    report_counties = [county]
+    report_name = f"ev_forecast_report_{county.replace(' ', '_')}.zip"
+report_file = report_path(data_key, forecast_key, 'all' if report_scope == "All counties" else county)
+
+if build_report_clicked and not os.path.exists(report_file):
+    with report_slot.container():
+        progress_bar = st.progress(0.0, text="Forecasting...")
+        try:
+            with timing.span('report'):
+                build_report(report_file, get_forecasts(report_counties), county_index, DATA_PATH,
+                             progress=lambda done, total: progress_bar.progress(
+                                 done / total, text=f"Rendering charts: {done}/{total} counties"),
+                             states=DATA_STATES)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+        progress_bar.empty()
+if os.path.exists(report_file) and (build_report_clicked or st.session_state.get('report_file') == report_file):
+    st.session_state['report_file'] = report_file  # keep the button across reruns
+    with open(report_file, 'rb') as f:
+        report_slot.download_button("💾 Save report (ZIP)", f.read(), file_name=report_name,
+                                    mime="application/zip", key="report_download")
+
+with timing.span('county_filter'):
+    county_df = county_index.history(county)  # one row per month, states and uses summed
+    latest_date = county_index.latest_date(county)
 
 # === Forecasting ===
-historical_ev = list(county_df['Electric Vehicle (EV) Total'].values[-6:])
-cumulative_ev = list(np.cumsum(historical_ev))
-months_since_start = county_df['months_since_start'].max()
-latest_date = county_df['Date'].max()
-
-future_rows = []
-forecast_horizon = 36
-
-for i in range(1, forecast_horizon + 1):
-    forecast_date = latest_date + pd.DateOffset(months=i)
-    months_since_start += 1
-    lag1, lag2, lag3 = historical_ev[-1], historical_ev[-2], historical_ev[-3]
-    roll_mean = np.mean([lag1, lag2, lag3])
-    pct_change_1 = (lag1 - lag2) / lag2 if lag2 != 0 else 0
-    pct_change_3 = (lag1 - lag3) / lag3 if lag3 != 0 else 0
-    recent_cumulative = cumulative_ev[-6:]
-    ev_growth_slope = np.polyfit(range(len(recent_cumulative)), recent_cumulative, 1)[0] if len(recent_cumulative) == 6 else 0
-
-    new_row = {
-        'months_since_start': months_since_start,
-        'county_encoded': county_code,
-        'ev_total_lag1': lag1,
-        'ev_total_lag2': lag2,
-        'ev_total_lag3': lag3,
-        'ev_total_roll_mean_3': roll_mean,
-        'ev_total_pct_change_1': pct_change_1,
-        'ev_total_pct_change_3': pct_change_3,
-        'ev_growth_slope': ev_growth_slope
-    }
-
-    pred = model.predict(pd.DataFrame([new_row]))[0]
-    future_rows.append({"Date": forecast_date, "Predicted EV Total": round(pred)})
-
-    historical_ev.append(pred)
-    if len(historical_ev) > 6:
-        historical_ev.pop(0)
-
-    cumulative_ev.append(cumulative_ev[-1] + pred)
-    if len(cumulative_ev) > 6:
-        cumulative_ev.pop(0)
+try:
+    with timing.span('forecast'):
+        county_forecast = get_forecasts([county])[county]
+except ValueError as e:
+    st.error(f"❌ {e}")
+    stop_run()
 
 # === Combine Historical + Forecast for Cumulative Plot ===
-historical_cum = county_df[['Date', 'Electric Vehicle (EV) Total']].copy()
-historical_cum['Source'] = 'Historical'
-historical_cum['Cumulative EV'] = historical_cum['Electric Vehicle (EV) Total'].cumsum()
+historical_cum = county_df[['Date', 'Cumulative EV']].assign(Source='Historical')
 
-forecast_df = pd.DataFrame(future_rows)
-forecast_df['Source'] = 'Forecast'
-forecast_df['Cumulative EV'] = forecast_df['Predicted EV Total'].cumsum() + historical_cum['Cumulative EV'].iloc[-1]
+forecast_df = county_forecast.forecast.assign(Source='Forecast')
 
 combined = pd.concat([
     historical_cum[['Date', 'Cumulative EV', 'Source']],
     forecast_df[['Date', 'Cumulative EV', 'Source']]
 ], ignore_index=True)
 
+bands = None
+if show_bands and model is not None and forecast_mode == 'recursive':
+    with st.spinner("Calculating uncertainty bands..."), timing.span('forecast.bands'):
+        bands = get_bands(county, model_key, data_key)
+
 # === Key Metrics Section ===
-historical_total = historical_cum['Cumulative EV'].iloc[-1]
-forecasted_total = forecast_df['Cumulative EV'].iloc[-1]
+historical_total = county_forecast.current_total
+forecasted_total = county_forecast.projected_total
 
 col1, col2, col3 = st.columns(3)
 
@@ -408,55 +561,16 @@ st.markdown("""
     </div>
 """.format(county), unsafe_allow_html=True)
 
-# Create enhanced plot
-fig, ax = plt.subplots(figsize=(14, 8))
-
-# Plot with better styling
-colors = ['#00ff88', '#ff6b6b']
-markers = ['o', 's']
-for i, (label, data) in enumerate(combined.groupby('Source')):
-    ax.plot(data['Date'], data['Cumulative EV'], 
-           label=label, marker=markers[i], color=colors[i], 
-           linewidth=3, markersize=6, alpha=0.9)
-
-# Enhanced styling
-ax.set_title(f"EV Adoption Trajectory: {county} County", 
-            fontsize=18, color='white', fontweight='bold', pad=20)
-ax.set_xlabel("Date", color='white', fontsize=14, fontweight='600')
-ax.set_ylabel("Cumulative EV Count", color='white', fontsize=14, fontweight='600')
-
-# Grid and background
-ax.grid(True, alpha=0.2, linestyle='--')
-ax.set_facecolor("#1a1a1a")
-fig.patch.set_facecolor('#1a1a1a')
-
-# Styling ticks and legend
-ax.tick_params(colors='white', labelsize=12)
-legend = ax.legend(loc='upper left', frameon=True, fancybox=True, shadow=True)
-legend.get_frame().set_facecolor('#2a2a2a')
-legend.get_frame().set_alpha(0.9)
-for text in legend.get_texts():
-    text.set_color('white')
-
-# Add annotations for key points
-if historical_total > 0:
-    # Mark current point
-    ax.annotate(f'Current: {int(historical_total):,}', 
-               xy=(latest_date, historical_total),
-               xytext=(10, 10), textcoords='offset points',
-               color='#00ff88', fontweight='bold',
-               bbox=dict(boxstyle='round,pad=0.5', facecolor='#00ff88', alpha=0.2))
-    
-    # Mark forecast end point
-    forecast_end_date = latest_date + pd.DateOffset(months=36)
-    ax.annotate(f'Projected: {int(forecasted_total):,}', 
-               xy=(forecast_end_date, forecasted_total),
-               xytext=(10, -20), textcoords='offset points',
-               color='#ff6b6b', fontweight='bold',
-               bbox=dict(boxstyle='round,pad=0.5', facecolor='#ff6b6b', alpha=0.2))
-
-plt.tight_layout()
-st.pyplot(fig)
+with timing.span('render.trajectory'):
+    if interactive_charts:
+        if bands is not None:
+            # No shading in the browser chart; the band edges are drawn as lines instead
+            edges = bands.melt(id_vars='Date', var_name='Source', value_name='Cumulative EV')
+            combined = pd.concat([combined, edges], ignore_index=True)
+        st.line_chart(combined, x='Date', y='Cumulative EV', color='Source')
+    else:
+        st.image(trajectory_chart(county, data_key, forecast_key, bands is not None, combined, latest_date,
+                                  historical_total, forecasted_total, bands), use_container_width=True)
 
 # === Forecast Summary ===
 if historical_total > 0:
@@ -499,127 +613,96 @@ st.markdown("""
     </div>
 """, unsafe_allow_html=True)
 
+# Counties seen in each state, for comparing a whole state at once
+@st.cache_data
+def state_counties(data_key):
+    return county_index.rollups.state_counties()
+
+# Up to this many counties get a metric card each; more are listed in a table
+MAX_COMPARISON_CARDS = 4
+
 multi_counties = st.multiselect(
-    "🏙️ Select Counties to Compare (up to 3)", 
+    "🏙️ Select Counties to Compare", 
     county_list, 
-    max_selections=3,
-    help="Choose up to 3 counties to compare their EV adoption forecasts"
+    help="Choose any number of counties to compare their EV adoption forecasts"
 )
+states = state_counties(data_key)
+compare_state = st.selectbox(
+    "🗺️ Or add every county of a state",
+    ["None"] + sorted(states),
+    help="Adds the state's counties to the comparison"
+)
+if compare_state != "None":
+    multi_counties = list(dict.fromkeys(multi_counties + states[compare_state]))
 
-if multi_counties:
-    comparison_data = []
-    comparison_metrics = []
-
-    # Progress bar for comparison calculation
-    progress_bar = st.progress(0)
-    status_text = st.empty()
-    
-    for idx, cty in enumerate(multi_counties):
-        status_text.text(f"Calculating forecast for {cty} County...")
-        progress_bar.progress((idx + 1) / len(multi_counties))
-        
-        cty_df = df[df['County'] == cty].sort_values("Date")
-        cty_code = cty_df['county_encoded'].iloc[0]
-
-        hist_ev = list(cty_df['Electric Vehicle (EV) Total'].values[-6:])
-        cum_ev = list(np.cumsum(hist_ev))
-        months_since = cty_df['months_since_start'].max()
-        last_date = cty_df['Date'].max()
-
-        future_rows_cty = []
-        for i in range(1, forecast_horizon + 1):
-            forecast_date = last_date + pd.DateOffset(months=i)
-            months_since += 1
-            lag1, lag2, lag3 = hist_ev[-1], hist_ev[-2], hist_ev[-3]
-            roll_mean = np.mean([lag1, lag2, lag3])
-            pct_change_1 = (lag1 - lag2) / lag2 if lag2 != 0 else 0
-            pct_change_3 = (lag1 - lag3) / lag3 if lag3 != 0 else 0
-            recent_cum = cum_ev[-6:]
-            ev_slope = np.polyfit(range(len(recent_cum)), recent_cum, 1)[0] if len(recent_cum) == 6 else 0
-
-            new_row = {
-                'months_since_start': months_since,
-                'county_encoded': cty_code,
-                'ev_total_lag1': lag1,
-                'ev_total_lag2': lag2,
-                'ev_total_lag3': lag3,
-                'ev_total_roll_mean_3': roll_mean,
-                'ev_total_pct_change_1': pct_change_1,
-                'ev_total_pct_change_3': pct_change_3,
-                'ev_growth_slope': ev_slope
-            }
-            pred = model.predict(pd.DataFrame([new_row]))[0]
-            future_rows_cty.append({"Date": forecast_date, "Predicted EV Total": round(pred)})
-
-            hist_ev.append(pred)
-            if len(hist_ev) > 6:
-                hist_ev.pop(0)
-
-            cum_ev.append(cum_ev[-1] + pred)
-            if len(cum_ev) > 6:
-                cum_ev.pop(0)
-
-        hist_cum = cty_df[['Date', 'Electric Vehicle (EV) Total']].copy()
-        hist_cum['Cumulative EV'] = hist_cum['Electric Vehicle (EV) Total'].cumsum()
-
-        fc_df = pd.DataFrame(future_rows_cty)
-        fc_df['Cumulative EV'] = fc_df['Predicted EV Total'].cumsum() + hist_cum['Cumulative EV'].iloc[-1]
+# Counties too short to forecast are left out instead of failing the whole comparison
+too_short = [cty for cty in multi_counties if county_index.tail_lengths[county_index.position(cty)] < MIN_HISTORY]
+multi_counties = [cty for cty in multi_counties if cty not in too_short]
+if too_short:
+    st.caption("Left out {} with fewer than {} months of history: {}".format(
+        "1 county" if len(too_short) == 1 else f"{len(too_short)} counties", MIN_HISTORY, ", ".join(too_short)))
 
-        combined_cty = pd.concat([
-            hist_cum[['Date', 'Cumulative EV']],
-            fc_df[['Date', 'Cumulative EV']]
-        ], ignore_index=True)
+if multi_counties:
+    # Cache misses are forecast together in one batch (one predict per month for all of them)
+    with st.spinner(f"Calculating forecasts for {len(multi_counties)} counties..."):
+        try:
+            with timing.span('forecast.comparison'):
+                forecasts = get_forecasts(multi_counties)
+        except ValueError as e:
+            st.error(f"❌ {e}")
+            stop_run()
+
+    comparison_metrics = pd.DataFrame({
+        'County': multi_counties,
+        'Current': [int(forecasts[cty].current_total) for cty in multi_counties],
+        'Projected': [int(forecasts[cty].projected_total) for cty in multi_counties],
+        'Growth': [forecasts[cty].growth_pct or 0 for cty in multi_counties],
+    })
 
-        combined_cty['County'] = cty
-        comparison_data.append(combined_cty)
-        
-        # Store metrics for comparison
-        current_total = hist_cum['Cumulative EV'].iloc[-1]
-        forecast_total = fc_df['Cumulative EV'].iloc[-1]
-        growth_pct = ((forecast_total - current_total) / current_total * 100) if current_total > 0 else 0
-        
-        comparison_metrics.append({
-            'County': cty,
-            'Current': int(current_total),
-            'Projected': int(forecast_total),
-            'Growth': growth_pct
-        })
-
-    # Clear progress indicators
-    progress_bar.empty()
-    status_text.empty()
-    
     # === Comparison Metrics Cards ===
     st.markdown("### 📊 County Comparison Overview")
-    
-    cols = st.columns(len(multi_counties))
-    for idx, metric in enumerate(comparison_metrics):
-        with cols[idx]:
-            trend_class = "trend-positive" if metric['Growth'] > 0 else "trend-negative"
-            trend_icon = "📈" if metric['Growth'] > 0 else "📉"
-            st.markdown("""
-                <div class="metric-container">
-                    <h4 style='margin: 0 0 1rem 0; color: #00ff88;'>{}</h4>
-                    <div style='display: flex; justify-content: space-between; margin-bottom: 0.5rem;'>
-                        <span class="metric-label">Current:</span>
-                        <span style='color: white; font-weight: 600;'>{:,}</span>
-                    </div>
-                    <div style='display: flex; justify-content: space-between; margin-bottom: 0.5rem;'>
-                        <span class="metric-label">Projected:</span>
-                        <span style='color: white; font-weight: 600;'>{:,}</span>
-                    </div>
-                    <div style='display: flex; justify-content: space-between; align-items: center;'>
-                        <span class="metric-label">{} Growth:</span>
-                        <span class="{}" style='font-weight: 700;'>{:+.1f}%</span>
+
+    if len(multi_counties) <= MAX_COMPARISON_CARDS:
+        cols = st.columns(len(multi_counties))
+        for idx, metric in enumerate(comparison_metrics.to_dict('records')):
+            with cols[idx]:
+                trend_class = "trend-positive" if metric['Growth'] > 0 else "trend-negative"
+                trend_icon = "📈" if metric['Growth'] > 0 else "📉"
+                st.markdown("""
+                    <div class="metric-container">
+                        <h4 style='margin: 0 0 1rem 0; color: #00ff88;'>{}</h4>
+                        <div style='display: flex; justify-content: space-between; margin-bottom: 0.5rem;'>
+                            <span class="metric-label">Current:</span>
+                            <span style='color: white; font-weight: 600;'>{:,}</span>
+                        </div>
+                        <div style='display: flex; justify-content: space-between; margin-bottom: 0.5rem;'>
+                            <span class="metric-label">Projected:</span>
+                            <span style='color: white; font-weight: 600;'>{:,}</span>
+                        </div>
+                        <div style='display: flex; justify-content: space-between; align-items: center;'>
+                            <span class="metric-label">{} Growth:</span>
+                            <span class="{}" style='font-weight: 700;'>{:+.1f}%</span>
+                        </div>
                     </div>
-                </div>
-            """.format(
-                metric['County'], metric['Current'], metric['Projected'], 
-                trend_icon, trend_class, metric['Growth']
-            ), unsafe_allow_html=True)
+                """.format(
+                    metric['County'], metric['Current'], metric['Projected'], 
+                    trend_icon, trend_class, metric['Growth']
+                ), unsafe_allow_html=True)
+    else:
+        st.dataframe(
+            comparison_metrics.sort_values('Growth', ascending=False),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                'Current': st.column_config.NumberColumn("Current EVs", format="%d"),
+                'Projected': st.column_config.NumberColumn("Projected EVs", format="%d"),
+                'Growth': st.column_config.NumberColumn("Growth %", format="%+.1f%%"),
+            }
+        )
 
-    # Combine all counties data for plotting
-    comp_df = pd.concat(comparison_data, ignore_index=True)
+    # Histories and forecasts of all counties in one frame, long series thinned for plotting
+    with timing.span('comparison.frame'):
+        comp_df = downsample(comparison_frame(county_index, forecasts))
 
     # === Enhanced Comparison Plot ===
     st.markdown("""
@@ -630,47 +713,17 @@ if multi_counties:
             </h3>
         </div>
     """, unsafe_allow_html=True)
-    
-    fig, ax = plt.subplots(figsize=(16, 9))
-    
-    # Enhanced color palette for comparison
-    colors = ['#00ff88', '#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4', '#feca57']
-    markers = ['o', 's', '^', 'D', 'v', 'p']
-    
-    for idx, (cty, group) in enumerate(comp_df.groupby('County')):
-        ax.plot(group['Date'], group['Cumulative EV'], 
-               marker=markers[idx % len(markers)], 
-               color=colors[idx % len(colors)], 
-               label=cty, linewidth=3, markersize=8, alpha=0.9)
-    
-    ax.set_title("Multi-County EV Adoption Comparison: Historical Data + 3-Year Forecasts", 
-                fontsize=20, color='white', fontweight='bold', pad=25)
-    ax.set_xlabel("Timeline", color='white', fontsize=16, fontweight='600')
-    ax.set_ylabel("Cumulative Electric Vehicles", color='white', fontsize=16, fontweight='600')
-    
-    # Enhanced styling
-    ax.grid(True, alpha=0.2, linestyle='--')
-    ax.set_facecolor("#1a1a1a")
-    fig.patch.set_facecolor('#1a1a1a')
-    ax.tick_params(colors='white', labelsize=14)
-    
-    # Enhanced legend
-    legend = ax.legend(loc='upper left', frameon=True, fancybox=True, shadow=True, fontsize=12)
-    legend.get_frame().set_facecolor('#2a2a2a')
-    legend.get_frame().set_alpha(0.95)
-    legend.set_title("Counties", prop={'size': 14, 'weight': 'bold'})
-    legend.get_title().set_color('white')
-    for text in legend.get_texts():
-        text.set_color('white')
-    
-    plt.tight_layout()
-    st.pyplot(fig)
-    
+
+    with timing.span('render.comparison'):
+        if interactive_charts:
+            st.line_chart(comp_df, x='Date', y='Cumulative EV', color='County')
+        else:
+            st.image(comparison_chart(tuple(sorted(multi_counties)), data_key, forecast_key, comp_df), use_container_width=True)
+
     # === Comparison Summary ===
-    best_growth = max(comparison_metrics, key=lambda x: x['Growth'])
-    worst_growth = min(comparison_metrics, key=lambda x: x['Growth'])
-    highest_current = max(comparison_metrics, key=lambda x: x['Current'])
-    
+    best_growth = comparison_metrics.loc[comparison_metrics['Growth'].idxmax()]
+    highest_current = comparison_metrics.loc[comparison_metrics['Current'].idxmax()]
+
     st.markdown("""
         <div class="info-box">
             <h4 style='margin-top: 0; color: white;'>🏆 Comparison Insights</h4>
@@ -691,9 +744,62 @@ if multi_counties:
         best_growth['County'], best_growth['Growth'],
         highest_current['County'], highest_current['Current'],
         len(multi_counties), 
-        sum(m['Growth'] for m in comparison_metrics) / len(comparison_metrics)
+        comparison_metrics['Growth'].mean()
     ), unsafe_allow_html=True)
 
+# === Growth Leaderboard ===
+@st.cache_resource
+def store_leaderboard(forecast_key, data_key):
+    return from_store(forecast_store, forecast_key, data_key)
+
+def get_leaderboard():
+    if forecast_store is not None:
+        return store_leaderboard(forecast_key, data_key)
+    return get_leaderboard_cache().get(model, county_index, model_key, data_key, mode=forecast_mode)
+
+st.markdown("""
+    <div class="comparison-section">
+        <h2 style='margin-top: 0; display: flex; align-items: center;'>
+            <span style='margin-right: 15px;'>🏆</span>
+            Growth Leaderboard
+        </h2>
+        <p style='font-size: 1.1rem; color: rgba(255, 255, 255, 0.9); margin-bottom: 0;'>
+            Every county forecast {} years ahead and ranked by projected EV growth.
+        </p>
+    </div>
+""".format(FORECAST_HORIZON // 12), unsafe_allow_html=True)
+
+# Ranking forecasts every county, so it runs only once asked for, not on every cold start
+show_leaderboard = st.toggle("🏆 Rank every county", key='show_leaderboard')
+if show_leaderboard:
+    board_cols = st.columns([2, 2, 1])
+    with board_cols[0]:
+        leaderboard_order = st.radio("📶 Rank by", ["Fastest-growing", "Slowest-growing"], horizontal=True)
+    with board_cols[1]:
+        leaderboard_size = st.slider("🔢 Counties shown", 5, 50, 10)
+    with board_cols[2]:
+        leaderboard_min = st.number_input(
+            "🚗 Minimum current EVs", min_value=0, value=50, step=10,
+            help="Counties with very few EVs today show extreme growth percentages"
+        )
+
+    with st.spinner("Ranking every county..."), timing.span('leaderboard'):
+        board = get_leaderboard()
+        top_counties = board.top(leaderboard_size, leaderboard_order == "Fastest-growing", leaderboard_min)
+
+    st.dataframe(
+        top_counties,
+        hide_index=True,
+        use_container_width=True,
+        column_config={
+            'Current EVs': st.column_config.NumberColumn("Current EVs", format="%d"),
+            'Projected EVs': st.column_config.NumberColumn("Projected EVs", format="%d"),
+            'Growth %': st.column_config.NumberColumn("Growth %", format="%+.1f%%"),
+        }
+    )
+    st.caption("{:,} of {:,} counties have at least {:,} EVs today; {:,} were forecast on the last refresh.".format(
+        int((board.current >= leaderboard_min).sum()), len(board), leaderboard_min, board.forecast))
+
 # === Footer Section ===
 st.markdown("---")
 st.markdown("""
@@ -709,3 +815,13 @@ st.markdown("""
         </div>
     </div>
 """, unsafe_allow_html=True)
+
+# === Run Timings ===
+timing.finish_run(run_timings)
+if show_timings:
+    with st.sidebar.expander("⏱️ Last run", expanded=True):
+        spans = pd.DataFrame(run_timings.rows())
+        spans['ms'] = spans['seconds'] * 1000
+        spans['% of run'] = spans['seconds'] / run_timings.wall * 100
+        st.dataframe(spans[['span', 'calls', 'ms', '% of run']].round(1), hide_index=True, use_container_width=True)
+        st.caption("Spans nest: model.predict runs inside forecast; load_* run on worker threads.")
@@ -0,0 +1,296 @@
+"""Rolling-origin backtest of the app's recursive 36-month forecast.
+
+    python backtest.py                                 # every 3rd month as origin, all cores
+    python backtest.py --step 1 --since 2022-01-31 --out artifacts/backtest.json
+
+The notebook only scores one-step-ahead predictions on a shuffled-off holdout.
+This replays forecasting.forecast_counties as if the data had ended at each
+origin month: every county with at least MIN_HISTORY months by then is seeded
+from its county-rollup months up to the origin, exactly as CountyIndex seeds
+the app, and forecast month by month. The forecasts are scored against the months that
+actually followed.
+
+All (county, origin) pairs share one FeatureState, so every horizon step is a
+single batched predict. Pairs are ordered by how many of their forecast months
+can still be checked against data. Each step predicts only the prefix that is
+still scoreable, so late origins stop costing work once they run past the
+latest month. With ``--jobs`` > 1 the pairs are dealt out to worker processes,
+and each worker loads the model once. ``--mode direct`` scores a direct model
+(direct_model.py) instead: one predict covers every pair and month.
+
+Errors are measured on cumulative EVs, the curve the app draws; monthly-total
+MAE is reported alongside. The report has one row per horizon month and one
+per county.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_PATH, CountyIndex, load_dataset
+from forecasting import FORECAST_HORIZON, MIN_HISTORY, FeatureState, predict
+from forest import MODEL_PATH, load_model
+from rollups import month_numbers
+
+ORIGIN_STEP = 3  # months between origins
+
+_worker = {}
+
+
+def origin_months(index, step=ORIGIN_STEP, since=None):
+    """Month-end origin dates, every ``step`` months back from the month before the latest one."""
+    rollups = index.rollups
+    months = rollups.months[rollups.total.month][:-1][::-1][::step][::-1]  # the months with data
+    if since is not None:
+        months = months[months >= np.datetime64(pd.Timestamp(since))]
+    return months
+
+
+def month_keys(index):
+    """Sorted (county, month) key per county-rollup row, the key stride, each row's month and month zero."""
+    monthly = index.rollups.county
+    month = monthly.month.astype(np.int64)
+    stride = int(month.max()) + FORECAST_HORIZON + 2
+    return monthly.codes.astype(np.int64) * stride + month, stride, month, index.rollups.first_month
+
+
+def origin_seeds(index, origins, window=None):
+    """Forecast seeds for every (county, origin) pair with enough history at the origin.
+
+    A county's seed at an origin is what CountyIndex would hold had the data
+    ended there: its last ``HISTORY_WINDOW`` monthly EV totals up to the origin
+    month, its months_since_start by then, its code and the running total. Returns a
+    dict of arrays aligned by pair (``row`` is the pair's last county-rollup
+    row), plus ``scoreable``: how many months after that row the county still
+    has data for.
+    """
+    monthly = index.rollups.county
+    key, stride, _, base = month_keys(index)
+
+    pos = np.repeat(np.arange(len(index)), len(origins))
+    origin = np.tile(month_numbers(origins) - base, len(index))
+    last = np.searchsorted(key, pos * stride + origin, side='right') - 1
+    keep = last - monthly.starts[pos] + 1 >= MIN_HISTORY
+    pos, last = pos[keep], last[keep]
+    pos, last = np.unique(np.column_stack([pos, last]), axis=0).T  # a gap can map two origins to one row
+    return row_seeds(index, pos, last, window)
+
+
+def row_seeds(index, pos, last, window=None):
+    """Forecast seeds of counties ``pos`` as of their county-rollup rows ``last`` (see origin_seeds)."""
+    window = window or index.tails.shape[1]
+    monthly = index.rollups.county
+    month = monthly.month.astype(np.int64)
+    ev = monthly.measures['ev'].astype(float)
+    prefix = np.r_[0.0, np.cumsum(ev)]
+    tails = np.full((len(pos), window), np.nan)
+    for k in range(window):
+        rows = last - window + 1 + k
+        valid = rows >= monthly.starts[pos]
+        tails[valid, k] = ev[rows[valid]]
+    return {
+        'county': pos,
+        'row': last,
+        'tails': tails,
+        'observed': np.minimum(last - monthly.starts[pos] + 1, window),
+        'months': index.monthly_months[last].astype(float),
+        'codes': index.codes[pos],
+        'cumulative': prefix[last + 1] - prefix[monthly.starts[pos]],
+        'scoreable': month[monthly.stops[pos] - 1] - month[last],
+    }
+
+
+def replay(model, seeds, horizon=FORECAST_HORIZON, steps=None):
+    """Monthly predictions (pairs x horizon) of the recursive forecast from each seed, unrounded.
+
+    With ``steps``, pair ``i`` is only predicted for its first ``steps[i]``
+    months; later cells are NaN. The pairs are advanced in ``steps`` order so
+    each month predicts one shrinking prefix.
+    """
+    n = len(seeds['codes'])
+    steps = np.full(n, horizon) if steps is None else np.minimum(steps, horizon)
+    order = np.argsort(-steps, kind='stable')
+    state = FeatureState(seeds['tails'][order], seeds['observed'][order], seeds['months'][order],
+                         seeds['codes'][order], seeds['cumulative'][order])
+    active = np.searchsorted(-steps[order], -np.arange(1, horizon + 1), side='right')  # pairs still running
+    predictions = np.full((n, horizon), np.nan)
+    for step in range(horizon):
+        if active[step] == 0:
+            break
+        values = np.full(n, np.nan)
+        values[:active[step]] = predict(model, state.features()[:active[step]])
+        predictions[order, step] = values
+        state.push(values)
+    return predictions
+
+
+def replay_direct(model, seeds, horizon=FORECAST_HORIZON, steps=None):
+    """replay() for a direct model: the months of every pair that are needed, in one predict."""
+    n = len(seeds['codes'])
+    steps = np.full(n, horizon) if steps is None else np.minimum(steps, horizon)
+    X = FeatureState(seeds['tails'], seeds['observed'], seeds['months'], seeds['codes'],
+                     seeds['cumulative']).features()
+    pair = np.repeat(np.arange(n), steps)
+    month = np.arange(len(pair)) - np.repeat(np.cumsum(steps) - steps, steps)  # 0..steps-1 per pair
+    predictions = np.full((n, horizon), np.nan)
+    if len(pair):
+        predictions[pair, month] = predict(model, np.column_stack([X[pair], month + 1]))
+    return predictions
+
+
+REPLAYS = {'recursive': replay, 'direct': replay_direct}
+
+
+def _init_worker(model):
+    _worker['model'] = load_model(model) if isinstance(model, str) else model
+
+
+def _replay_chunk(seeds, horizon, steps, mode):
+    return REPLAYS[mode](_worker['model'], seeds, horizon, steps)
+
+
+def _replay_all(model, seeds, horizon, jobs, mode):
+    if jobs == 1:
+        model = load_model(model) if isinstance(model, str) else model
+        return REPLAYS[mode](model, seeds, horizon, seeds['scoreable'])
+    # Dealt round-robin by scoreable months, so every worker gets the same mix of long and short runs
+    order = np.argsort(-seeds['scoreable'], kind='stable')
+    chunks = [order[k::jobs] for k in range(jobs) if len(order[k::jobs])]
+    predictions = np.empty((len(order), horizon))
+    with ProcessPoolExecutor(max_workers=len(chunks), initializer=_init_worker, initargs=(model,)) as pool:
+        parts = pool.map(_replay_chunk, [{name: values[rows] for name, values in seeds.items()} for rows in chunks],
+                         [horizon] * len(chunks), [seeds['scoreable'][rows] for rows in chunks],
+                         [mode] * len(chunks))
+        for rows, part in zip(chunks, parts):
+            predictions[rows] = part
+    return predictions
+
+
+def score(index, seeds, predictions):
+    """Long frame of every scoreable (pair, horizon) cell: County, Origin, Horizon, actual and predicted."""
+    monthly = index.rollups.county
+    key, stride, month, _ = month_keys(index)
+    ev = monthly.measures['ev'].astype(float)
+    prefix = np.r_[0.0, np.cumsum(ev)]
+    pos, last = seeds['county'], seeds['row']
+    steps = np.arange(1, predictions.shape[1] + 1)
+    probe = (pos * stride + month[last])[:, None] + steps  # the month forecast step h stands for
+    hit = np.searchsorted(key, probe, side='right') - 1
+    valid = (key[hit] == probe) & (steps <= seeds['scoreable'][:, None]) & ~np.isnan(predictions)
+
+    rounded = np.rint(np.nan_to_num(predictions))  # the app rounds each month before summing
+    predicted_cum = seeds['cumulative'][:, None] + np.cumsum(rounded, axis=1)
+    start = monthly.starts[pos][:, None]
+    cells = np.nonzero(valid)
+    return pd.DataFrame({
+        'County': np.asarray(index.counties, dtype=object)[pos[cells[0]]],
+        'Origin': index.rollups.months[month[last[cells[0]]]],
+        'Horizon': steps[cells[1]],
+        'Actual Cumulative EV': (prefix[hit + 1] - prefix[start])[cells],
+        'Predicted Cumulative EV': predicted_cum[cells],
+        'Actual EV Total': ev[hit][cells],
+        'Predicted EV Total': rounded[cells],
+    })
+
+
+def _errors(cells, by=None):
+    """points, MAE and MAPE % of cumulative EVs and monthly-total MAE of ``cells``, optionally grouped ``by``."""
+    actual = cells['Actual Cumulative EV']
+    error = (cells['Predicted Cumulative EV'] - actual).abs()
+    frame = pd.DataFrame({
+        'points': 1,
+        'MAE': error,
+        'MAPE %': 100 * error / actual.where(actual > 0),  # NaN where nothing was registered yet
+        'monthly MAE': (cells['Predicted EV Total'] - cells['Actual EV Total']).abs(),
+    })
+    if by is None:
+        return frame.agg({'points': 'sum', 'MAE': 'mean', 'MAPE %': 'mean', 'monthly MAE': 'mean'})
+    return frame.groupby(cells[by].values).agg(
+        {'points': 'sum', 'MAE': 'mean', 'MAPE %': 'mean', 'monthly MAE': 'mean'}).rename_axis(by)
+
+
+def summarize(cells):
+    """MAE/MAPE of cumulative EVs (and monthly-total MAE) by horizon month and by county, worst county first."""
+    by_horizon = _errors(cells, 'Horizon').reset_index()
+    by_county = _errors(cells, 'County')
+    by_county.insert(0, 'origins', cells.groupby('County')['Origin'].nunique())
+    return by_horizon, by_county.reset_index().sort_values('MAE', ascending=False, ignore_index=True)
+
+
+def backtest(model, index, origins=None, horizon=FORECAST_HORIZON, jobs=None, mode='recursive'):
+    """Rolling-origin backtest of ``model`` (a model or a model path) forecasting in ``mode`` on ``index``.
+
+    Returns a dict with the ``by_horizon`` and ``by_county`` frames, the
+    scored ``cells`` and a ``summary`` of the run.
+    """
+    started = time.perf_counter()
+    jobs = jobs or os.cpu_count() or 1
+    origins = origin_months(index) if origins is None else np.asarray(origins, dtype='datetime64[ns]')
+    seeds = origin_seeds(index, origins)
+    predictions = _replay_all(model, seeds, horizon, jobs, mode)
+    cells = score(index, seeds, predictions)
+    by_horizon, by_county = summarize(cells)
+    overall = _errors(cells)
+    return {
+        'by_horizon': by_horizon,
+        'by_county': by_county,
+        'cells': cells,
+        'summary': {
+            'origins': len(origins),
+            'first_origin': pd.Timestamp(origins[0]).date().isoformat() if len(origins) else None,
+            'pairs': len(seeds['codes']),
+            'points': int(overall['points']),
+            'MAE': float(overall['MAE']),
+            'MAPE %': float(overall['MAPE %']),
+            'horizon': horizon,
+            'mode': mode,
+            'jobs': jobs,
+            'seconds': time.perf_counter() - started,
+        },
+    }
+
+
+def to_json(result):
+    return {
+        'summary': result['summary'],
+        'by_horizon': result['by_horizon'].to_dict(orient='records'),
+        'by_county': result['by_county'].to_dict(orient='records'),
+    }
+
+
+def print_report(result, worst=10, log=print):
+    summary = result['summary']
+    log(f"{summary['pairs']:,} (county, origin) pairs from {summary['origins']} origins since "
+        f"{summary['first_origin']}; {summary['points']:,} scored months in {summary['seconds']:.1f}s "
+        f"({summary['jobs']} jobs)")
+    log(f"overall: MAE {summary['MAE']:,.1f} cumulative EVs, MAPE {summary['MAPE %']:.2f}%")
+    log("\n" + result['by_horizon'].to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+    log(f"\n{worst} counties with the largest MAE:")
+    log(result['by_county'].head(worst).to_string(index=False, float_format=lambda v: f"{v:,.2f}"))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--horizon', type=int, default=FORECAST_HORIZON)
+    parser.add_argument('--step', type=int, default=ORIGIN_STEP, help="months between origins")
+    parser.add_argument('--since', help="earliest origin date (YYYY-MM-DD)")
+    parser.add_argument('--mode', choices=list(REPLAYS), default='recursive')
+    parser.add_argument('--jobs', type=int, help="worker processes (default: one per CPU)")
+    parser.add_argument('--out', help="write the report as JSON")
+    args = parser.parse_args()
+
+    index = CountyIndex(load_dataset(args.data))
+    result = backtest(args.model, index, origin_months(index, args.step, args.since), args.horizon, args.jobs,
+                      args.mode)
+    print_report(result)
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, 'w') as f:
+            json.dump(to_json(result), f, indent=2, default=str)
+        print(f"\nWrote '{args.out}'")
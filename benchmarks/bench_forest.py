@@ -0,0 +1,66 @@
+"""Latency of sklearn's RandomForest predict vs the flattened NumPy forest.
+
+    python forest.py export && python -m benchmarks.bench_forest
+
+Times single-row calls (what the old per-month loop did), batched calls of a few
+sizes, and the full 36-step forecast over every county. ``walk`` is the NumPy
+walk alone; ``flat`` is FlatForest.predict, which hands batches of
+forest.LARGE_BATCH rows or more to sklearn, where the walk stops paying off.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from data_loader import CountyIndex, load_dataset
+from forecasting import FEATURES, MIN_HISTORY, forecast_counties
+from forest import LARGE_BATCH, MODEL_PATH, FlatForest
+
+
+def best_of(fn, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    import joblib
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    model = joblib.load(args.model)
+    forest = FlatForest.from_sklearn(model)
+    print(f"{forest.n_trees} trees, {len(forest.feature):,} nodes, max depth {forest.max_depth}")
+
+    index = CountyIndex(load_dataset())
+    X_all = index.df[FEATURES].values.astype(np.float64)
+    walk = FlatForest.from_sklearn(model)
+    walk.large_batch = walk.large_block = np.inf
+    assert np.array_equal(model.predict(pd.DataFrame(X_all, columns=FEATURES)), walk.predict(X_all))
+
+    print(f"\n{'batch':>8}{'sklearn ms':>14}{'walk ms':>12}{'flat ms':>12}{'speedup':>10}")
+    for n in (1, 16, 264, LARGE_BATCH, 4096):
+        X = X_all[np.arange(n) % len(X_all)]
+        frame = pd.DataFrame(X, columns=FEATURES)
+        sk = best_of(lambda: model.predict(frame), args.repeat)
+        walked = best_of(lambda: walk.predict(X), args.repeat)
+        flat = best_of(lambda: forest.predict(X), args.repeat)
+        print(f"{n:>8}{sk * 1e3:>14.3f}{walked * 1e3:>12.3f}{flat * 1e3:>12.3f}{sk / flat:>9.1f}x")
+    print(f"(flat = walk below {LARGE_BATCH} rows, sklearn from there)")
+
+    counties = [c for c, n in zip(index.counties, index.tail_lengths) if n >= MIN_HISTORY]
+    repeat = max(1, args.repeat // 5)
+    sk = best_of(lambda: forecast_counties(model, index, counties), repeat)
+    flat = best_of(lambda: forecast_counties(forest, index, counties), repeat)
+    print(f"\n36-month forecast, {len(counties)} counties: sklearn {sk:.3f}s, flat {flat:.3f}s ({sk / flat:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
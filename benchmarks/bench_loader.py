@@ -0,0 +1,73 @@
+"""Cold-start time and memory for loading preprocessed_ev_data.csv.
+
+    python -m benchmarks.bench_loader [--repeat 5]
+
+Each strategy runs in a fresh interpreter so imports and the page cache are the
+only things shared. Reported RSS is the growth of the process across the load.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+STRATEGIES = ['csv', 'typed_csv', 'binary_cache']
+
+_CHILD = r"""
+import json, sys, time
+import pandas as pd
+
+def rss_kb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+strategy, path = sys.argv[1], sys.argv[2]
+from data_loader import read_cache, read_csv_typed
+
+before = rss_kb()
+start = time.perf_counter()
+if strategy == 'csv':
+    df = pd.read_csv(path)
+    df['Date'] = pd.to_datetime(df['Date'])
+elif strategy == 'typed_csv':
+    df = read_csv_typed(path)
+else:
+    df = read_cache(path)
+    assert df is not None, 'binary cache is missing or stale'
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    'seconds': elapsed,
+    'rss_growth_mb': (rss_kb() - before) / 1024,
+    'frame_mb': df.memory_usage(deep=True).sum() / 1e6,
+}))
+"""
+
+
+def run(strategy, path):
+    out = subprocess.run([sys.executable, '-c', _CHILD, strategy, path], check=True,
+                         capture_output=True, text=True, cwd=os.getcwd())
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    from data_loader import DATA_PATH, load_dataset
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    load_dataset(args.data)  # make sure the binary cache exists
+
+    print(f"{'strategy':<14}{'best s':>10}{'rss MB':>10}{'frame MB':>10}")
+    for strategy in STRATEGIES:
+        runs = [run(strategy, args.data) for _ in range(args.repeat)]
+        best = min(runs, key=lambda r: r['seconds'])
+        print(f"{strategy:<14}{best['seconds']:>10.4f}{best['rss_growth_mb']:>10.1f}{best['frame_mb']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
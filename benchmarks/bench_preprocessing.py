@@ -0,0 +1,109 @@
+"""Feature-engineering benchmark: notebook groupby/polyfit cells vs preprocessing.preprocess.
+
+    python -m benchmarks.bench_preprocessing                   # shipped CSV + 1M synthetic rows
+    python -m benchmarks.bench_preprocessing --rows 10000000   # larger synthetic run
+    python -m benchmarks.bench_preprocessing --with-notebook   # also time the notebook on the synthetic rows
+
+The notebook implementation is always timed on the shipped CSV. On synthetic
+data it runs only with ``--with-notebook``: its per-county groupby/polyfit
+takes about 3s per 20,000 rows, so more than 15 minutes at 10M rows.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from preprocessing import RAW_DATA_PATH, clean, engineer_features
+
+
+def notebook_preprocess(raw):
+    """The training notebook's preprocessing cells, verbatim apart from the prints."""
+    df = raw.copy()
+    Q1 = df['Percent Electric Vehicles'].quantile(0.25)
+    Q3 = df['Percent Electric Vehicles'].quantile(0.75)
+    IQR = Q3 - Q1
+    lower_bound = Q1 - 1.5 * IQR
+    upper_bound = Q3 + 1.5 * IQR
+
+    df['Date'] = pd.to_datetime(df['Date'], errors='coerce')
+    df = df[df['Date'].notnull()]
+    df = df[df['Electric Vehicle (EV) Total'].notnull()]
+    df['County'] = df['County'].fillna('Unknown')
+    df['State'] = df['State'].fillna('Unknown')
+    df['Percent Electric Vehicles'] = np.where(df['Percent Electric Vehicles'] > upper_bound, upper_bound,
+                                     np.where(df['Percent Electric Vehicles'] < lower_bound, lower_bound, df['Percent Electric Vehicles']))
+
+    cols_to_convert = [
+        'Battery Electric Vehicles (BEVs)',
+        'Plug-In Hybrid Electric Vehicles (PHEVs)',
+        'Electric Vehicle (EV) Total',
+        'Non-Electric Vehicle Total',
+        'Total Vehicles',
+        'Percent Electric Vehicles'
+    ]
+    for col in cols_to_convert:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    df['year'] = df['Date'].dt.year
+    df['month'] = df['Date'].dt.month
+    df['numeric_date'] = df['Date'].dt.year * 12 + df['Date'].dt.month
+    df['county_encoded'] = pd.factorize(df['County'], sort=True)[0]  # LabelEncoder equivalent
+    df = df.sort_values(['County', 'Date'])
+    df['months_since_start'] = df.groupby('County').cumcount()
+    for lag in [1, 2, 3]:
+        df[f'ev_total_lag{lag}'] = df.groupby('County')['Electric Vehicle (EV) Total'].shift(lag)
+    df['ev_total_roll_mean_3'] = df.groupby('County')['Electric Vehicle (EV) Total'] \
+                                   .transform(lambda x: x.shift(1).rolling(3).mean())
+    df['ev_total_pct_change_1'] = df.groupby('County')['Electric Vehicle (EV) Total'] \
+                                    .pct_change(periods=1, fill_method=None)
+    df['ev_total_pct_change_3'] = df.groupby('County')['Electric Vehicle (EV) Total'] \
+                                    .pct_change(periods=3, fill_method=None)
+    df['ev_total_pct_change_1'] = df['ev_total_pct_change_1'].replace([np.inf, -np.inf], np.nan).fillna(0)
+    df['ev_total_pct_change_3'] = df['ev_total_pct_change_3'].replace([np.inf, -np.inf], np.nan).fillna(0)
+    df['cumulative_ev'] = df.groupby('County')['Electric Vehicle (EV) Total'].cumsum()
+    df['ev_growth_slope'] = df.groupby('County')['cumulative_ev'].transform(
+        lambda x: x.rolling(6).apply(lambda y: np.polyfit(range(len(y)), y, 1)[0] if len(y) == 6 else np.nan)
+    )
+    return df.dropna().reset_index(drop=True)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def compare(label, raw, run_notebook):
+    print(f"\n=== {label}: {len(raw):,} raw rows ===")
+    cleaned, clean_s = timed(clean, raw)
+    fast, features_s = timed(engineer_features, cleaned)
+    fast = fast.dropna().reset_index(drop=True)
+    fast_s = clean_s + features_s
+    print(f"vectorized : {fast_s:8.2f}s  ({len(fast):,} rows out; clean {clean_s:.2f}s, features {features_s:.2f}s)")
+    if not run_notebook:
+        return
+    slow, slow_s = timed(notebook_preprocess, raw)
+    print(f"notebook   : {slow_s:8.2f}s  ({len(slow):,} rows out)")
+    print(f"speedup    : {slow_s / fast_s:8.1f}x")
+
+    numeric = fast.select_dtypes('number').columns
+    worst = np.nanmax(np.abs(fast[numeric].values - slow[numeric].values))
+    print(f"max |diff| : {worst:.3g}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000, help="synthetic rows (0 to skip)")
+    parser.add_argument("--with-notebook", action="store_true",
+                        help="also time the notebook implementation on the synthetic rows (slow)")
+    args = parser.parse_args()
+
+    compare("shipped CSV", pd.read_csv(RAW_DATA_PATH), run_notebook=True)
+    if args.rows:
+        from benchmarks.synthetic import make_raw
+        compare("synthetic", make_raw(args.rows), run_notebook=args.with_notebook)
+
+
+if __name__ == "__main__":
+    main()
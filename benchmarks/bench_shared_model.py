@@ -0,0 +1,95 @@
+"""Memory of several app replicas holding the forecasting model.
+
+    python forest.py export && python -m benchmarks.bench_shared_model [--workers 4]
+
+For each loading strategy, starts ``--workers`` processes that load the model the
+way app.py does and run the full 36-month forecast over every county. While all
+of them are alive, each one's RSS and PSS is read from /proc. Every worker also
+reports a digest of its forecasts, which must match the joblib one.
+
+The forest is a few MB in processes of ~90 MB, so whole-process PSS hardly
+moves between the strategies. ``forest MB`` isolates it: the bytes of the
+model's tree arrays each worker holds privately, plus the PSS of its mappings
+of the export, summed over workers. Private copies grow with ``--workers``; the
+memory-mapped export stays at one copy however many workers share it.
+
+    joblib       the pickled RandomForestRegressor (private copy per process)
+    flat_copy    the flattened export read into private memory
+    flat_mmap    the flattened export memory-mapped read-only (what app.py uses)
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+from forest import FOREST_DIR
+from process_memory import mapped_memory, process_memory
+
+STRATEGIES = ['joblib', 'flat_copy', 'flat_mmap']
+
+_CHILD = r"""
+import hashlib, sys
+import numpy as np
+from data_loader import CountyIndex, load_dataset
+from forecasting import MIN_HISTORY, forecast_counties
+
+strategy = sys.argv[1]
+if strategy == 'joblib':
+    import joblib
+    model = joblib.load('forecasting_ev_model.pkl')
+    arrays = [a for tree in model.estimators_ for a in tree.tree_.__getstate__().values() if hasattr(a, 'nbytes')]
+else:
+    from forest import ARRAYS, load_current
+    model = load_current(mmap_mode='r' if strategy == 'flat_mmap' else None)
+    assert model is not None, 'run `python forest.py export` first'
+    arrays = [getattr(model, name) for name in ARRAYS]
+private = sum(a.nbytes for a in arrays if not isinstance(a, np.memmap))
+
+index = CountyIndex(load_dataset())
+counties = [c for c, n in zip(index.counties, index.tail_lengths) if n >= MIN_HISTORY]
+forecasts = forecast_counties(model, index, counties)
+digest = hashlib.sha256()
+for county in counties:
+    digest.update(np.ascontiguousarray(forecasts[county]['Predicted EV Total'].values).tobytes())
+print(digest.hexdigest()[:16], private, flush=True)
+sys.stdin.readline()  # stay alive until the parent has measured every worker
+"""
+
+
+def run(strategy, workers):
+    procs = [subprocess.Popen([sys.executable, '-c', _CHILD, strategy], stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE, text=True, cwd=os.getcwd())
+             for _ in range(workers)]
+    try:
+        digests, private = zip(*(proc.stdout.readline().split() for proc in procs))
+        memory = [process_memory(proc.pid) for proc in procs]
+        mapped = [mapped_memory(FOREST_DIR, proc.pid) for proc in procs]
+    finally:
+        for proc in procs:
+            proc.communicate('\n')
+    forest = None if None in mapped else sum(int(b) / 2 ** 20 + m['pss_mb'] for b, m in zip(private, mapped))
+    return digests, memory, forest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--workers', type=int, default=4)
+    args = parser.parse_args()
+
+    reference = None
+    print(f"{args.workers} workers")
+    print(f"{'strategy':<12}{'RSS/proc MB':>13}{'PSS/proc MB':>13}{'total PSS MB':>14}{'forest MB':>11}  forecasts")
+    for strategy in STRATEGIES:
+        digests, memory, forest = run(strategy, args.workers)
+        reference = reference or digests[0]
+        same = 'identical' if set(digests) == {reference} else 'DIFFERENT'
+        if None in memory or forest is None:
+            print(f"{strategy:<12}{'n/a':>13}{'n/a':>13}{'n/a':>14}{'n/a':>11}  {same}")
+            continue
+        rss = sum(m['rss_mb'] for m in memory) / len(memory)
+        pss = sum(m['pss_mb'] for m in memory)
+        print(f"{strategy:<12}{rss:>13.1f}{pss / len(memory):>13.1f}{pss:>14.1f}{forest:>11.2f}  {same}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Time-to-first-render of the Streamlit app.
+
+    python -m benchmarks.bench_startup [--repeat 5] [--app app.py]
+
+Each run executes app.py once in a fresh interpreter through Streamlit's AppTest
+harness, timestamping every message the script sends to the browser. Reported
+milestones, in seconds from the start of the script run:
+
+    first element   first delta on the page (header / styling)
+    sidebar         county selectbox in the sidebar is rendered
+    first chart     forecast plot for the default county is rendered
+    script done     the whole run finished
+
+Imports made by the app itself are part of the run; the Streamlit import is not.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+MILESTONES = ['first_element', 'sidebar', 'first_chart', 'script_done']
+
+_CHILD = r"""
+import json, sys, time
+from streamlit.runtime.scriptrunner.script_runner import ScriptRunner
+from streamlit.testing.v1 import AppTest
+
+SIDEBAR = 1  # delta_path root of st.sidebar
+marks = {}
+enqueue = ScriptRunner._enqueue_forward_msg
+
+def timed_enqueue(self, msg):
+    if msg.HasField('delta') and msg.delta.HasField('new_element'):
+        now = time.perf_counter()
+        element = msg.delta.new_element.WhichOneof('type')
+        marks.setdefault('first_element', now)
+        if element == 'selectbox' and msg.metadata.delta_path[0] == SIDEBAR:
+            marks.setdefault('sidebar', now)
+        if element == 'imgs' and not any(img.caption for img in msg.delta.new_element.imgs.imgs):
+            marks.setdefault('first_chart', now)  # st.pyplot; the captioned hero image is skipped
+    return enqueue(self, msg)
+
+ScriptRunner._enqueue_forward_msg = timed_enqueue
+
+at = AppTest.from_file(sys.argv[1], default_timeout=600)
+start = time.perf_counter()
+at.run()
+marks['script_done'] = time.perf_counter()
+if at.exception:
+    raise SystemExit(at.exception[0].value)
+print(json.dumps({name: mark - start for name, mark in marks.items()}))
+"""
+
+
+def run(app):
+    out = subprocess.run([sys.executable, '-c', _CHILD, app], check=True,
+                         capture_output=True, text=True, cwd=os.getcwd())
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--app', default='app.py')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run(args.app) for _ in range(args.repeat)]
+    print(f"{'milestone':<16}{'median s':>10}{'best s':>10}")
+    for name in MILESTONES:
+        times = sorted(r[name] for r in runs if name in r)
+        if times:
+            print(f"{name.replace('_', ' '):<16}{times[len(times) // 2]:>10.3f}{times[0]:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Load test for forecast_service.py.
+
+    python -m benchmarks.load_forecast_service [--spawn] [--concurrency 32] [--requests 2000]
+
+Opens ``--concurrency`` keep-alive connections. Each one sends POST /forecast
+for ``--counties-per-request`` random counties back to back until ``--requests``
+have been sent in total. Reports throughput, p50/p90/p99 latency of successful
+requests, how many were rejected with 503, and the batching stats from /health.
+With ``--spawn``, a local service is started on ``--port`` for the duration of
+the test.
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+
+
+def _request(conn, method, path, payload=None):
+    body = json.dumps(payload).encode() if payload is not None else None
+    conn.request(method, path, body=body, headers={'Content-Type': 'application/json'})
+    response = conn.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def wait_ready(host, port, timeout=120):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=5)
+            status, _ = _request(conn, 'GET', '/health')
+            conn.close()
+            if status == 200:
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise TimeoutError(f"Forecast service on {host}:{port} did not come up")
+
+
+def run(host, port, concurrency, n_requests, counties_per_request, horizon, seed=0):
+    conn = http.client.HTTPConnection(host, port, timeout=60)
+    _, listing = _request(conn, 'GET', '/counties')
+    counties = listing['counties']
+
+    latencies, statuses = [], []
+    lock = threading.Lock()
+    remaining = [n_requests]
+
+    def client(worker):
+        rng = random.Random(seed + worker)
+        conn = http.client.HTTPConnection(host, port, timeout=60)
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    break
+                remaining[0] -= 1
+            payload = {'counties': rng.sample(counties, counties_per_request), 'horizon': horizon}
+            started = time.perf_counter()
+            status, _ = _request(conn, 'POST', '/forecast', payload)
+            elapsed = time.perf_counter() - started
+            with lock:
+                statuses.append(status)
+                if status == 200:
+                    latencies.append(elapsed)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+
+    _, health = _request(conn, 'GET', '/health')
+    conn.close()
+    return wall, np.array(latencies), statuses, health['batching']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--spawn', action='store_true', help="start a local forecast_service.py for the test")
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="passed to the spawned service")
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--counties-per-request', type=int, default=1)
+    parser.add_argument('--horizon', type=int, default=36)
+    args = parser.parse_args()
+
+    service = None
+    if args.spawn:
+        service = subprocess.Popen([sys.executable, 'forecast_service.py', '--host', args.host,
+                                    '--port', str(args.port), '--max-wait-ms', str(args.max_wait_ms)],
+                                   cwd=os.getcwd())
+    try:
+        wait_ready(args.host, args.port)
+        wall, latencies, statuses, batching = run(args.host, args.port, args.concurrency, args.requests,
+                                                  args.counties_per_request, args.horizon)
+    finally:
+        if service is not None:
+            service.terminate()
+            service.wait()
+
+    ok = len(latencies)
+    print(f"{len(statuses)} requests x {args.counties_per_request} counties, concurrency {args.concurrency}: "
+          f"{ok} ok, {statuses.count(503)} rejected (503), {len(statuses) - ok - statuses.count(503)} failed")
+    print(f"throughput {len(statuses) / wall:,.0f} req/s ({ok * args.counties_per_request / wall:,.0f} forecasts/s)")
+    if ok:
+        p50, p90, p99 = np.percentile(latencies, [50, 90, 99]) * 1e3
+        print(f"latency ms: p50 {p50:.1f}  p90 {p90:.1f}  p99 {p99:.1f}  max {latencies.max() * 1e3:.1f}")
+    print(f"batches {batching['batches']}, {batching['mean_requests_per_batch']:.1f} requests / "
+          f"{batching['mean_counties_per_batch']:.1f} counties per batch")
+
+
+if __name__ == '__main__':
+    main()
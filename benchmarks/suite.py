@@ -0,0 +1,254 @@
+"""Benchmark suite: data loading, feature engineering, forecasting, model load and rendering.
+
+    python -m benchmarks.suite                                   # shipped data + 10x/100x synthetic
+    python -m benchmarks.suite --scales 1 10 --out bench.json    # smaller run, keep the results
+    python -m benchmarks.suite --baseline bench.json             # run, then flag slowdowns vs bench.json
+    python -m benchmarks.suite --results new.json --baseline old.json   # compare two saved runs
+
+Every stage runs on the shipped data (scale 1) and on synthetic registration
+data with ``scale`` times as many raw rows (benchmarks.synthetic). The synthetic
+raw frame is preprocessed and written to a temporary CSV before anything is
+timed. Stages:
+
+    load.csv_typed        data_loader.read_csv_typed on the preprocessed CSV
+    load.binary_cache     data_loader.load_dataset with a warm binary cache
+    index.build           data_loader.CountyIndex
+    features.clean        preprocessing.clean on the raw frame
+    features.engineer     preprocessing.engineer_features (lags, rolling mean, pct change, slope)
+    forecast.1/3/all      36-month recursive forecast_counties for 1, 3 and every county
+    forecast.bands.all    forecast_bands (per-tree trajectory percentiles) for every county
+    leaderboard.all       leaderboard.build for every county plus its top 10
+    render.trajectory     charts.trajectory_png for one county
+    render.comparison     charts.comparison_png for three counties
+    render.comparison.40  comparison_frame + downsample + comparison_png for 40 counties
+    model.joblib          joblib.load of the pickled forest (scale independent)
+    model.flat            forest.FlatForest.load of the export (scale independent)
+
+Each stage runs ``--repeat`` times; the best run is what gets compared. Results
+are written as JSON together with the commit and library versions. With
+``--baseline``, any stage whose best time grew by more than ``--threshold``
+(and by more than ``--min-delta`` seconds) is reported and the exit status is 1.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from charts import comparison_frame, comparison_png, downsample, trajectory_png
+from data_loader import DATA_PATH, CountyIndex, load_dataset, read_csv_typed
+from forecast_cache import summarize
+from forecasting import FORECAST_HORIZON, MIN_HISTORY, forecast_bands, forecast_counties
+from forest import FOREST_DIR, MODEL_PATH, FlatForest, load_current, load_model
+from leaderboard import build as build_leaderboard
+from preprocessing import RAW_DATA_PATH, clean, engineer_features, preprocess
+
+RESULTS_VERSION = 1
+
+
+def measure(fn, repeat):
+    """Wall time of ``repeat`` calls of ``fn``."""
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return {'best_s': min(runs), 'median_s': statistics.median(runs), 'runs': runs}
+
+
+def _trajectory_inputs(index, county, forecast):
+    frame = index.history(county)
+    historical = pd.DataFrame({
+        'Date': frame['Date'].values,
+        'Cumulative EV': frame['Cumulative EV'].values,
+        'Source': 'Historical',
+    })
+    combined = pd.concat([historical, forecast[['Date', 'Cumulative EV']].assign(Source='Forecast')],
+                         ignore_index=True)
+    return combined, index.latest_date(county), index.current_total(county), forecast['Cumulative EV'].iloc[-1]
+
+
+def _comparison_frame(index, forecasts):
+    parts = []
+    for county, forecast in forecasts.items():
+        frame = index.history(county)
+        historical = frame[['Date', 'Cumulative EV']]
+        parts.append(pd.concat([historical, forecast[['Date', 'Cumulative EV']]], ignore_index=True)
+                     .assign(County=county))
+    return pd.concat(parts, ignore_index=True)
+
+
+def run_scale(scale, raw, data_path, model, repeat, workdir, log=print):
+    """Time every data-dependent stage on one dataset; returns ``{stage: timing}``."""
+    results = {}
+
+    def record(stage, fn, **info):
+        timing = measure(fn, repeat)
+        results[f'{stage}@{scale}x'] = dict(timing, scale=scale, **info)
+        log(f"  {stage:<20} best {timing['best_s']:8.4f}s  median {timing['median_s']:8.4f}s")
+
+    log(f"\n=== scale {scale}x: {len(raw):,} raw rows ===")
+    cleaned = clean(raw)
+    record('features.clean', lambda: clean(raw), rows=len(raw))
+    record('features.engineer', lambda: engineer_features(cleaned), rows=len(cleaned))
+
+    cache_dir = os.path.join(workdir, f'cache_{scale}')
+    df = load_dataset(data_path, cache_dir)  # writes the binary cache
+    record('load.csv_typed', lambda: read_csv_typed(data_path), rows=len(df))
+    record('load.binary_cache', lambda: load_dataset(data_path, cache_dir), rows=len(df))
+    record('index.build', lambda: CountyIndex(df), rows=len(df))
+
+    index = CountyIndex(df)
+    forecastable = [c for c, n in zip(index.counties, index.tail_lengths) if n >= MIN_HISTORY]
+    # Largest counties first, like the app's default selections
+    forecastable.sort(key=lambda c: -index.current_total(c))
+    for label, counties in [('1', forecastable[:1]), ('3', forecastable[:3]), ('all', forecastable)]:
+        record(f'forecast.{label}', lambda counties=counties: forecast_counties(model, index, counties),
+               counties=len(counties), horizon=FORECAST_HORIZON)
+    record('forecast.bands.all', lambda: forecast_bands(model, index, forecastable),
+           counties=len(forecastable), horizon=FORECAST_HORIZON)
+    record('leaderboard.all', lambda: build_leaderboard(model, index).top(10), counties=len(forecastable))
+
+    forecasts = forecast_counties(model, index, forecastable[:3])
+    county = forecastable[0]
+    args = _trajectory_inputs(index, county, forecasts[county])
+    record('render.trajectory', lambda: trajectory_png(args[0], county, *args[1:]), points=len(args[0]))
+    comp_df = _comparison_frame(index, forecasts)
+    record('render.comparison', lambda: comparison_png(comp_df), points=len(comp_df))
+    many = {c: summarize(f, index.current_total(c))
+            for c, f in forecast_counties(model, index, forecastable[:40]).items()}
+    record('render.comparison.40', lambda: comparison_png(downsample(comparison_frame(index, many))),
+           counties=len(many))
+    return results
+
+
+def synthetic_dataset(scale, base_rows, workdir, seed=0):
+    """Raw synthetic frame with ``scale * base_rows`` rows and the path of its preprocessed CSV."""
+    from benchmarks.synthetic import make_raw
+
+    raw = make_raw(scale * base_rows, seed=seed)
+    path = os.path.join(workdir, f'synthetic_{scale}x.csv')
+    preprocess(raw).to_csv(path, index=False)
+    return raw, path
+
+
+def _git(*args):
+    try:
+        return subprocess.run(['git', *args], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    import matplotlib
+    import sklearn
+
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'sklearn': sklearn.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def run_suite(scales, repeat, log=print):
+    raw = pd.read_csv(RAW_DATA_PATH)
+    model = load_model()
+    results = {}
+
+    log("=== model load ===")
+    for stage, fn in [('model.joblib', lambda: joblib.load(MODEL_PATH)),
+                      ('model.flat', lambda: FlatForest.load(FOREST_DIR))]:
+        if stage == 'model.flat' and load_current() is None:
+            log(f"  {stage:<20} skipped (run `python forest.py export` first)")
+            continue
+        timing = measure(fn, repeat)
+        results[stage] = timing
+        log(f"  {stage:<20} best {timing['best_s']:8.4f}s  median {timing['median_s']:8.4f}s")
+
+    with tempfile.TemporaryDirectory(prefix='ev-bench-') as workdir:
+        for scale in scales:
+            if scale == 1:
+                scale_raw, data_path = raw, DATA_PATH
+            else:
+                scale_raw, data_path = synthetic_dataset(scale, len(raw), workdir)
+            results.update(run_scale(scale, scale_raw, data_path, model, repeat, workdir, log))
+
+    return {
+        'version': RESULTS_VERSION,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git('rev-parse', 'HEAD'),
+        'dirty': bool(_git('status', '--porcelain', '--untracked-files=no')),
+        'environment': environment(),
+        'model': type(model).__name__,
+        'repeat': repeat,
+        'scales': scales,
+        'results': results,
+    }
+
+
+def compare(current, baseline, threshold=1.25, min_delta=0.005):
+    """Print best times side by side; returns the stages that slowed down past ``threshold``."""
+    slower = []
+    print(f"\n{'stage':<28} {'baseline s':>11} {'current s':>11} {'ratio':>7}")
+    for stage, timing in current['results'].items():
+        if stage not in baseline['results']:
+            print(f"{stage:<28} {'-':>11} {timing['best_s']:11.4f}")
+            continue
+        before, after = baseline['results'][stage]['best_s'], timing['best_s']
+        ratio = after / before if before else float('inf')
+        flag = ratio > threshold and after - before > min_delta
+        if flag:
+            slower.append(stage)
+        print(f"{stage:<28} {before:11.4f} {after:11.4f} {ratio:6.2f}x{'  SLOWER' if flag else ''}")
+    if baseline.get('environment') != current.get('environment'):
+        print("\nnote: the runs come from different environments; compare with care")
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100],
+                        help="data sizes as multiples of the shipped raw CSV (1 = the shipped data)")
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--out', help="write the results JSON here")
+    parser.add_argument('--results', help="compare this saved run instead of running the suite")
+    parser.add_argument('--baseline', help="results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=1.25, help="flag stages slower than baseline x this")
+    parser.add_argument('--min-delta', type=float, default=0.005, help="ignore slowdowns smaller than this (s)")
+    args = parser.parse_args()
+
+    if args.results:
+        with open(args.results) as f:
+            current = json.load(f)
+    else:
+        current = run_suite(args.scales, args.repeat)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(current, f, indent=2)
+        print(f"\nWrote {len(current['results'])} results to '{args.out}'")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = compare(current, baseline, args.threshold, args.min_delta)
+        if slower:
+            print(f"\n{len(slower)} stage(s) slower than {args.threshold:g}x baseline: {', '.join(slower)}")
+            sys.exit(1)
+        print(f"\nNo stage slower than {args.threshold:g}x baseline")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+"""Synthetic registration data shaped like Electric_Vehicle_Population_By_County.csv."""
+import numpy as np
+import pandas as pd
+
+STATES = ['WA', 'CA', 'VA', 'MD', 'TX', 'OR', 'NY', 'FL', 'IL', 'CO']
+USES = ['Passenger', 'Truck']
+
+
+def _with_thousands(counts):
+    """Format counts like the DOL export, which writes values >= 1000 as "3,575"."""
+    text = pd.Series(counts).map('{:,}'.format)
+    return text.values
+
+
+def make_raw(n_rows, months=86, seed=0):
+    """Raw registration frame with ``n_rows`` rows (string-typed counts, free-text dates)."""
+    rng = np.random.default_rng(seed)
+    per_series = months * len(USES)
+    n_counties = max(1, -(-n_rows // per_series))
+
+    month_ends = pd.date_range("2017-01-31", periods=months, freq="ME")
+    date_text = month_ends.strftime("%B %d %Y").values
+
+    county_idx = np.repeat(np.arange(n_counties), per_series)[:n_rows]
+    month_idx = np.tile(np.repeat(np.arange(months), len(USES)), n_counties)[:n_rows]
+    use_idx = np.tile(np.arange(len(USES)), n_counties * months)[:n_rows]
+
+    base = rng.gamma(1.5, 40.0, size=n_counties)[county_idx]
+    growth = np.exp(month_idx * rng.uniform(0.005, 0.04, size=n_counties)[county_idx])
+    bev = rng.poisson(base * growth * np.where(use_idx == 0, 1.0, 0.2))
+    phev = rng.poisson(base * growth * np.where(use_idx == 0, 0.4, 0.05))
+    non_ev = rng.poisson(base * 15 + 20)
+    total = bev + phev + non_ev
+
+    raw = pd.DataFrame({
+        'Date': date_text[month_idx],
+        'County': pd.Series([f"County {i}" for i in range(n_counties)]).values[county_idx],
+        'State': np.array(STATES)[county_idx % len(STATES)],
+        'Vehicle Primary Use': np.array(USES)[use_idx],
+        'Battery Electric Vehicles (BEVs)': _with_thousands(bev),
+        'Plug-In Hybrid Electric Vehicles (PHEVs)': _with_thousands(phev),
+        'Electric Vehicle (EV) Total': _with_thousands(bev + phev),
+        'Non-Electric Vehicle Total': _with_thousands(non_ev),
+        'Total Vehicles': _with_thousands(total),
+        'Percent Electric Vehicles': np.round((bev + phev) / total * 100, 2),
+    })
+    # Shuffle like the source export, which is not ordered by county or date
+    return raw.iloc[rng.permutation(n_rows)].reset_index(drop=True)
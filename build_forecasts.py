@@ -0,0 +1,115 @@
+"""Precompute the 36-month forecast for every county into a read-only table.
+
+    python build_forecasts.py                 # all cores, writes artifacts/forecasts.npz
+    python build_forecasts.py --jobs 1 --out /tmp/forecasts.npz
+
+Writes the arrays as an uncompressed .npz, stamped with the store version and
+the model and data hashes it was built from, next to a ``.manifest.json``
+recording those plus the build time. Both files are swapped in whole; readers
+trust only the stamp inside the .npz. Start app.py with
+``EV_FORECAST_ARTIFACT=artifacts/forecasts.npz`` to serve from it.
+"""
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from data_loader import CountyIndex, load_dataset
+from fingerprints import file_fingerprint
+from forecast_store import FORECAST_ARTIFACT, STORE_VERSION, manifest_path
+from forest import load_model
+from forecasting import FORECAST_HORIZON, MIN_HISTORY, forecast_counties
+
+MODEL_PATH = 'forecasting_ev_model.pkl'
+DATA_PATH = 'preprocessed_ev_data.csv'
+
+_worker = {}
+
+
+def _init_worker(model_path, data_path):
+    _worker['model'] = load_model(model_path)
+    _worker['index'] = CountyIndex(load_dataset(data_path))
+
+
+def _forecast_chunk(counties, horizon):
+    return forecast_counties(_worker['model'], _worker['index'], counties, horizon=horizon)
+
+
+def build(model_path=MODEL_PATH, data_path=DATA_PATH, out=FORECAST_ARTIFACT,
+          horizon=FORECAST_HORIZON, jobs=None):
+    started = time.perf_counter()
+    jobs = jobs or os.cpu_count() or 1
+
+    index = CountyIndex(load_dataset(data_path))
+    enough = index.tail_lengths >= MIN_HISTORY
+    counties = [county for county, ok in zip(index.counties, enough) if ok]
+    skipped = [county for county, ok in zip(index.counties, enough) if not ok]
+
+    if jobs == 1:
+        _init_worker(model_path, data_path)
+        forecasts = _forecast_chunk(counties, horizon)
+    else:
+        # Each worker loads the model once and forecasts one contiguous chunk in lockstep
+        chunks = [chunk.tolist() for chunk in np.array_split(np.array(counties, dtype=object), jobs) if len(chunk)]
+        forecasts = {}
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                                 initargs=(model_path, data_path)) as pool:
+            for part in pool.map(_forecast_chunk, chunks, [horizon] * len(chunks)):
+                forecasts.update(part)
+
+    arrays = {
+        'counties': np.array(counties, dtype=str),
+        'dates': np.stack([forecasts[c]['Date'].values.astype('datetime64[ns]') for c in counties]),
+        'predicted': np.stack([forecasts[c]['Predicted EV Total'].values for c in counties]),
+        'cumulative': np.stack([forecasts[c]['Cumulative EV'].values for c in counties]),
+        'current_total': index.current_totals[enough],
+        'version': np.array(STORE_VERSION),
+        'model_hash': np.array(file_fingerprint(model_path)),
+        'data_hash': np.array(file_fingerprint(data_path)),
+    }
+
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    tmp = out + ".tmp.npz"
+    np.savez(tmp, **arrays)
+    os.replace(tmp, out)
+
+    manifest = {
+        'version': STORE_VERSION,
+        'model_hash': arrays['model_hash'].item(),
+        'data_hash': arrays['data_hash'].item(),
+        'built_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'horizon': horizon,
+        'counties': len(counties),
+        'skipped_counties': skipped,
+        'build_seconds': round(time.perf_counter() - started, 3),
+        'jobs': jobs,
+    }
+    tmp = manifest_path(out) + ".tmp"
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, manifest_path(out))
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--data", default=DATA_PATH)
+    parser.add_argument("--out", default=FORECAST_ARTIFACT)
+    parser.add_argument("--horizon", type=int, default=FORECAST_HORIZON,
+                        help="months ahead; the app only serves stores of FORECAST_HORIZON months")
+    parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    args = parser.parse_args()
+
+    manifest = build(args.model, args.data, args.out, args.horizon, args.jobs)
+    print(f"Forecast {manifest['counties']} counties in {manifest['build_seconds']}s -> {args.out}")
+    if manifest['skipped_counties']:
+        print(f"Skipped (< {MIN_HISTORY} months of history): {', '.join(manifest['skipped_counties'])}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Static renderings of the app's trajectory and comparison charts.
+
+Figures are built with matplotlib's object API (``matplotlib.figure.Figure``),
+not pyplot, so they are never added to pyplot's global figure registry and are
+freed as soon as the PNG bytes have been written. The savefig options match
+``st.pyplot``, except that the resolution is capped at the width st.image
+displays, so the bytes can be served as they are instead of being resized on
+every rerun.
+"""
+import io
+
+import numpy as np
+import pandas as pd
+
+from forecasting import BAND_QUANTILES, FORECAST_HORIZON
+
+SAVEFIG_OPTIONS = {'format': 'png', 'bbox_inches': 'tight', 'dpi': 200}
+# st.image shrinks wider images to this width and re-encodes them on every call
+MAX_WIDTH_PX = 1460
+# Points kept across all series of a comparison chart; see downsample()
+COMPARISON_POINTS = 2400
+MIN_SERIES_POINTS = 40
+MARKED_SERIES = 6  # beyond this many counties lines are drawn without markers
+
+
+def _new_figure(figsize):
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=figsize)
+    return fig, fig.subplots()
+
+
+def _to_png(fig):
+    buffer = io.BytesIO()
+    dpi = min(SAVEFIG_OPTIONS['dpi'], MAX_WIDTH_PX / fig.get_figwidth())
+    fig.savefig(buffer, **dict(SAVEFIG_OPTIONS, dpi=dpi))
+    return buffer.getvalue()
+
+
+def trajectory_png(combined, county, latest_date, historical_total, forecasted_total, horizon=FORECAST_HORIZON,
+                   bands=None):
+    """Cumulative EVs for one county, historical and forecast, as PNG bytes.
+
+    ``bands`` is the county's forecasting.forecast_bands frame; the outer
+    percentiles are shaded and the median drawn dashed.
+    """
+    fig, ax = _new_figure((14, 8))
+
+    # Plot with better styling
+    colors = ['#00ff88', '#ff6b6b']
+    markers = ['o', 's']
+    source_colors = {}
+    for i, (label, data) in enumerate(combined.groupby('Source')):
+        source_colors[label] = colors[i]
+        ax.plot(data['Date'], data['Cumulative EV'],
+               label=label, marker=markers[i], color=colors[i],
+               linewidth=3, markersize=6, alpha=0.9)
+
+    if bands is not None:
+        low, mid, high = (f'P{q}' for q in BAND_QUANTILES)
+        band_color = source_colors.get('Forecast', colors[0])
+        ax.fill_between(bands['Date'], bands[low], bands[high], color=band_color, alpha=0.2,
+                        label=f'{low}-{high} range')
+        ax.plot(bands['Date'], bands[mid], color=band_color, linestyle='--', linewidth=1.5,
+                alpha=0.8, label=f'Median ({mid})')
+
+    # Enhanced styling
+    ax.set_title(f"EV Adoption Trajectory: {county} County",
+                fontsize=18, color='white', fontweight='bold', pad=20)
+    ax.set_xlabel("Date", color='white', fontsize=14, fontweight='600')
+    ax.set_ylabel("Cumulative EV Count", color='white', fontsize=14, fontweight='600')
+
+    # Grid and background
+    ax.grid(True, alpha=0.2, linestyle='--')
+    ax.set_facecolor("#1a1a1a")
+    fig.patch.set_facecolor('#1a1a1a')
+
+    # Styling ticks and legend
+    ax.tick_params(colors='white', labelsize=12)
+    legend = ax.legend(loc='upper left', frameon=True, fancybox=True, shadow=True)
+    legend.get_frame().set_facecolor('#2a2a2a')
+    legend.get_frame().set_alpha(0.9)
+    for text in legend.get_texts():
+        text.set_color('white')
+
+    # Add annotations for key points
+    if historical_total > 0:
+        # Mark current point
+        ax.annotate(f'Current: {int(historical_total):,}',
+                   xy=(latest_date, historical_total),
+                   xytext=(10, 10), textcoords='offset points',
+                   color='#00ff88', fontweight='bold',
+                   bbox=dict(boxstyle='round,pad=0.5', facecolor='#00ff88', alpha=0.2))
+
+        # Mark forecast end point
+        forecast_end_date = latest_date + pd.DateOffset(months=horizon)
+        ax.annotate(f'Projected: {int(forecasted_total):,}',
+                   xy=(forecast_end_date, forecasted_total),
+                   xytext=(10, -20), textcoords='offset points',
+                   color='#ff6b6b', fontweight='bold',
+                   bbox=dict(boxstyle='round,pad=0.5', facecolor='#ff6b6b', alpha=0.2))
+
+    fig.tight_layout()
+    return _to_png(fig)
+
+
+def comparison_frame(index, forecasts):
+    """Long frame (Date, Cumulative EV, County) of each county's history followed by its forecast.
+
+    ``forecasts`` is ``{county: CountyForecast}``; the histories are cumulated in
+    one pass over the counties' row slices of the CountyIndex's county rollup.
+    """
+    counties = list(forecasts)
+    monthly = index.rollups.county
+    pos = np.array([index.position(county) for county in counties], dtype=np.int64)
+    lengths = monthly.stops[pos] - monthly.starts[pos]
+    ends = np.cumsum(lengths)
+    rows = np.concatenate([np.arange(monthly.starts[p], monthly.stops[p]) for p in pos])
+    cumulative = np.cumsum(monthly.measures['ev'][rows].astype(float))
+    cumulative -= np.repeat(np.r_[0.0, cumulative][ends - lengths], lengths)  # restart at each county
+
+    # Interleave [history, forecast] per county so every series is drawn in date order
+    dates, values, names = [], [], []
+    for i, county in enumerate(counties):
+        forecast = forecasts[county].forecast
+        lo, hi = ends[i] - lengths[i], ends[i]
+        dates += [index.rollups.months[monthly.month[rows[lo:hi]]], forecast['Date'].values.astype('datetime64[ns]')]
+        values += [cumulative[lo:hi], forecast['Cumulative EV'].values.astype(float)]
+        names.append(np.full(hi - lo + len(forecast), county, dtype=object))
+    return pd.DataFrame({
+        'Date': np.concatenate(dates),
+        'Cumulative EV': np.concatenate(values),
+        'County': np.concatenate(names),
+    })
+
+
+def lttb(x, y, n_out):
+    """Indices of the ``n_out`` points of (x, y) that largest-triangle-three-buckets keeps.
+
+    The first and last points are kept; every bucket in between contributes the
+    point spanning the largest triangle with the point kept before it and the
+    mean of the next bucket, so peaks and bends survive the thinning.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)  # bucket i is [edges[i], edges[i + 1])
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            next_x, next_y = x[hi:edges[i + 2]].mean(), y[hi:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
+        area = np.abs((x[a] - next_x) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[i + 1] = a
+    return keep
+
+
+def downsample(comp_df, points=COMPARISON_POINTS, by='County'):
+    """``comp_df`` with each ``by`` series thinned by lttb() to its share of ``points`` (at least MIN_SERIES_POINTS).
+
+    Charts of a few counties come back unchanged.
+    """
+    groups = comp_df.groupby(by, sort=False).indices
+    per_series = max(MIN_SERIES_POINTS, points // max(len(groups), 1))
+    if all(len(rows) <= per_series for rows in groups.values()):
+        return comp_df
+    x = comp_df['Date'].values.astype('datetime64[ns]').astype(np.int64).astype(float)
+    y = comp_df['Cumulative EV'].values.astype(float)
+    kept = [rows[lttb(x[rows], y[rows], per_series)] for rows in groups.values()]
+    return comp_df.iloc[np.concatenate(kept)].reset_index(drop=True)
+
+
+def comparison_png(comp_df):
+    """Cumulative EVs of several counties (``County`` column), historical + forecast, as PNG bytes.
+
+    Up to MARKED_SERIES counties get the app's palette and markers; more are
+    drawn as plain lines in a 20-colour cycle with a multi-column legend.
+    """
+    fig, ax = _new_figure((16, 9))
+
+    # Enhanced color palette for comparison
+    colors = ['#00ff88', '#ff6b6b', '#4ecdc4', '#45b7d1', '#96ceb4', '#feca57']
+    markers = ['o', 's', '^', 'D', 'v', 'p']
+
+    groups = comp_df.groupby('County')
+    many = len(groups) > MARKED_SERIES
+    if many:
+        from matplotlib import colormaps
+        colors = [colormaps['tab20'](i) for i in range(20)]
+    for idx, (cty, group) in enumerate(groups):
+        ax.plot(group['Date'], group['Cumulative EV'],
+               marker=None if many else markers[idx % len(markers)],
+               color=colors[idx % len(colors)],
+               label=cty, linewidth=2 if many else 3, markersize=8, alpha=0.9)
+
+    ax.set_title("Multi-County EV Adoption Comparison: Historical Data + 3-Year Forecasts",
+                fontsize=20, color='white', fontweight='bold', pad=25)
+    ax.set_xlabel("Timeline", color='white', fontsize=16, fontweight='600')
+    ax.set_ylabel("Cumulative Electric Vehicles", color='white', fontsize=16, fontweight='600')
+
+    # Enhanced styling
+    ax.grid(True, alpha=0.2, linestyle='--')
+    ax.set_facecolor("#1a1a1a")
+    fig.patch.set_facecolor('#1a1a1a')
+    ax.tick_params(colors='white', labelsize=14)
+
+    # Enhanced legend
+    legend = ax.legend(loc='upper left', frameon=True, fancybox=True, shadow=True, fontsize=9 if many else 12,
+                       ncol=1 + (len(groups) - 1) // 16)
+    legend.get_frame().set_facecolor('#2a2a2a')
+    legend.get_frame().set_alpha(0.95)
+    legend.set_title("Counties", prop={'size': 14, 'weight': 'bold'})
+    legend.get_title().set_color('white')
+    for text in legend.get_texts():
+        text.set_color('white')
+
+    fig.tight_layout()
+    return _to_png(fig)
@@ -0,0 +1,309 @@
+"""Forest compaction: smaller variants of the forecasting forest and their size/latency/accuracy trade-off.
+
+    python compact.py report [--trees 25 50 100] [--depths 8 12] [--distill 50] [--out artifacts/compact_report.json]
+    python compact.py write subset-50 [--out forecasting_ev_model_compact.pkl]
+
+Variants of the fitted RandomForestRegressor (``--model``):
+
+    original           the model as shipped
+    subset-<k>         k of its trees, chosen greedily: each pick is the tree that
+                       brings the running average closest to the full forest's
+                       predictions on the teacher rows (below)
+    depth-<d>          every tree cut at depth d; a cut node predicts the mean of
+                       its training samples, which sklearn keeps for every node
+    distill-forest-<k> a new forest of k trees of depth DISTILL_DEPTH fitted to the
+                       full forest's predictions on the teacher rows
+    distill-gbm        a HistGradientBoostingRegressor fitted to the same predictions
+
+The teacher rows are the dataset's feature rows plus the feature rows the
+recursive forecast itself produces, replayed from every ORIGIN_STEP-th month.
+Later forecast months are built from predicted lags, so the students learn the
+inputs the app actually feeds the model.
+
+``report`` measures each variant:
+
+- pickle and flat-export (forest.py) size, and the time to load each;
+- per-step predict latency on one county and on every forecastable county (one
+  month of forecast_counties), through the flattened forest for forest variants;
+- backtest.py MAE and MAPE of the recursive forecast, from origins since ``--since``.
+
+The original was trained on every month, so its backtest scores are in-sample,
+and so are the students' targets. Compare variants by how far they move from
+the original rather than by the absolute numbers.
+
+``write`` saves one variant as a pickle and, for forest variants, its flat
+export. To serve it, write it over forest.MODEL_PATH and rerun
+``python forest.py export``. The gradient-boosted variant has no trees to
+draw uncertainty bands from.
+"""
+import argparse
+import copy
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from backtest import ORIGIN_STEP, backtest, origin_months, origin_seeds
+from data_loader import DATA_PATH, CountyIndex, load_dataset
+from forecasting import FEATURES, FORECAST_HORIZON, MIN_HISTORY, FeatureState, predict
+from forest import MODEL_PATH, FlatForest
+
+COMPACT_MODEL_PATH = 'forecasting_ev_model_compact.pkl'
+COMPACT_FOREST_DIR = os.path.join('artifacts', 'forest_compact')
+SUBSET_TREES = [25, 50, 100]
+DEPTHS = [8, 12]
+DISTILL_TREES = 50
+DISTILL_DEPTH = 14
+SELECTION_ROWS = 20_000  # teacher rows sampled for greedy tree selection
+RANDOM_STATE = 42
+
+
+def teacher_rows(model, index, step=ORIGIN_STEP):
+    """Feature rows (data rows + recursive forecast states) and the model's predictions for them."""
+    data = np.column_stack([index.df[col].values for col in FEATURES]).astype(np.float64)
+    seeds = origin_seeds(index, origin_months(index, step))
+    state = FeatureState(seeds['tails'], seeds['observed'], seeds['months'], seeds['codes'], seeds['cumulative'])
+    blocks = [data]
+    for _ in range(FORECAST_HORIZON):
+        blocks.append(state.features())
+        state.push(predict(model, blocks[-1]))
+    X = np.concatenate(blocks)
+    return X, predict(model, X)
+
+
+def _with_trees(model, estimators):
+    compact = copy.copy(model)
+    compact.estimators_ = estimators
+    compact.n_estimators = len(estimators)
+    return compact
+
+
+def subset(model, X, y, k):
+    """``model`` keeping the ``k`` trees chosen greedily to match ``y`` (the full forest's predictions)."""
+    per_tree = FlatForest.from_sklearn(model)
+    leaves = per_tree.leaves(X)
+    values = per_tree.value[leaves]  # trees x rows
+    total, chosen = np.zeros(len(X)), []
+    remaining = np.ones(len(values), dtype=bool)
+    for picked in range(1, min(k, len(values)) + 1):
+        error = np.abs((total + values) / picked - y).mean(axis=1)
+        error[~remaining] = np.inf
+        best = int(np.argmin(error))
+        chosen.append(best)
+        remaining[best] = False
+        total += values[best]
+    return _with_trees(model, [model.estimators_[t] for t in sorted(chosen)])
+
+
+def _cap_tree(tree, depth):
+    """Copy of a fitted sklearn Tree whose nodes below ``depth`` are dropped."""
+    from sklearn.tree._tree import TREE_LEAF, TREE_UNDEFINED, Tree
+
+    state = tree.__getstate__()
+    nodes, values = state['nodes'], state['values']
+    levels = np.zeros(len(nodes), dtype=np.int64)
+    for node in range(len(nodes)):  # nodes are stored parents first
+        if nodes['left_child'][node] != TREE_LEAF:
+            levels[[nodes['left_child'][node], nodes['right_child'][node]]] = levels[node] + 1
+    keep = levels <= depth
+    renumber = np.cumsum(keep) - 1
+    nodes = nodes[keep].copy()
+    cut = (levels[keep] == depth) & (nodes['left_child'] != TREE_LEAF)
+    internal = nodes['left_child'] != TREE_LEAF
+    nodes['left_child'][internal] = renumber[nodes['left_child'][internal]]
+    nodes['right_child'][internal] = renumber[nodes['right_child'][internal]]
+    nodes['left_child'][cut] = nodes['right_child'][cut] = TREE_LEAF
+    nodes['feature'][cut] = TREE_UNDEFINED
+    nodes['threshold'][cut] = TREE_UNDEFINED
+    capped = Tree(tree.n_features, np.array([1], dtype=np.intp), 1)
+    capped.__setstate__({'max_depth': min(depth, state['max_depth']), 'node_count': len(nodes),
+                         'nodes': nodes, 'values': np.ascontiguousarray(values[keep])})
+    return capped
+
+
+def cap_depth(model, depth):
+    """``model`` with every tree cut at ``depth``."""
+    estimators = []
+    for estimator in model.estimators_:
+        estimator = copy.copy(estimator)
+        estimator.tree_ = _cap_tree(estimator.tree_, depth)
+        estimators.append(estimator)
+    return _with_trees(model, estimators)
+
+
+def distill_forest(X, y, n_estimators=DISTILL_TREES, depth=DISTILL_DEPTH, jobs=None):
+    from sklearn.ensemble import RandomForestRegressor
+
+    student = RandomForestRegressor(n_estimators=n_estimators, max_depth=depth, min_samples_leaf=2,
+                                    max_features=None, random_state=RANDOM_STATE, n_jobs=jobs or -1)
+    student.fit(X, y)
+    student.set_params(n_jobs=None)
+    return student
+
+
+def distill_gbm(X, y):
+    from sklearn.ensemble import HistGradientBoostingRegressor
+
+    student = HistGradientBoostingRegressor(max_iter=300, learning_rate=0.1, max_leaf_nodes=63,
+                                            early_stopping=False, random_state=RANDOM_STATE)
+    return student.fit(X, y)
+
+
+def build_variant(name, model, X, y, jobs=None):
+    """The sklearn model for variant ``name`` (see the module docstring)."""
+    kind, _, size = name.rpartition('-')
+    if name == 'original':
+        return model
+    if name == 'distill-gbm':
+        return distill_gbm(X, y)
+    if kind == 'subset':
+        sample = np.random.default_rng(RANDOM_STATE).permutation(len(X))[:SELECTION_ROWS]
+        return subset(model, X[sample], y[sample], int(size))
+    if kind == 'depth':
+        return cap_depth(model, int(size))
+    if kind == 'distill-forest':
+        return distill_forest(X, y, int(size), jobs=jobs)
+    raise ValueError(f"Unknown variant '{name}'")
+
+
+def save_variant(model, out, forest_dir=None):
+    """Pickle ``model`` to ``out`` and, for forests, export it to ``forest_dir``; returns the flat forest."""
+    import joblib
+
+    from fingerprints import file_fingerprint
+
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    joblib.dump(model, out + '.tmp')
+    os.replace(out + '.tmp', out)
+    if forest_dir is None or not hasattr(model, 'estimators_'):
+        return None
+    forest = FlatForest.from_sklearn(model)
+    forest.save(forest_dir, source_hash=file_fingerprint(out))
+    return forest
+
+
+def _size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+    return os.path.getsize(path)
+
+
+def _best(fn, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - start)
+    return min(runs)
+
+
+def measure(model, index, origins, X_step, workdir, repeat=5, jobs=None):
+    """Size, load time, per-step latency and backtest scores of one sklearn ``model``."""
+    import joblib
+
+    path = os.path.join(workdir, 'model.pkl')
+    forest = save_variant(model, path, os.path.join(workdir, 'forest'))
+    serving = model if forest is None else forest
+    result = {
+        'pickle_mb': _size(path) / 1e6,
+        'load_pickle_s': _best(lambda: joblib.load(path), repeat),
+        'flat_mb': None if forest is None else _size(os.path.join(workdir, 'forest')) / 1e6,
+        'load_flat_s': None if forest is None else _best(lambda: FlatForest.load(os.path.join(workdir, 'forest')),
+                                                        repeat),
+        'trees': len(getattr(model, 'estimators_', [])) or None,
+        'nodes': None if forest is None else len(forest.feature),
+        'step_1_ms': _best(lambda: predict(serving, X_step[:1]), repeat) * 1000,
+        'step_all_ms': _best(lambda: predict(serving, X_step), repeat) * 1000,
+    }
+    scores = backtest(serving, index, origins, jobs=jobs)
+    result['backtest'] = scores['summary']
+    result['MAE'], result['MAPE %'] = scores['summary']['MAE'], scores['summary']['MAPE %']
+    result['h36 MAE'] = float(scores['by_horizon']['MAE'].iloc[-1])
+    return result
+
+
+def variant_names(trees=SUBSET_TREES, depths=DEPTHS, distill=DISTILL_TREES, gbm=True):
+    names = ['original'] + [f'subset-{k}' for k in trees] + [f'depth-{d}' for d in depths]
+    if distill:
+        names.append(f'distill-forest-{distill}')
+    if gbm:
+        names.append('distill-gbm')
+    return names
+
+
+def report(model_path=MODEL_PATH, data_path=DATA_PATH, names=None, since=None, repeat=5, jobs=None, log=print):
+    """Build and measure every variant in ``names``; returns the report dict."""
+    import joblib
+    import pandas as pd
+
+    names = names or variant_names()
+    model = joblib.load(model_path)
+    index = CountyIndex(load_dataset(data_path))
+    origins = origin_months(index, ORIGIN_STEP, since)
+    counties = [pos for pos, n in enumerate(index.tail_lengths) if n >= MIN_HISTORY]
+    X_step = FeatureState(index.tails[counties], index.tail_lengths[counties], index.months_since_start[counties],
+                          index.codes[counties], index.current_totals[counties]).features()
+
+    started = time.perf_counter()
+    X, y = teacher_rows(model, index)
+    log(f"{len(X):,} teacher rows ({len(index.df):,} data rows + forecast states) in "
+        f"{time.perf_counter() - started:.1f}s")
+
+    result = {'model': model_path, 'since': since, 'origins': len(origins), 'variants': {}}
+    with tempfile.TemporaryDirectory(prefix='ev-compact-') as workdir:
+        for name in names:
+            started = time.perf_counter()
+            variant = build_variant(name, model, X, y, jobs)
+            built = time.perf_counter() - started
+            entry = measure(variant, index, origins, X_step, os.path.join(workdir, name), repeat, jobs)
+            entry['build_s'] = built
+            result['variants'][name] = entry
+            log(f"{name:<18} {entry['pickle_mb']:6.2f} MB, step {entry['step_all_ms']:6.2f} ms, "
+                f"backtest MAE {entry['MAE']:,.2f} (built in {built:.1f}s)")
+
+    table = pd.DataFrame(result['variants']).T[['trees', 'nodes', 'pickle_mb', 'flat_mb', 'load_pickle_s',
+                                                'load_flat_s', 'step_1_ms', 'step_all_ms', 'MAE', 'MAPE %',
+                                                'h36 MAE']]
+    log("\n" + table.to_string(float_format=lambda v: f"{v:,.3f}"))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['report', 'write'])
+    parser.add_argument('variant', nargs='?', help="variant to write, e.g. subset-50 or depth-12")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--trees', type=int, nargs='*', default=SUBSET_TREES, help="subset sizes to report")
+    parser.add_argument('--depths', type=int, nargs='*', default=DEPTHS, help="depth caps to report")
+    parser.add_argument('--distill', type=int, default=DISTILL_TREES, help="distilled forest trees (0: skip)")
+    parser.add_argument('--no-gbm', action='store_true', help="skip the gradient-boosted student")
+    parser.add_argument('--since', help="earliest backtest origin")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--jobs', type=int)
+    parser.add_argument('--out', help="report JSON (report) or pickle (write, default "
+                                      f"{COMPACT_MODEL_PATH})")
+    parser.add_argument('--forest-dir', default=COMPACT_FOREST_DIR, help="flat export of the written variant")
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        result = report(args.model, args.data, variant_names(args.trees, args.depths, args.distill, not args.no_gbm),
+                        args.since, args.repeat, args.jobs)
+        if args.out:
+            os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+            with open(args.out, 'w') as f:
+                json.dump(result, f, indent=2, default=str)
+    else:
+        import joblib
+
+        if not args.variant:
+            parser.error("write needs a variant, e.g. subset-50")
+        model = joblib.load(args.model)
+        X, y = teacher_rows(model, CountyIndex(load_dataset(args.data)))
+        out = args.out or COMPACT_MODEL_PATH
+        forest = save_variant(build_variant(args.variant, model, X, y, args.jobs), out, args.forest_dir)
+        print(f"Saved {args.variant} to '{out}' ({_size(out) / 1e6:.2f} MB)"
+              + ("" if forest is None else f", {forest.n_trees} trees / {len(forest.feature):,} nodes "
+                                           f"exported to '{args.forest_dir}'"))
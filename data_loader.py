@@ -0,0 +1,312 @@
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from fingerprints import file_fingerprint
+from forecasting import HISTORY_WINDOW
+from rollups import Rollups, month_numbers
+
+DATA_PATH = "preprocessed_ev_data.csv"
+DATA_CACHE_DIR = os.path.join("artifacts", "data_cache")
+CACHE_VERSION = 1
+MANIFEST_VERSION = 2  # 2: states and statewide EV/BEV/PHEV totals
+
+# Explicit dtypes for preprocessed_ev_data.csv; Date is parsed separately
+SCHEMA = {
+    'County': 'category',
+    'State': 'category',
+    'Vehicle Primary Use': 'category',
+    'Battery Electric Vehicles (BEVs)': np.int32,
+    'Plug-In Hybrid Electric Vehicles (PHEVs)': np.int32,
+    'Electric Vehicle (EV) Total': np.int32,
+    'Non-Electric Vehicle Total': np.int32,
+    'Total Vehicles': np.int32,
+    'Percent Electric Vehicles': np.float32,
+    'year': np.int32,
+    'month': np.int32,
+    'numeric_date': np.int32,
+    'county_encoded': np.int32,
+    'months_since_start': np.int32,
+    'ev_total_lag1': np.float32,
+    'ev_total_lag2': np.float32,
+    'ev_total_lag3': np.float32,
+    'ev_total_roll_mean_3': np.float32,
+    'ev_total_pct_change_1': np.float32,
+    'ev_total_pct_change_3': np.float32,
+    'cumulative_ev': np.float64,  # running totals can outgrow float32's exact integers
+    'ev_growth_slope': np.float32,
+}
+
+
+def read_csv_typed(path=DATA_PATH):
+    """Parse the preprocessed CSV straight into the compact SCHEMA dtypes."""
+    # Counts are written as "12.0", so they are parsed as floats and narrowed afterwards
+    integer_columns = [col for col, dtype in SCHEMA.items() if dtype != 'category' and np.dtype(dtype).kind == 'i']
+    parse_dtypes = dict(SCHEMA, **{col: np.float64 for col in integer_columns})
+
+    df = pd.read_csv(path, dtype=parse_dtypes)
+    df['Date'] = pd.to_datetime(df['Date'], format='%Y-%m-%d')
+    return df.astype({col: SCHEMA[col] for col in integer_columns})
+
+
+def _cache_dir(path, cache_dir):
+    return os.path.join(cache_dir, os.path.splitext(os.path.basename(path))[0])
+
+
+def _read_meta(target):
+    try:
+        with open(os.path.join(target, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(df, path, cache_dir=DATA_CACHE_DIR):
+    """Store ``df`` as one .npy file per column plus a meta.json describing the source CSV."""
+    target = _cache_dir(path, cache_dir)
+    tmp = target + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    columns = []
+    for idx, col in enumerate(df.columns):
+        series = df[col]
+        entry = {'name': col, 'file': f'{idx:02d}.npy'}
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entry['categories'] = series.cat.categories.tolist()
+            values = series.cat.codes.values
+        else:
+            values = series.values
+        np.save(os.path.join(tmp, entry['file']), values)
+        columns.append(entry)
+
+    st = os.stat(path)
+    meta = {
+        'version': CACHE_VERSION,
+        'source_mtime_ns': st.st_mtime_ns,
+        'source_size': st.st_size,
+        'source_hash': file_fingerprint(path),
+        'rows': len(df),
+        'columns': columns,
+    }
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    shutil.rmtree(target, ignore_errors=True)
+    os.replace(tmp, target)
+
+
+def read_cache(path, cache_dir=DATA_CACHE_DIR):
+    """Frame from the binary cache, or None when it is missing or stale.
+
+    A matching mtime and size is trusted as-is; otherwise the CSV is hashed and the
+    cache is kept (with a refreshed mtime) only if the contents are unchanged.
+    """
+    target = _cache_dir(path, cache_dir)
+    meta = _read_meta(target)
+    if meta is None or meta.get('version') != CACHE_VERSION:
+        return None
+
+    st = os.stat(path)
+    if (meta['source_mtime_ns'], meta['source_size']) != (st.st_mtime_ns, st.st_size):
+        if file_fingerprint(path) != meta['source_hash']:
+            return None
+        meta['source_mtime_ns'], meta['source_size'] = st.st_mtime_ns, st.st_size
+        with open(os.path.join(target, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+
+    data = {}
+    for entry in meta['columns']:
+        values = np.load(os.path.join(target, entry['file']), mmap_mode='r')
+        if 'categories' in entry:
+            values = pd.Categorical.from_codes(values, categories=entry['categories'])
+        data[entry['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def load_dataset(path=DATA_PATH, cache_dir=DATA_CACHE_DIR, states=None):
+    """Typed preprocessed dataset, served from the binary cache when it is current.
+
+    ``path`` is the preprocessed CSV or a partitioned dataset directory from
+    ingest.py, which is read with read_partitions: only the ``states``
+    partitions are opened. A CSV is filtered to ``states`` after loading.
+    """
+    if os.path.isdir(path):
+        return read_partitions(path, states=states)
+    df = read_cache(path, cache_dir)
+    if df is None:
+        df = read_csv_typed(path)
+        try:
+            write_cache(df, path, cache_dir)
+        except OSError:
+            pass  # read-only deployments still work, just without the cache
+    if states is not None:
+        df = df[df['State'].isin(list(states))].reset_index(drop=True)
+    return df
+
+
+def read_partitions(root, counties=None, states=None):
+    """Typed rows of the partitioned dataset written by ingest.py, limited to ``counties`` / ``states``.
+
+    Only the matching State=/County= directories are opened. Rows come back in
+    the preprocessed CSV's order, (county_encoded, months_since_start).
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    with open(os.path.join(root, '_manifest.json')) as f:
+        columns = json.load(f)['columns']
+    partitioning = ds.partitioning(pa.schema([('State', pa.string()), ('County', pa.string())]), flavor='hive')
+    dataset = ds.dataset(root, format='parquet', partitioning=partitioning)
+    condition = None
+    for field, values in (('County', counties), ('State', states)):
+        if values is not None:
+            match = ds.field(field).isin(list(values))
+            condition = match if condition is None else condition & match
+    df = dataset.to_table(filter=condition).to_pandas()[columns]
+    df = df.sort_values(['county_encoded', 'months_since_start'], kind='stable', ignore_index=True)
+    return df.astype(SCHEMA)
+
+
+def _manifest_path(path, cache_dir, states=None):
+    suffix = '' if states is None else '.' + '-'.join(sorted(states))
+    return _cache_dir(path, cache_dir) + suffix + '.counties.json'
+
+
+def county_manifest(index, path):
+    """County list and dataset summary the sidebar needs, as plain JSON values."""
+    return {
+        'version': MANIFEST_VERSION,
+        'source_hash': file_fingerprint(path),
+        'counties': index.counties,
+        'rows': len(index.df),
+        'states': len(index.rollups.states),
+        'totals': index.rollups.totals(),
+        'first_date': pd.Timestamp(index.first_dates.min()).isoformat(),
+        'latest_date': pd.Timestamp(index.latest_dates.max()).isoformat(),
+    }
+
+
+def write_county_manifest(manifest, path, cache_dir=DATA_CACHE_DIR, states=None):
+    target = _manifest_path(path, cache_dir, states)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    with open(target + '.tmp', 'w') as f:
+        json.dump(manifest, f)
+    os.replace(target + '.tmp', target)
+
+
+def read_county_manifest(path=DATA_PATH, cache_dir=DATA_CACHE_DIR, states=None):
+    """County manifest for the current ``path`` (limited to ``states``), or None when it is missing or stale."""
+    try:
+        with open(_manifest_path(path, cache_dir, states)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('version') != MANIFEST_VERSION or manifest.get('source_hash') != file_fingerprint(path):
+        return None
+    return manifest
+
+
+def load_county_manifest(path=DATA_PATH, cache_dir=DATA_CACHE_DIR, index=None, states=None):
+    """County list and dataset summary without loading the dataset, once the manifest exists.
+
+    A missing or stale manifest is rebuilt from ``index`` when one is passed, else
+    from a freshly loaded dataset.
+    """
+    manifest = read_county_manifest(path, cache_dir, states)
+    if manifest is None:
+        if index is None:
+            index = CountyIndex(load_dataset(path, cache_dir, states))
+        manifest = county_manifest(index, path)
+        try:
+            write_county_manifest(manifest, path, cache_dir, states)
+        except OSError:
+            pass
+    return manifest
+
+
+class CountyIndex:
+    """Dataset sorted by (County, Date) with O(1) per-county lookups.
+
+    Built once per data version. Each county owns a contiguous row slice of
+    ``df``, and ``rollups`` holds the monthly rollups.Rollups of ``df``. A county
+    can have several rows a month (one per state and Vehicle Primary Use), so the
+    values the forecast is seeded from -- last ``HISTORY_WINDOW`` monthly EV
+    totals, latest date, county code and historical total -- come from the
+    county rollup, precomputed as arrays aligned with ``counties``.
+    months_since_start keeps the training definition (the largest value in the
+    county's rows); ``monthly_months`` holds it as of each county-rollup row.
+    """
+
+    def __init__(self, df, window=HISTORY_WINDOW):
+        df = df[df['County'].notna()]
+        codes, counties = pd.factorize(np.asarray(df['County'], dtype=object), sort=True)
+        order = np.lexsort((df['Date'].values, codes))  # stable: ties keep file order
+        self.df = df.iloc[order].reset_index(drop=True)
+        self.counties = counties.tolist()
+        self._positions = {county: pos for pos, county in enumerate(self.counties)}
+
+        codes = codes[order]
+        self.starts = np.searchsorted(codes, np.arange(len(self.counties)))
+        self.stops = np.r_[self.starts[1:], len(codes)]
+        self.lengths = self.stops - self.starts
+
+        self.rollups = Rollups(self.df)
+        monthly = self.rollups.county
+        ev = monthly.measures['ev'].astype(float)
+        self.tails = np.full((len(self.counties), window), np.nan)
+        for k in range(window):
+            rows = monthly.stops - window + k
+            valid = rows >= monthly.starts
+            self.tails[valid, k] = ev[rows[valid]]
+        months = monthly.stops - monthly.starts
+        self.tail_lengths = np.minimum(months, window)
+
+        self.first_dates = self.rollups.months[monthly.month[monthly.starts]]
+        self.latest_dates = self.rollups.months[monthly.month[monthly.stops - 1]]
+        self.monthly_months = self._monthly_months()
+        self.months_since_start = self.monthly_months[monthly.stops - 1]
+        self.codes = self.df['county_encoded'].values[self.starts]
+        self.current_totals = np.add.reduceat(ev, monthly.starts)
+
+    def _monthly_months(self):
+        """Largest months_since_start of each county's rows up to each county-rollup row."""
+        monthly, rollups = self.rollups.county, self.rollups
+        span = len(rollups.months)
+        county = np.repeat(np.arange(len(self.counties)), self.lengths)
+        month = month_numbers(self.df['Date'].values) - rollups.first_month
+        rows = np.searchsorted(monthly.codes.astype(np.int64) * span + monthly.month, county * span + month)
+        latest = np.zeros(len(monthly), dtype=np.int64)
+        np.maximum.at(latest, rows, self.df['months_since_start'].values)
+        offset = monthly.codes.astype(np.int64) * (int(latest.max()) + 1)  # keeps the running max per county
+        return np.maximum.accumulate(latest + offset) - offset
+
+    def __contains__(self, county):
+        return county in self._positions
+
+    def __len__(self):
+        return len(self.counties)
+
+    def position(self, county):
+        try:
+            return self._positions[county]
+        except KeyError:
+            raise KeyError(f"County '{county}' not found in dataset.") from None
+
+    def frame(self, county):
+        """Rows of one county in date order (a slice of ``df``, not a copy)."""
+        pos = self.position(county)
+        return self.df.iloc[self.starts[pos]:self.stops[pos]]
+
+    def history(self, county):
+        """One row per month of one county: Date, EV/BEV/PHEV/total vehicles and Cumulative EV."""
+        return self.rollups.history(county)
+
+    def latest_date(self, county):
+        return pd.Timestamp(self.latest_dates[self.position(county)])
+
+    def current_total(self, county):
+        return self.current_totals[self.position(county)]
@@ -0,0 +1,184 @@
+"""Direct multi-horizon forecasting model: one forest for every month ahead.
+
+    python direct_model.py train [--holdout 0.1] [--trees 100] [--direct forecasting_ev_model_direct.pkl]
+    python direct_model.py report [--since 2023-06-30] [--out artifacts/direct_report.json]
+
+The app's recursive forecast feeds each month's prediction into the next
+month's lags, so its 36 predicts run one after another and errors compound.
+The direct model is instead trained with horizon as a feature. Each training
+row is a county-rollup month t with at least MIN_HISTORY months of history:
+the features of the forecast seeded at t (backtest.row_seeds, the same seed
+CountyIndex gives the app had the data ended at t) plus h. Its target is the
+county's rollup EV total in month t + h, the month h steps into that forecast.
+Forecasting then needs only the features of the first forecast month, so all
+36 months of all counties come from one batched predict
+(forecasting.forecast_direct).
+
+``train`` fits the forest on every pair whose target month is before the
+holdout (the latest ``--holdout`` share of months, as in training.py). It
+also exports the flattened forest next to it for forest.load_model.
+
+``report`` compares the two modes:
+
+- latency: the best of ``--repeat`` forecasts of one county (the app's usual
+  request) and of every county;
+- accuracy: backtest.py MAE and MAPE by horizon, from origins since ``--since``,
+  by default the last month the direct model was trained on.
+
+Both models are scored on the same origins. The shipped recursive model was
+trained on every month, so its scores on the holdout are in-sample and
+flatter than it deserves.
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from backtest import backtest, month_keys, origin_months, row_seeds
+from data_loader import DATA_PATH, CountyIndex, load_dataset
+from forecasting import FORECAST_HORIZON, MIN_HISTORY, FORECAST_MODES, FeatureState
+from forest import MODEL_PATH, load_model
+
+DIRECT_MODEL_PATH = 'forecasting_ev_model_direct.pkl'
+DIRECT_FOREST_DIR = os.path.join('artifacts', 'forest_direct')
+# The shipped forest's settings with its depth (18) as a cap, larger leaves and
+# bootstrap samples of a fifth: the training set is about 20x the recursive one
+DIRECT_PARAMS = {'max_depth': 18, 'min_samples_split': 4, 'min_samples_leaf': 3, 'max_features': None,
+                 'max_samples': 0.2, 'random_state': 42}
+DIRECT_TREES = 100
+
+
+def training_set(index, horizon=FORECAST_HORIZON, until=None):
+    """Direct-model rows (FEATURES + horizon), targets and target dates, for targets up to ``until``."""
+    monthly = index.rollups.county
+    key, _, month, _ = month_keys(index)
+    pos = monthly.codes.astype(np.int64)
+    last = np.flatnonzero(np.arange(len(monthly)) - monthly.starts[pos] + 1 >= MIN_HISTORY)
+    seeds = row_seeds(index, pos[last], last)
+    X = FeatureState(seeds['tails'], seeds['observed'], seeds['months'], seeds['codes'],
+                     seeds['cumulative']).features().astype(np.float32)
+    ev = monthly.measures['ev'].astype(np.float64)
+    dates = index.rollups.months[month]
+    blocks, targets, target_dates = [], [], []
+    for h in range(1, horizon + 1):
+        # The county-rollup row of month t + h
+        hit = np.minimum(np.searchsorted(key, key[last] + h), len(key) - 1)
+        valid = key[hit] == key[last] + h
+        if until is not None:
+            valid &= dates[hit] <= np.datetime64(pd.Timestamp(until))
+        blocks.append(np.column_stack([X[valid], np.full(valid.sum(), h, dtype=np.float32)]))
+        targets.append(ev[hit[valid]])
+        target_dates.append(dates[hit[valid]])
+    return np.concatenate(blocks), np.concatenate(targets), np.concatenate(target_dates)
+
+
+def training_cutoff(index, holdout=0.1):
+    """Last month before the latest ``holdout`` share of months, or None for no holdout."""
+    months = index.rollups.months[index.rollups.total.month]
+    n_holdout = int(round(len(months) * holdout))
+    return months[-n_holdout - 1] if n_holdout else None
+
+
+def fit(X, y, n_estimators=DIRECT_TREES, jobs=None):
+    from sklearn.ensemble import RandomForestRegressor
+
+    model = RandomForestRegressor(n_estimators=n_estimators, n_jobs=jobs or -1, **DIRECT_PARAMS)
+    model.fit(X, y)
+    model.set_params(n_jobs=None)  # predict like the shipped model, on the caller's thread
+    return model
+
+
+def train(data_path=DATA_PATH, out=DIRECT_MODEL_PATH, forest_dir=DIRECT_FOREST_DIR, holdout=0.1,
+          n_estimators=DIRECT_TREES, jobs=None, log=print):
+    import joblib
+
+    from forest import export
+
+    started = time.perf_counter()
+    index = CountyIndex(load_dataset(data_path))
+    until = training_cutoff(index, holdout)
+    X, y, _ = training_set(index, until=until)
+    log(f"{len(X):,} direct rows (county months x horizons 1-{FORECAST_HORIZON})"
+        + ("" if until is None else f", targets up to {pd.Timestamp(until).date()}"))
+    model = fit(X, y, n_estimators, jobs)
+    model.trained_until_ = None if until is None else pd.Timestamp(until).date().isoformat()
+
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    joblib.dump(model, out + '.tmp')
+    os.replace(out + '.tmp', out)
+    forest = export(out, forest_dir)
+    log(f"Saved {n_estimators} trees / {len(forest.feature):,} nodes to '{out}' (export in '{forest_dir}') "
+        f"in {time.perf_counter() - started:.1f}s")
+    return model
+
+
+def _latency(model, index, counties, mode, repeat):
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        FORECAST_MODES[mode](model, index, counties)
+        runs.append(time.perf_counter() - start)
+    return min(runs)
+
+
+def report(model_path=MODEL_PATH, direct_path=DIRECT_MODEL_PATH, data_path=DATA_PATH, since=None, repeat=5,
+           jobs=None, log=print):
+    """Latency and backtested accuracy of the recursive and direct forecasts; returns the report dict."""
+    import joblib
+
+    index = CountyIndex(load_dataset(data_path))
+    models = {'recursive': load_model(model_path), 'direct': load_model(direct_path, DIRECT_FOREST_DIR)}
+    if since is None:
+        since = getattr(joblib.load(direct_path), 'trained_until_', None)
+    origins = origin_months(index, 1, since)
+    counties = [c for c, n in zip(index.counties, index.tail_lengths) if n >= MIN_HISTORY]
+
+    largest = max(counties, key=index.current_total)
+
+    result = {'since': since, 'counties': len(counties), 'modes': {}}
+    for mode, model in models.items():
+        one, every = (_latency(model, index, cs, mode, repeat) for cs in ([largest], counties))
+        scores = backtest(model, index, origins, jobs=jobs, mode=mode)
+        result['modes'][mode] = {
+            'forecast_1_s': one,
+            'forecast_all_s': every,
+            'backtest': scores['summary'],
+            'by_horizon': scores['by_horizon'].to_dict(orient='records'),
+        }
+        log(f"{mode:<10} 1 county {one * 1000:6.1f} ms, all {len(counties)} {every * 1000:6.1f} ms; backtest MAE "
+            f"{scores['summary']['MAE']:,.2f}, MAPE {scores['summary']['MAPE %']:.2f}% "
+            f"({scores['summary']['points']:,} months from {len(origins)} origins since {since})")
+
+    by_horizon = pd.DataFrame({
+        f'{mode} {metric}': pd.DataFrame(result['modes'][mode]['by_horizon']).set_index('Horizon')[metric]
+        for mode in models for metric in ('MAE', 'MAPE %')
+    })
+    log("\n" + by_horizon.to_string(float_format=lambda v: f"{v:,.2f}"))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['train', 'report'])
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--model', default=MODEL_PATH, help="recursive model (report)")
+    parser.add_argument('--direct', default=DIRECT_MODEL_PATH, help="direct model to write or compare")
+    parser.add_argument('--holdout', type=float, default=0.1, help="share of the latest months not trained on")
+    parser.add_argument('--trees', type=int, default=DIRECT_TREES)
+    parser.add_argument('--since', help="earliest backtest origin (default: the direct model's last month)")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--jobs', type=int)
+    parser.add_argument('--out', help="write the report as JSON")
+    args = parser.parse_args()
+
+    if args.command == 'train':
+        train(args.data, args.direct, holdout=args.holdout, n_estimators=args.trees, jobs=args.jobs)
+    else:
+        result = report(args.model, args.direct, args.data, args.since, args.repeat, args.jobs)
+        if args.out:
+            os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+            with open(args.out, 'w') as f:
+                json.dump(result, f, indent=2, default=str)
@@ -0,0 +1,43 @@
+import hashlib
+import os
+import threading
+
+_lock = threading.Lock()
+_memo = {}  # path -> ((mtime_ns, size), digest)
+
+
+def file_fingerprint(path, chunk_size=1 << 20):
+    """Short content hash of a file, re-hashed only when its mtime or size changes.
+
+    A directory (such as ingest.py's partitioned dataset) hashes the relative
+    path and fingerprint of every file under it.
+    """
+    path = os.path.abspath(path)
+    if os.path.isdir(path):
+        return _directory_fingerprint(path, chunk_size)
+    st = os.stat(path)
+    stamp = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        cached = _memo.get(path)
+        if cached and cached[0] == stamp:
+            return cached[1]
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    fingerprint = digest.hexdigest()[:16]
+
+    with _lock:
+        _memo[path] = (stamp, fingerprint)
+    return fingerprint
+
+
+def _directory_fingerprint(root, chunk_size):
+    digest = hashlib.sha256()
+    for folder, dirs, files in os.walk(root):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(folder, name)
+            digest.update(f"{os.path.relpath(path, root)}\0{file_fingerprint(path, chunk_size)}\n".encode())
+    return digest.hexdigest()[:16]
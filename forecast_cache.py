@@ -0,0 +1,77 @@
+import threading
+from collections import OrderedDict
+from typing import NamedTuple, Optional
+
+import pandas as pd
+
+from forecasting import FORECAST_HORIZON, FORECAST_MODES
+
+
+class CountyForecast(NamedTuple):
+    forecast: pd.DataFrame  # Date, Predicted EV Total, Cumulative EV -- shared, do not mutate
+    current_total: float
+    projected_total: float
+    growth_pct: Optional[float]  # None when the county has no historical EVs
+
+
+def summarize(forecast, current_total):
+    projected_total = forecast['Cumulative EV'].iloc[-1]
+    growth_pct = ((projected_total - current_total) / current_total * 100) if current_total > 0 else None
+    return CountyForecast(forecast, current_total, projected_total, growth_pct)
+
+
+class ForecastCache:
+    """Thread-safe LRU of county forecasts shared by every app session.
+
+    Entries are keyed by (county, horizon, mode, model fingerprint, data fingerprint),
+    so a new ``forecasting_ev_model.pkl`` or ``preprocessed_ev_data.csv`` simply misses
+    and the stale entries age out of the LRU.
+    """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, model, index, counties, model_key, data_key, horizon=FORECAST_HORIZON, mode='recursive'):
+        """``{county: CountyForecast}``; all misses are forecast together in one batch.
+
+        ``mode`` names the forecasting.FORECAST_MODES function ``model`` is made for.
+        """
+        counties = list(dict.fromkeys(counties))
+        results, missing = {}, []
+        with self._lock:
+            for county in counties:
+                key = (county, horizon, mode, model_key, data_key)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    results[county] = self._entries[key]
+                    self.hits += 1
+                else:
+                    missing.append(county)
+                    self.misses += 1
+
+        if missing:
+            forecasts = FORECAST_MODES[mode](model, index, missing, horizon=horizon)
+            with self._lock:
+                for county in missing:
+                    entry = summarize(forecasts[county], index.current_total(county))
+                    self._entries[(county, horizon, mode, model_key, data_key)] = entry
+                    results[county] = entry
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+
+        return {county: results[county] for county in counties}
+
+    def get(self, model, index, county, model_key, data_key, horizon=FORECAST_HORIZON, mode='recursive'):
+        return self.get_many(model, index, [county], model_key, data_key, horizon, mode)[county]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self._entries), 'maxsize': self.maxsize}
@@ -0,0 +1,349 @@
+"""Headless HTTP/JSON forecast service with request micro-batching.
+
+    python forecast_service.py [--host 127.0.0.1] [--port 8600] [--max-wait-ms 5] [--max-queue 1024]
+
+Endpoints:
+
+    GET  /health                                   model and data fingerprints, batching stats
+    GET  /counties                                 counties that can be forecast
+    GET  /forecast?county=Orange&county=Lake&horizon=36
+    POST /forecast   {"counties": ["Orange", "Lake"], "horizon": 36}
+    GET  /leaderboard?k=10&order=top&min_current=50    fastest- (or slowest-) growing counties
+
+A forecast is the same recursive forecast app.py shows. Per county it returns
+``dates``, ``predicted``, ``cumulative``, ``current_total``, ``projected_total``
+and ``growth_pct``.
+
+Requests are not forecast one by one. The batcher collects every request that
+arrives within ``--max-wait-ms`` of the first one, up to ``--max-batch``
+counties. It then runs them as one forecast_counties call, which is one
+vectorized predict per month for the whole batch. Requests wait in a bounded
+queue. When it is full the service answers 503 with Retry-After instead of
+queueing more.
+
+The leaderboard (leaderboard.py) forecasts every county in one batch the first
+time it is asked for, on the batcher's forecast thread. Later requests only
+select from it.
+"""
+import argparse
+import asyncio
+import json
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from data_loader import DATA_PATH, CountyIndex, load_dataset
+from fingerprints import file_fingerprint
+from forecast_cache import summarize
+from forecasting import FORECAST_HORIZON, MIN_HISTORY, forecast_counties
+from forest import MODEL_PATH, load_model
+from leaderboard import LeaderboardCache
+
+MAX_HORIZON = 120
+MAX_LEADERBOARD = 500
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1 << 20
+
+
+class Overloaded(Exception):
+    """The request queue is full."""
+
+
+class MicroBatcher:
+    """Coalesces concurrent forecast requests into one forecast_counties call.
+
+    ``submit`` enqueues ``(counties, horizon)`` and returns a future. A single
+    consumer takes the oldest request, keeps collecting for ``max_wait`` seconds
+    or until ``max_batch`` counties, and forecasts the union at the largest
+    horizon on a worker thread. A forecast's first months do not depend on the
+    horizon, so each request gets the prefix it asked for.
+    """
+
+    def __init__(self, model, index, max_wait=0.005, max_batch=512, max_queue=1024):
+        self.model = model
+        self.index = index
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.queue = asyncio.Queue(max_queue)
+        self.batches = 0
+        self.requests = 0
+        self.counties = 0
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='forecast')
+
+    def submit(self, counties, horizon):
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((counties, horizon, future))
+        except asyncio.QueueFull:
+            raise Overloaded() from None
+        return future
+
+    def call(self, fn, *args):
+        """Run ``fn(*args)`` on the forecast thread, after the batch in progress; returns an awaitable."""
+        return asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def _collect(self):
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait
+        while size < self.max_batch:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+        return batch
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            counties = list(dict.fromkeys(county for request, _, _ in batch for county in request))
+            horizon = max(h for _, h, _ in batch)
+            self.batches += 1
+            self.requests += len(batch)
+            self.counties += len(counties)
+            try:
+                results = await loop.run_in_executor(self._executor, forecast_counties,
+                                                     self.model, self.index, counties, horizon)
+            except Exception as e:
+                for _, _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for request, h, future in batch:
+                if not future.done():  # the client may have gone away
+                    future.set_result({
+                        county: _to_json(summarize(results[county].iloc[:h], self.index.current_total(county)))
+                        for county in request
+                    })
+
+    def stats(self):
+        return {
+            'batches': self.batches,
+            'requests': self.requests,
+            'mean_requests_per_batch': self.requests / self.batches if self.batches else 0.0,
+            'mean_counties_per_batch': self.counties / self.batches if self.batches else 0.0,
+            'queued': self.queue.qsize(),
+        }
+
+
+def _to_json(result):
+    forecast = result.forecast
+    return {
+        'dates': forecast['Date'].dt.strftime('%Y-%m-%d').tolist(),
+        'predicted': forecast['Predicted EV Total'].tolist(),
+        'cumulative': forecast['Cumulative EV'].tolist(),
+        'current_total': float(result.current_total),
+        'projected_total': float(result.projected_total),
+        'growth_pct': result.growth_pct,
+    }
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+class ForecastService:
+    """Minimal asyncio HTTP/1.1 front end (keep-alive, JSON in and out) for a MicroBatcher."""
+
+    def __init__(self, batcher, info):
+        self.batcher = batcher
+        self.info = info
+        index = batcher.index
+        self.forecastable = [c for c, n in zip(index.counties, index.tail_lengths) if n >= MIN_HISTORY]
+        self.leaderboards = LeaderboardCache()
+
+    def _parse_request(self, params):
+        counties = params.get('counties', params.get('county'))
+        if isinstance(counties, str):
+            counties = [counties]
+        if not counties or not isinstance(counties, list) or not all(isinstance(c, str) for c in counties):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Pass one or more county names as 'counties' (or 'county').")
+        try:
+            horizon = int(params.get('horizon', FORECAST_HORIZON))
+        except (TypeError, ValueError):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'horizon' must be an integer.") from None
+        if not 1 <= horizon <= MAX_HORIZON:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'horizon' must be between 1 and {MAX_HORIZON}.")
+
+        index = self.batcher.index
+        for county in counties:
+            if county not in index:
+                raise HTTPError(HTTPStatus.NOT_FOUND, f"County '{county}' not found in dataset.")
+            if index.tail_lengths[index.position(county)] < MIN_HISTORY:
+                raise HTTPError(HTTPStatus.UNPROCESSABLE_ENTITY,
+                                f"County '{county}' needs at least {MIN_HISTORY} months of history to forecast.")
+        return list(dict.fromkeys(counties)), horizon
+
+    async def leaderboard(self, query):
+        try:
+            k = int(query.get('k', ['10'])[-1])
+            min_current = float(query.get('min_current', ['0'])[-1])
+            if not math.isfinite(min_current):
+                raise ValueError(min_current)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'k' must be an integer and 'min_current' a number.") from None
+        order = query.get('order', ['top'])[-1]
+        if order not in ('top', 'bottom'):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "'order' must be 'top' or 'bottom'.")
+        if not 1 <= k <= MAX_LEADERBOARD:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"'k' must be between 1 and {MAX_LEADERBOARD}.")
+
+        batcher = self.batcher
+        board = await batcher.call(self.leaderboards.get, batcher.model, batcher.index, self.info['model_hash'],
+                                   self.info['data_hash'])
+        table = board.top(k, order == 'top', min_current)
+        return {
+            'order': order,
+            'horizon': FORECAST_HORIZON,
+            'min_current': min_current,
+            'counties': [
+                {'rank': row['Rank'], 'county': row['County'], 'current_total': row['Current EVs'],
+                 'projected_total': row['Projected EVs'], 'growth_pct': row['Growth %']}
+                for row in table.to_dict('records')
+            ],
+        }
+
+    async def route(self, method, target, body):
+        url = urlsplit(target)
+        if url.path == '/health' and method == 'GET':
+            return dict(self.info, status='ok', batching=self.batcher.stats())
+        if url.path == '/counties' and method == 'GET':
+            return {'counties': self.forecastable}
+        if url.path == '/leaderboard' and method == 'GET':
+            return await self.leaderboard(parse_qs(url.query))
+        if url.path == '/forecast' and method in ('GET', 'POST'):
+            if method == 'POST':
+                try:
+                    params = json.loads(body or b'{}')
+                except ValueError:
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be JSON.") from None
+                if not isinstance(params, dict):
+                    raise HTTPError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object.")
+            else:
+                query = parse_qs(url.query)
+                params = {'county': query.get('county', []) + query.get('counties', [])}
+                if 'horizon' in query:
+                    params['horizon'] = query['horizon'][-1]
+            counties, horizon = self._parse_request(params)
+            try:
+                future = self.batcher.submit(counties, horizon)
+            except Overloaded:
+                raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, "Forecast queue is full; retry shortly.",
+                                {'Retry-After': '1'}) from None
+            return {'horizon': horizon, 'forecasts': await future}
+        raise HTTPError(HTTPStatus.NOT_FOUND, f"No route for {method} {url.path}.")
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._send(writer, HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE,
+                                     {'error': 'Headers too large.'}, keep_alive=False)
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, version = lines[0].split(' ', 2)
+                except ValueError:
+                    await self._send(writer, HTTPStatus.BAD_REQUEST, {'error': 'Malformed request line.'},
+                                     keep_alive=False)
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    name, _, value = line.partition(':')
+                    if name:
+                        headers[name.strip().lower()] = value.strip()
+                keep_alive = headers.get('connection', '').lower() != 'close' and version == 'HTTP/1.1'
+
+                try:
+                    length = int(headers.get('content-length') or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self._send(writer, HTTPStatus.BAD_REQUEST, {'error': 'Malformed Content-Length.'},
+                                     keep_alive=False)
+                    break
+                if length > MAX_BODY_BYTES:
+                    await self._send(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {'error': 'Body too large.'},
+                                     keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                try:
+                    status, payload, extra = HTTPStatus.OK, await self.route(method, target, body), {}
+                except HTTPError as e:
+                    status, payload, extra = e.status, {'error': str(e)}, e.headers
+                except Exception as e:  # keep serving other clients
+                    status, payload, extra = HTTPStatus.INTERNAL_SERVER_ERROR, {'error': repr(e)}, {}
+                await self._send(writer, status, payload, keep_alive, extra)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _send(self, writer, status, payload, keep_alive=True, headers=None):
+        body = json.dumps(payload, default=_json_default).encode()
+        head = [f"HTTP/1.1 {status.value} {status.phrase}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode('latin-1') + body)
+        await writer.drain()
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+async def serve(host='127.0.0.1', port=8600, model_path=MODEL_PATH, data_path=DATA_PATH,
+                max_wait_ms=5.0, max_batch=512, max_queue=1024):
+    started = time.perf_counter()
+    model = load_model(model_path)
+    index = CountyIndex(load_dataset(data_path))
+    batcher = MicroBatcher(model, index, max_wait_ms / 1000, max_batch, max_queue)
+    service = ForecastService(batcher, {
+        'model_hash': file_fingerprint(model_path),
+        'data_hash': file_fingerprint(data_path),
+        'model': type(model).__name__,
+    })
+    server = await asyncio.start_server(service.handle, host, port, limit=MAX_HEADER_BYTES)
+    print(f"Forecast service on http://{host}:{port} ({len(service.forecastable)} counties, "
+          f"ready in {time.perf_counter() - started:.2f}s)", flush=True)
+    async with server:
+        await asyncio.gather(server.serve_forever(), batcher.run())
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8600)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help="how long a batch keeps collecting requests")
+    parser.add_argument('--max-batch', type=int, default=512, help="counties per batch")
+    parser.add_argument('--max-queue', type=int, default=1024, help="queued requests before answering 503")
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.model, args.data, args.max_wait_ms, args.max_batch, args.max_queue))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,74 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from fingerprints import file_fingerprint
+from forecast_cache import CountyForecast
+from forecasting import FORECAST_HORIZON
+
+ARTIFACT_DIR = "artifacts"
+FORECAST_ARTIFACT = os.path.join(ARTIFACT_DIR, "forecasts.npz")
+STORE_VERSION = 3  # 2: counties seeded from the monthly county rollup; 3: fingerprints inside the .npz
+
+
+def manifest_path(artifact_path):
+    return os.path.splitext(artifact_path)[0] + ".manifest.json"
+
+
+def read_manifest(artifact_path):
+    with open(manifest_path(artifact_path)) as f:
+        return json.load(f)
+
+
+class ForecastStore:
+    """Read-only view over a forecast table written by build_forecasts.py.
+
+    The whole table is a handful of (counties x horizon) arrays, so a lookup is a
+    dict hit plus a row slice -- no model is needed at request time. The store
+    version and the model and data fingerprints are read from the .npz itself,
+    so they always describe the arrays loaded with them; the manifest next to it
+    is only a build report.
+    """
+
+    def __init__(self, artifact_path=FORECAST_ARTIFACT):
+        self.path = artifact_path
+        with np.load(artifact_path, allow_pickle=False) as data:
+            stamp = {key: data[key].item() if key in data.files else None
+                     for key in ('version', 'model_hash', 'data_hash')}
+            self.counties = data['counties'].tolist()
+            self.dates = data['dates']
+            self.predicted = data['predicted']
+            self.cumulative = data['cumulative']
+            self.current_total = data['current_total']
+        self.version, self.model_hash, self.data_hash = stamp['version'], stamp['model_hash'], stamp['data_hash']
+        self.horizon = self.predicted.shape[1]
+        self._rows = {county: idx for idx, county in enumerate(self.counties)}
+
+    def is_current(self, model_path=None, data_path=None, horizon=FORECAST_HORIZON):
+        """True when the table was built by this version from the given model and data files, ``horizon`` months out."""
+        if self.version != STORE_VERSION or self.horizon != horizon:
+            return False
+        if model_path is not None and file_fingerprint(model_path) != self.model_hash:
+            return False
+        if data_path is not None and file_fingerprint(data_path) != self.data_hash:
+            return False
+        return True
+
+    def get(self, county):
+        idx = self._rows.get(county)
+        if idx is None:
+            raise ValueError(f"County '{county}' is not in the precomputed forecast table.")
+        forecast = pd.DataFrame({
+            'Date': self.dates[idx],
+            'Predicted EV Total': self.predicted[idx],
+            'Cumulative EV': self.cumulative[idx],
+        })
+        current_total = self.current_total[idx]
+        projected_total = self.cumulative[idx, -1]
+        growth_pct = ((projected_total - current_total) / current_total * 100) if current_total > 0 else None
+        return CountyForecast(forecast, current_total, projected_total, growth_pct)
+
+    def get_many(self, counties):
+        return {county: self.get(county) for county in dict.fromkeys(counties)}
@@ -0,0 +1,238 @@
+import numpy as np
+import pandas as pd
+
+from timing import span
+
+# === Model inputs (same order as the training notebook) ===
+FEATURES = [
+    'months_since_start',
+    'county_encoded',
+    'ev_total_lag1',
+    'ev_total_lag2',
+    'ev_total_lag3',
+    'ev_total_roll_mean_3',
+    'ev_total_pct_change_1',
+    'ev_total_pct_change_3',
+    'ev_growth_slope',
+]
+
+TARGET = 'Electric Vehicle (EV) Total'
+FORECAST_HORIZON = 36  # 3 years = 36 months
+HISTORY_WINDOW = 6     # months of history needed for ev_growth_slope
+MIN_HISTORY = 3        # months needed for the lag features
+
+
+# Least-squares slope of the last 6 cumulative values against x = 0..5. Only the
+# five monthly totals inside the window move the cumulative curve, so the slope is
+# a fixed weighted sum of lag1..lag5 and needs no polyfit or running sums.
+SLOPE_WEIGHTS = np.array([2.5, 4.0, 4.5, 4.0, 2.5]) / 17.5
+
+
+class FeatureState:
+    """Ring-buffer feature state for the recursive forecast of many counties.
+
+    Holds the last ``HISTORY_WINDOW`` monthly EV totals per county (one row each)
+    plus the running cumulative total. ``features()`` emits the model inputs for
+    the next month and ``push()`` records that month's prediction; both are
+    constant time per county and vectorized across all counties.
+    """
+
+    __slots__ = ('totals', 'observed', 'head', 'months', 'codes', 'cumulative')
+
+    def __init__(self, totals, observed, months, codes, cumulative):
+        self.totals = np.array(totals, dtype=float)  # right-aligned, NaN-padded windows
+        self.observed = np.array(observed, dtype=np.int64)
+        if (self.observed < MIN_HISTORY).any():
+            raise ValueError(f"Need at least {MIN_HISTORY} months of history for every county.")
+        self.head = 0  # slot the next month is written to (oldest month in the window)
+        self.months = np.array(months, dtype=float)
+        self.codes = np.array(codes, dtype=float)
+        self.cumulative = np.array(cumulative, dtype=float)
+
+    def lag(self, k):
+        return self.totals[:, (self.head - k) % HISTORY_WINDOW]
+
+    def features(self):
+        """Feature matrix (counties x FEATURES) for the next forecast month."""
+        lag1, lag2, lag3 = self.lag(1), self.lag(2), self.lag(3)
+        roll_mean = (lag1 + lag2 + lag3) / 3
+        with np.errstate(divide='ignore', invalid='ignore'):
+            pct_change_1 = np.where(lag2 != 0, (lag1 - lag2) / lag2, 0.0)
+            pct_change_3 = np.where(lag3 != 0, (lag1 - lag3) / lag3, 0.0)
+
+        recent = np.column_stack([self.lag(k) for k in range(1, HISTORY_WINDOW)])
+        ev_growth_slope = np.where(self.observed >= HISTORY_WINDOW, recent @ SLOPE_WEIGHTS, 0.0)
+
+        return np.column_stack([
+            self.months + 1, self.codes, lag1, lag2, lag3, roll_mean,
+            pct_change_1, pct_change_3, ev_growth_slope,
+        ])
+
+    def push(self, values):
+        """Advance every county by one month using the predicted totals."""
+        self.totals[:, self.head] = values
+        self.head = (self.head + 1) % HISTORY_WINDOW
+        self.observed = np.minimum(self.observed + 1, HISTORY_WINDOW)
+        self.months += 1
+        self.cumulative += values
+
+
+def predict(model, X):
+    """``model.predict`` on a FEATURES matrix; sklearn models fitted on a DataFrame get named columns."""
+    with span('model.predict'):
+        if hasattr(model, 'feature_names_in_'):
+            return model.predict(pd.DataFrame(X, columns=FEATURES))
+        return model.predict(X)
+
+
+def forecast_counties(model, index, counties, horizon=FORECAST_HORIZON):
+    """Recursive forecast for several counties advanced month by month in lockstep.
+
+    ``index`` is a data_loader.CountyIndex, which supplies each county's seed
+    window without scanning the dataset. Every step builds one feature matrix with
+    a row per county and makes a single ``model.predict`` call, so the cost is
+    ``horizon`` predict calls no matter how many counties are requested. Returns
+    ``{county: forecast_df}`` where each forecast_df has ``Date``,
+    ``Predicted EV Total`` and ``Cumulative EV`` columns.
+    """
+    counties = list(dict.fromkeys(counties))
+    if not counties:
+        return {}
+
+    rows = _seed_rows(index, counties)
+    return _forecast_frames(index, counties, rows, recursive_months(model, _seed_state(index, rows), horizon))
+
+
+def recursive_months(model, state, horizon=FORECAST_HORIZON):
+    """Monthly predictions (counties x horizon) of the recursive forecast from a FeatureState, unrounded."""
+    predictions = np.empty((len(state.codes), horizon))
+    for step in range(horizon):
+        pred = predict(model, state.features())
+        predictions[:, step] = pred
+        state.push(pred)
+    return predictions
+
+
+def _forecast_frames(index, counties, rows, predictions):
+    """``{county: forecast_df}`` from monthly predictions (counties x horizon), rounded like the notebook."""
+    rounded = np.rint(predictions).astype(np.int64)
+    historical_totals = index.current_totals[rows]
+    dates = _forecast_dates(index, rows, predictions.shape[1])
+    return {
+        county: pd.DataFrame({
+            'Date': dates[idx],
+            'Predicted EV Total': rounded[idx],
+            'Cumulative EV': rounded[idx].cumsum() + historical_totals[idx],
+        })
+        for idx, county in enumerate(counties)
+    }
+
+
+def _seed_rows(index, counties):
+    rows = np.array([index.position(county) for county in counties])
+    short = [county for county, row in zip(counties, rows) if index.tail_lengths[row] < MIN_HISTORY]
+    if short:
+        raise ValueError(
+            f"County '{short[0]}' needs at least {MIN_HISTORY} months of history to forecast."
+        )
+    return rows
+
+
+def _seed_state(index, rows):
+    return FeatureState(index.tails[rows], index.tail_lengths[rows], index.months_since_start[rows],
+                        index.codes[rows], index.current_totals[rows])
+
+
+def _forecast_dates(index, rows, horizon):
+    """Forecast month dates per row; counties with the same latest month share one list."""
+    offsets = {}
+    dates = []
+    for row in rows:
+        latest_date = pd.Timestamp(index.latest_dates[row])
+        if latest_date not in offsets:
+            offsets[latest_date] = [latest_date + pd.DateOffset(months=i) for i in range(1, horizon + 1)]
+        dates.append(offsets[latest_date])
+    return dates
+
+
+# === Direct multi-horizon forecast ===
+# A direct model (direct_model.py) is given the features of the first forecast
+# month plus how many months ahead the target is, so no prediction feeds another.
+DIRECT_FEATURES = FEATURES + ['horizon']
+
+
+def direct_matrix(X, horizon):
+    """Every row of a FEATURES matrix repeated for months 1..``horizon``, with the month appended."""
+    return np.column_stack([np.repeat(X, horizon, axis=0), np.tile(np.arange(1, horizon + 1), len(X))])
+
+
+def forecast_direct(model, index, counties, horizon=FORECAST_HORIZON):
+    """forecast_counties' output from a direct model: every month of every county in one ``predict``.
+
+    The model only knows the horizons it was trained on (1..FORECAST_HORIZON by
+    default).
+    """
+    counties = list(dict.fromkeys(counties))
+    if not counties:
+        return {}
+
+    rows = _seed_rows(index, counties)
+    return _forecast_frames(index, counties, rows, direct_months(model, _seed_state(index, rows), horizon))
+
+
+def direct_months(model, state, horizon=FORECAST_HORIZON):
+    """recursive_months() for a direct model: one ``predict`` for every month."""
+    return predict(model, direct_matrix(state.features(), horizon)).reshape(len(state.codes), horizon)
+
+
+FORECAST_MODES = {'recursive': forecast_counties, 'direct': forecast_direct}
+MONTHLY_MODES = {'recursive': recursive_months, 'direct': direct_months}
+
+
+# === Prediction intervals ===
+BAND_QUANTILES = (10, 50, 90)
+
+
+def tree_predict(model, X):
+    """Per-tree predictions for ``X`` stacked as one block of rows per tree (see FlatForest.tree_predict)."""
+    with span('model.tree_predict'):
+        if hasattr(model, 'tree_predict'):
+            return model.tree_predict(X)
+        # sklearn forest: one call per tree on its own block, skipping input validation
+        blocks = np.split(np.ascontiguousarray(X, dtype=np.float32), len(model.estimators_))
+        return np.concatenate([tree.predict(block, check_input=False)
+                               for tree, block in zip(model.estimators_, blocks)])
+
+
+def forecast_bands(model, index, counties, horizon=FORECAST_HORIZON, quantiles=BAND_QUANTILES):
+    """Cumulative-EV percentile bands from the forest's trees run as an ensemble of trajectories.
+
+    Every tree carries its own recursive forecast: its predictions feed its own
+    lags, so a tree's errors compound along its trajectory the way the point
+    forecast's do. All trees x counties trajectories share one FeatureState and
+    advance together, one ``tree_predict`` per month, which walks each row through
+    one tree -- the same number of node visits as the point forecast's predict.
+    Returns ``{county: DataFrame}`` with ``Date`` and one ``P<q>`` column per
+    quantile of cumulative EVs. P50 is the median trajectory, which need not
+    equal the point forecast (the trajectory of the mean).
+    """
+    counties = list(dict.fromkeys(counties))
+    if not counties:
+        return {}
+
+    rows = _seed_rows(index, counties)
+    n_trees = model.n_trees if hasattr(model, 'n_trees') else len(model.estimators_)
+    ensemble = np.tile(rows, n_trees)  # tree-major: block t holds every county for tree t
+    state = _seed_state(index, ensemble)
+    bands = np.empty((len(quantiles), len(counties), horizon))
+    for step in range(horizon):
+        state.push(tree_predict(model, state.features()))
+        bands[:, :, step] = np.percentile(state.cumulative.reshape(n_trees, len(counties)), quantiles, axis=0)
+
+    dates = _forecast_dates(index, rows, horizon)
+    return {
+        county: pd.DataFrame(
+            {'Date': dates[idx], **{f'P{q}': np.rint(bands[k, idx]) for k, q in enumerate(quantiles)}}
+        )
+        for idx, county in enumerate(counties)
+    }
@@ -0,0 +1,235 @@
+"""Flattened RandomForest inference.
+
+    python forest.py export [--model forecasting_ev_model.pkl] [--out artifacts/forest]
+
+Exports every tree of the fitted RandomForestRegressor into one set of contiguous
+node arrays (feature, threshold, children, is_leaf, value) and evaluates them with
+plain NumPy, skipping sklearn's per-call validation and thread-pool dispatch.
+Predictions are identical to ``model.predict``.
+
+That overhead dominates small batches: the walk is ~60x faster than sklearn for
+one row and ~2x for one row per county (264). From about LARGE_BATCH rows
+sklearn's compiled tree walk wins (the walk is 0.3x at 4096 rows, see
+benchmarks/bench_forest.py), so such batches go to the sklearn model the export
+came from. That model is loaded on first use, as a private copy per process.
+
+The arrays are loaded memory-mapped read-only, so every process serving the same
+export shares one copy of the forest in the page cache instead of each holding
+its own.
+"""
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from fingerprints import file_fingerprint
+
+MODEL_PATH = 'forecasting_ev_model.pkl'
+FOREST_DIR = os.path.join('artifacts', 'forest')
+FOREST_VERSION = 2
+ARRAYS = ('feature', 'threshold', 'children', 'is_leaf', 'value', 'roots')
+# Batch sizes from which sklearn is faster than the walk (one CPU, the shipped forest):
+# rows per ``predict``, and rows per tree in ``tree_predict``, which skips sklearn's
+# per-call overhead by calling each tree directly
+LARGE_BATCH = 640
+LARGE_BLOCK = 192
+
+
+class FlatForest:
+    """All trees of a forest in shared node arrays.
+
+    Children are interleaved -- the next node is ``children[2 * node + goes_right]``
+    -- and leaves point at themselves, so every (tree, row) pair can be walked in
+    lockstep without per-node branching; pairs that reached a leaf are dropped
+    every few levels so shallow paths stop costing work. Inference only reads the
+    arrays, so they may be read-only memory maps.
+    """
+
+    compact_every = 4  # levels between dropping finished (tree, row) pairs
+    large_batch = LARGE_BATCH
+    large_block = LARGE_BLOCK
+
+    def __init__(self, feature, threshold, children, is_leaf, value, roots, max_depth, n_features):
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.is_leaf = is_leaf
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.n_features = int(n_features)
+        self.source = None  # pickle of the sklearn model, for large batches
+        self._estimator = None
+        self._estimator_lock = threading.Lock()
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    @classmethod
+    def from_sklearn(cls, model):
+        features, thresholds, children, leaves, values, roots = [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            nodes = np.arange(tree.node_count)
+            leaf = tree.children_left == -1
+            roots.append(offset)
+            features.append(np.where(leaf, 0, tree.feature))
+            thresholds.append(tree.threshold)
+            children.append(np.column_stack([
+                np.where(leaf, nodes, tree.children_left),
+                np.where(leaf, nodes, tree.children_right),
+            ]).ravel() + offset)
+            leaves.append(leaf)
+            values.append(tree.value[:, 0, 0])
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+        forest = cls(
+            np.concatenate(features).astype(np.int32),
+            np.concatenate(thresholds).astype(np.float64),
+            np.concatenate(children).astype(np.int64),
+            np.concatenate(leaves),
+            np.concatenate(values).astype(np.float64),
+            np.array(roots, dtype=np.int32),
+            max_depth,
+            model.n_features_in_,
+        )
+        forest._estimator = model
+        return forest
+
+    def estimator(self):
+        """The sklearn model this forest came from, or None when it is not known."""
+        if self._estimator is None and self.source is not None:
+            with self._estimator_lock:
+                if self._estimator is None:
+                    import joblib
+                    self._estimator = joblib.load(self.source)
+        return self._estimator
+
+    def leaves(self, X):
+        """(trees x rows) leaf node ids for the feature matrix ``X``."""
+        # sklearn evaluates splits on float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_rows, n_features = X.shape
+        node = np.repeat(self.roots.astype(np.int64), n_rows)
+        row_offset = np.tile(np.arange(n_rows) * n_features, self.n_trees)
+        return self._walk(X.ravel(), node, row_offset).reshape(self.n_trees, n_rows)
+
+    def tree_predict(self, X):
+        """Row ``i`` of ``X`` through tree ``i // (len(X) // n_trees)`` only.
+
+        ``X`` stacks one block of rows per tree, in tree order. Each row is walked
+        by its own tree, so this costs as much as ``predict`` on one block. Blocks
+        of ``large_block`` rows or more go through the sklearn trees instead.
+        """
+        block = len(X) // self.n_trees
+        model = self.estimator() if block >= self.large_block else None
+        if model is not None:
+            blocks = np.split(np.ascontiguousarray(X, dtype=np.float32), self.n_trees)
+            return np.concatenate([tree.predict(rows, check_input=False)
+                                   for tree, rows in zip(model.estimators_, blocks)])
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        n_rows, n_features = X.shape
+        node = np.repeat(self.roots.astype(np.int64), block)
+        return self.value[self._walk(X.ravel(), node, np.arange(n_rows) * n_features)]
+
+    def _walk(self, values, node, row_offset):
+        """Leaf reached from each start ``node`` for the row starting at ``values[row_offset]``."""
+        pending = np.arange(len(node))
+        leaves = np.empty(len(node), dtype=np.int64)
+        for depth in range(1, self.max_depth + 1):
+            goes_right = values[row_offset + self.feature[node]] > self.threshold[node]
+            node = self.children[2 * node + goes_right]
+            if depth % self.compact_every == 0:
+                done = self.is_leaf[node]
+                leaves[pending[done]] = node[done]
+                pending, node, row_offset = pending[~done], node[~done], row_offset[~done]
+        leaves[pending] = node
+        return leaves
+
+    def predict(self, X):
+        """Forest mean for ``X``; batches of ``large_batch`` rows or more go to the sklearn model."""
+        model = self.estimator() if len(X) >= self.large_batch else None
+        if model is not None:
+            if hasattr(model, 'feature_names_in_'):  # fitted on a DataFrame
+                import pandas as pd
+                X = pd.DataFrame(X, columns=model.feature_names_in_)
+            return model.predict(X)
+        # Running sum in tree order, then divide -- the same arithmetic as sklearn
+        return np.cumsum(self.value[self.leaves(X)], axis=0)[-1] / self.n_trees
+
+    def save(self, path, source_hash=None):
+        tmp = path + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for name in ARRAYS:
+            np.save(os.path.join(tmp, f'{name}.npy'), getattr(self, name))
+        meta = {
+            'version': FOREST_VERSION,
+            'source_hash': source_hash,
+            'n_trees': self.n_trees,
+            'n_nodes': len(self.feature),
+            'max_depth': self.max_depth,
+            'n_features': self.n_features,
+        }
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Forest saved at ``path``; ``mmap_mode=None`` reads private in-memory copies instead."""
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode) for name in ARRAYS}
+        forest = cls(max_depth=meta['max_depth'], n_features=meta['n_features'], **arrays)
+        forest.meta = meta
+        return forest
+
+
+def export(model_path=MODEL_PATH, out=FOREST_DIR):
+    import joblib
+
+    forest = FlatForest.from_sklearn(joblib.load(model_path))
+    forest.save(out, source_hash=file_fingerprint(model_path))
+    return forest
+
+
+def load_model(model_path=MODEL_PATH, path=FOREST_DIR, mmap_mode='r'):
+    """Model for forecasting: the flattened export when it is current, else the pickle."""
+    forest = load_current(model_path, path, mmap_mode)
+    if forest is not None:
+        return forest
+    import joblib
+    return joblib.load(model_path)
+
+
+def load_current(model_path=MODEL_PATH, path=FOREST_DIR, mmap_mode='r'):
+    """The exported forest if it was built from the current model file, else None."""
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get('version') != FOREST_VERSION or meta.get('source_hash') != file_fingerprint(model_path):
+        return None
+    forest = FlatForest.load(path, mmap_mode)
+    forest.source = model_path
+    return forest
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['export'])
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--out', default=FOREST_DIR)
+    args = parser.parse_args()
+
+    forest = export(args.model, args.out)
+    print(f"Exported {forest.n_trees} trees / {len(forest.feature):,} nodes (max depth {forest.max_depth}) -> {args.out}")
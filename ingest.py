@@ -0,0 +1,233 @@
+"""Out-of-core ingest of the raw registration CSV into a State/County-partitioned dataset.
+
+    python ingest.py [--src Electric_Vehicle_Population_By_County.csv] [--out artifacts/ev_dataset]
+                     [--chunksize 100000] [--csv preprocessed_ev_data.csv]
+
+Produces the same rows as preprocessing.py, without ever holding the raw file
+in memory:
+
+1. The raw CSV is read ``--chunksize`` rows at a time with explicit dtypes.
+   Dates are read as categories and each distinct string is parsed once with
+   the fixed DATE_FORMAT. Count columns stay text until pd.to_numeric, so
+   "3,575" becomes NaN exactly as in the notebook. Value counts of 'Percent
+   Electric Vehicles' are accumulated; the column has few distinct values, so
+   the IQR outlier bounds come out exact. Cleaned rows are appended to one
+   binary staging file per county.
+2. Counties are then engineered in alphabetical (county_encoded) order, a batch
+   of whole counties at a time, with the final outlier bounds, and written as
+   Parquet under ``<out>/State=<state>/County=<county>/``. ``--csv`` also
+   streams them, in order, into a flat preprocessed CSV for the app.
+
+Peak memory is one chunk or one batch of counties, whichever is larger, however
+large the input is. ``<out>/_manifest.json`` lists the counties, rows, date
+range and outlier bounds. data_loader.read_partitions reads back selected
+counties or states.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from fingerprints import file_fingerprint
+from forecasting import TARGET
+from preprocessing import NUMERIC_COLUMNS, RAW_DATA_PATH, engineer_features, parse_dates
+
+DATASET_DIR = os.path.join('artifacts', 'ev_dataset')
+MANIFEST = '_manifest.json'  # the leading underscore keeps Parquet discovery away from it
+DATASET_VERSION = 1
+CHUNK_ROWS = 100_000
+BATCH_ROWS = 100_000
+
+# Counts stay text so thousands-formatted values coerce to NaN like the notebook's
+RAW_DTYPES = {
+    'Date': 'category',
+    'County': str,
+    'State': str,
+    'Vehicle Primary Use': str,
+    **{col: str for col in NUMERIC_COLUMNS if col != 'Percent Electric Vehicles'},
+    'Percent Electric Vehicles': np.float64,
+}
+
+# One staged row: State and Vehicle Primary Use are codes into the ingest's name tables
+STAGE_DTYPE = np.dtype([('date', 'M8[ns]'), ('state', np.int32), ('use', np.int32)]
+                       + [(f'n{i}', np.float64) for i in range(len(NUMERIC_COLUMNS))])
+
+
+def _codes(values, table):
+    """Codes of ``values`` in ``table`` (name -> code), adding unseen names; NaN is -1."""
+    local, uniques = pd.factorize(values)
+    mapping = np.array([table.setdefault(name, len(table)) for name in uniques] + [-1], dtype=np.int32)
+    return mapping[local]  # factorize marks NaN as -1, which picks the trailing -1
+
+
+def _parse_date_categories(dates):
+    """parse_dates applied once per distinct string of a categorical column."""
+    parsed = parse_dates(pd.Series(dates.cat.categories)).values
+    codes = dates.cat.codes.values
+    return np.where(codes >= 0, parsed[codes], np.datetime64('NaT'))
+
+
+def exact_quantile(counts, q):
+    """``Series.quantile(q)`` of the values counted in ``counts`` (value -> count), same arithmetic."""
+    counts = counts.sort_index()
+    values, seen = counts.index.values, counts.values.cumsum()
+    position = (seen[-1] - 1) * q
+    below = np.floor(position)
+    a = values[np.searchsorted(seen, below, side='right')]
+    b = values[np.searchsorted(seen, below + 1, side='right')] if position > below else a
+    # numpy's linear interpolation, which pandas uses
+    t = position - below
+    return a + (b - a) * t if t < 0.5 else b - (b - a) * (1 - t)
+
+
+def stage(src, staging, chunksize=CHUNK_ROWS, log=print):
+    """Pass 1: clean ``src`` chunk by chunk into per-county staging files; returns the name tables and bounds."""
+    counties, states, uses = {}, {}, {}
+    percent_counts = pd.Series(dtype=np.float64)
+    rows_read = rows_staged = 0
+    for chunk in pd.read_csv(src, dtype=RAW_DTYPES, chunksize=chunksize):
+        rows_read += len(chunk)
+        percent_counts = percent_counts.add(chunk['Percent Electric Vehicles'].value_counts(), fill_value=0)
+
+        dates = _parse_date_categories(chunk['Date'])
+        keep = ~np.isnat(dates) & chunk[TARGET].notna().values
+        chunk = chunk[keep]
+
+        records = np.empty(len(chunk), STAGE_DTYPE)
+        records['date'] = dates[keep]
+        records['state'] = _codes(chunk['State'].fillna('Unknown'), states)
+        records['use'] = _codes(chunk['Vehicle Primary Use'], uses)
+        for i, col in enumerate(NUMERIC_COLUMNS):
+            records[f'n{i}'] = pd.to_numeric(chunk[col], errors='coerce')
+
+        county_codes = _codes(chunk['County'].fillna('Unknown'), counties)
+        order = np.argsort(county_codes, kind='stable')  # keeps file order within a county
+        bounds = np.flatnonzero(np.diff(county_codes[order])) + 1
+        for part in np.split(order, bounds):
+            if len(part):
+                with open(os.path.join(staging, f'{county_codes[part[0]]}.bin'), 'ab') as f:
+                    records[part].tofile(f)
+        rows_staged += len(records)
+        log(f"  staged {rows_staged:,} of {rows_read:,} rows read ({len(counties):,} counties)")
+
+    q1, q3 = exact_quantile(percent_counts, 0.25), exact_quantile(percent_counts, 0.75)
+    iqr = q3 - q1
+    return {
+        'counties': counties,
+        'states': list(states),
+        'uses': list(uses),
+        'percent_bounds': (q1 - 1.5 * iqr, q3 + 1.5 * iqr),
+        'rows_read': rows_read,
+    }
+
+
+def _staged_frame(counties, parts, tables):
+    """Cleaned frame of the staged rows ``parts`` of ``counties``, capped with the final bounds."""
+    records = np.concatenate(parts)
+    states = np.array(tables['states'] + [np.nan], dtype=object)  # code -1 (NaN) picks the last entry
+    uses = np.array(tables['uses'] + [np.nan], dtype=object)
+    data = {
+        'Date': records['date'],
+        'County': np.repeat(np.array(counties, dtype=object), [len(part) for part in parts]),
+        'State': states[records['state']],
+        'Vehicle Primary Use': uses[records['use']],
+    }
+    for i, col in enumerate(NUMERIC_COLUMNS):
+        data[col] = records[f'n{i}']
+    data['Percent Electric Vehicles'] = np.clip(data['Percent Electric Vehicles'], *tables['percent_bounds'])
+    return pd.DataFrame(data)
+
+
+def build(staging, tables, out, csv_path=None, batch_rows=BATCH_ROWS, log=print):
+    """Pass 2: engineer whole counties in county_encoded order and write the partitioned dataset."""
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+
+    names = sorted(tables['counties'])
+    summary = {'rows': 0, 'counties': [], 'first_date': None, 'latest_date': None, 'columns': None}
+    csv_file = open(csv_path + '.tmp', 'w', newline='') if csv_path else None
+
+    def flush(counties, parts, first_code, batch):
+        # Batches hold consecutive counties, so local codes are the global ones shifted by first_code
+        df = engineer_features(_staged_frame(counties, parts, tables))
+        df['county_encoded'] += first_code
+        df = df.dropna().reset_index(drop=True)
+        if df.empty:
+            return
+        if csv_file is not None:
+            df.to_csv(csv_file, index=False, header=summary['columns'] is None)
+        summary['columns'] = df.columns.tolist()
+        summary['rows'] += len(df)
+        summary['counties'] += df['County'].unique().tolist()
+        first, latest = df['Date'].min(), df['Date'].max()
+        summary['first_date'] = min(first, summary['first_date'] or first)
+        summary['latest_date'] = max(latest, summary['latest_date'] or latest)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        ds.write_dataset(table, out, format='parquet', partitioning=['State', 'County'],
+                         partitioning_flavor='hive', basename_template=f'part-{batch}-{{i}}.parquet',
+                         existing_data_behavior='overwrite_or_ignore', max_partitions=len(df) + 1)
+
+    counties, parts, rows, first_code, batch = [], [], 0, 0, 0
+    for code, county in enumerate(names):
+        part = np.fromfile(os.path.join(staging, f"{tables['counties'][county]}.bin"), STAGE_DTYPE)
+        counties.append(county)
+        parts.append(part)
+        rows += len(part)
+        if rows >= batch_rows or code == len(names) - 1:
+            flush(counties, parts, first_code, batch)
+            log(f"  engineered {code + 1:,} of {len(names):,} counties ({summary['rows']:,} rows)")
+            counties, parts, rows, first_code, batch = [], [], 0, code + 1, batch + 1
+
+    if csv_file is not None:
+        csv_file.close()
+        os.replace(csv_path + '.tmp', csv_path)
+    return summary
+
+
+def ingest(src=RAW_DATA_PATH, out=DATASET_DIR, csv_path=None, chunksize=CHUNK_ROWS, batch_rows=BATCH_ROWS,
+           log=print):
+    started = time.perf_counter()
+    tmp = out + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    with tempfile.TemporaryDirectory(prefix='ev-ingest-') as staging:
+        log(f"Staging '{src}'")
+        tables = stage(src, staging, chunksize, log)
+        log(f"Building {len(tables['counties']):,} counties into '{out}'")
+        summary = build(staging, tables, tmp, csv_path, batch_rows, log)
+
+    manifest = {
+        'version': DATASET_VERSION,
+        'source_hash': file_fingerprint(src),
+        'rows': summary['rows'],
+        'rows_read': tables['rows_read'],
+        'counties': summary['counties'],
+        'first_date': pd.Timestamp(summary['first_date']).isoformat(),
+        'latest_date': pd.Timestamp(summary['latest_date']).isoformat(),
+        'percent_bounds': [float(b) for b in tables['percent_bounds']],
+        'columns': summary['columns'],
+        'partitioning': ['State', 'County'],
+    }
+    os.makedirs(tmp, exist_ok=True)
+    with open(os.path.join(tmp, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(out, ignore_errors=True)
+    os.replace(tmp, out)
+    log(f"Wrote {manifest['rows']:,} rows for {len(manifest['counties']):,} counties to '{out}' "
+        f"in {time.perf_counter() - started:.1f}s")
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--src', default=RAW_DATA_PATH)
+    parser.add_argument('--out', default=DATASET_DIR)
+    parser.add_argument('--csv', help="also write the flat preprocessed CSV here")
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS, help="raw rows read at a time")
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS, help="staged rows engineered at a time")
+    args = parser.parse_args()
+    ingest(args.src, args.out, args.csv, args.chunksize, args.batch_rows)
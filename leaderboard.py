@@ -0,0 +1,145 @@
+"""Growth leaderboard: every forecastable county ranked by its forecast growth.
+
+    python leaderboard.py [--k 10] [--bottom] [--min-current 100] [--mode recursive]
+
+A Leaderboard holds each county's current EVs, projected EVs at the end of the
+forecast and growth %, as arrays aligned with ``counties``. It is built from one
+batched forecast of every county: FORECAST_HORIZON predicts, or a single one
+for a direct model (forecasting.MONTHLY_MODES). It can also come straight from
+a precomputed forecast store. ``top`` selects the top or bottom ``k`` with
+np.argpartition and sorts only those.
+
+Leaderboards are keyed by model fingerprint, data fingerprint and mode.
+``build`` with a ``previous`` leaderboard of the same model and mode reuses
+that leaderboard's projections, so only a data change triggers work. A county
+is forecast again only when its forecast seed changed. The seed is its last
+months, months seen, code, total and latest month.
+"""
+import argparse
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from forecasting import FORECAST_HORIZON, MIN_HISTORY, MONTHLY_MODES, FeatureState
+from rollups import month_numbers
+
+COLUMNS = ['Rank', 'County', 'Current EVs', 'Projected EVs', 'Growth %']
+
+
+class Leaderboard:
+    """Current and projected EVs and growth % of every forecastable county, as aligned arrays."""
+
+    def __init__(self, counties, current, projected, model_key=None, data_key=None, mode='recursive', seeds=None,
+                 forecast=None):
+        self.counties = np.asarray(counties, dtype=object)
+        self.current = np.asarray(current, dtype=float)
+        self.projected = np.asarray(projected, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.growth = np.where(self.current > 0, (self.projected - self.current) / self.current * 100, np.nan)
+        self.model_key = model_key
+        self.data_key = data_key
+        self.mode = mode
+        self.seeds = seeds  # seed_matrix rows, for the next incremental build
+        self.forecast = len(self.counties) if forecast is None else forecast  # counties forecast to build it
+
+    def __len__(self):
+        return len(self.counties)
+
+    def top(self, k=10, largest=True, min_current=0):
+        """The ``k`` counties with the highest (or lowest) growth % among those with ``min_current`` EVs."""
+        eligible = np.flatnonzero(~np.isnan(self.growth) & (self.current >= min_current))
+        k = min(k, len(eligible))
+        if k == 0:
+            return pd.DataFrame(columns=COLUMNS)
+        score = -self.growth[eligible] if largest else self.growth[eligible]  # ascending: best first
+        # Everything tied with the k-th score is kept so ties resolve alphabetically, not by partition order
+        picked = np.flatnonzero(score <= np.partition(score, k - 1)[k - 1])
+        rows = eligible[picked[np.argsort(score[picked], kind='stable')[:k]]]
+        return pd.DataFrame({
+            'Rank': np.arange(1, k + 1),
+            'County': self.counties[rows],
+            'Current EVs': self.current[rows].astype(np.int64),
+            'Projected EVs': self.projected[rows].astype(np.int64),
+            'Growth %': self.growth[rows].round(1),
+        })
+
+
+def seed_matrix(index, rows):
+    """One row per county of everything its forecast depends on; equal rows forecast identically."""
+    return np.column_stack([
+        np.nan_to_num(index.tails[rows], nan=-1.0), index.tail_lengths[rows], index.months_since_start[rows],
+        index.codes[rows], index.current_totals[rows], month_numbers(index.latest_dates[rows]),
+    ]).astype(float)
+
+
+def build(model, index, model_key=None, data_key=None, mode='recursive', previous=None):
+    """Leaderboard of every county of ``index`` with MIN_HISTORY months, reusing ``previous`` where it can."""
+    rows = np.flatnonzero(index.tail_lengths >= MIN_HISTORY)
+    counties = np.asarray(index.counties, dtype=object)[rows]
+    current = index.current_totals[rows].astype(float)
+    seeds = seed_matrix(index, rows)
+
+    stale = np.ones(len(rows), dtype=bool)
+    projected = np.full(len(rows), np.nan)
+    if (previous is not None and previous.seeds is not None and model_key is not None
+            and (previous.model_key, previous.mode) == (model_key, mode)):
+        positions = {county: pos for pos, county in enumerate(previous.counties)}
+        match = np.array([positions.get(county, -1) for county in counties], dtype=np.int64)
+        found = np.flatnonzero(match >= 0)
+        same = found[(previous.seeds[match[found]] == seeds[found]).all(axis=1)]
+        projected[same] = previous.projected[match[same]]
+        stale[same] = False
+
+    if stale.any():
+        picked = rows[stale]
+        state = FeatureState(index.tails[picked], index.tail_lengths[picked], index.months_since_start[picked],
+                             index.codes[picked], index.current_totals[picked])
+        months = MONTHLY_MODES[mode](model, state, FORECAST_HORIZON)
+        projected[stale] = current[stale] + np.rint(months).sum(axis=1)  # the app's rounded cumulative total
+    return Leaderboard(counties, current, projected, model_key, data_key, mode, seeds, int(stale.sum()))
+
+
+def from_store(store, forecast_key=None, data_key=None):
+    """Leaderboard of a forecast_store.ForecastStore's precomputed forecasts."""
+    return Leaderboard(store.counties, store.current_total, store.cumulative[:, -1], forecast_key, data_key,
+                       'store')
+
+
+class LeaderboardCache:
+    """The latest Leaderboard per mode, built incrementally from the last one when a fingerprint changes."""
+
+    def __init__(self):
+        self._boards = {}
+        self._lock = threading.Lock()
+
+    def get(self, model, index, model_key, data_key, mode='recursive'):
+        with self._lock:
+            board = self._boards.get(mode)
+            if board is None or (board.model_key, board.data_key) != (model_key, data_key):
+                board = self._boards[mode] = build(model, index, model_key, data_key, mode, previous=board)
+            return board
+
+
+if __name__ == '__main__':
+    from data_loader import DATA_PATH, CountyIndex, load_dataset
+    from direct_model import DIRECT_FOREST_DIR, DIRECT_MODEL_PATH
+    from forest import FOREST_DIR, MODEL_PATH, load_model
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--bottom', action='store_true', help="slowest-growing counties instead")
+    parser.add_argument('--min-current', type=int, default=0, help="only counties with at least this many EVs")
+    parser.add_argument('--mode', choices=sorted(MONTHLY_MODES), default='recursive')
+    parser.add_argument('--model', help="default: the shipped model for --mode")
+    parser.add_argument('--data', default=DATA_PATH)
+    args = parser.parse_args()
+
+    paths = {'recursive': (MODEL_PATH, FOREST_DIR), 'direct': (DIRECT_MODEL_PATH, DIRECT_FOREST_DIR)}[args.mode]
+    model = load_model(args.model or paths[0], paths[1])
+    index = CountyIndex(load_dataset(args.data))
+    started = time.perf_counter()
+    board = build(model, index, mode=args.mode)
+    print(f"Forecast {len(board)} counties in {(time.perf_counter() - started) * 1000:.0f} ms\n")
+    print(board.top(args.k, not args.bottom, args.min_current).to_string(index=False))
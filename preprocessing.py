@@ -0,0 +1,241 @@
+import numpy as np
+import pandas as pd
+
+from typing import NamedTuple
+
+from forecasting import SLOPE_WEIGHTS, TARGET
+
+RAW_DATA_PATH = "Electric_Vehicle_Population_By_County.csv"
+PREPROCESSED_DATA_PATH = "preprocessed_ev_data.csv"
+DATE_FORMAT = "%B %d %Y"  # e.g. "September 30 2022"
+
+NUMERIC_COLUMNS = [
+    'Battery Electric Vehicles (BEVs)',
+    'Plug-In Hybrid Electric Vehicles (PHEVs)',
+    'Electric Vehicle (EV) Total',
+    'Non-Electric Vehicle Total',
+    'Total Vehicles',
+    'Percent Electric Vehicles'
+]
+
+LAG_WINDOW = len(SLOPE_WEIGHTS)  # totals behind each row that any feature looks at
+
+# Columns the notebook appends to the raw schema, in output order
+FEATURE_COLUMNS = [
+    'year',
+    'month',
+    'numeric_date',
+    'county_encoded',
+    'months_since_start',
+    'ev_total_lag1',
+    'ev_total_lag2',
+    'ev_total_lag3',
+    'ev_total_roll_mean_3',
+    'ev_total_pct_change_1',
+    'ev_total_pct_change_3',
+    'cumulative_ev',
+    'ev_growth_slope',
+]
+
+
+class CountyTail(NamedTuple):
+    """What feature engineering needs to know about a county's rows so far."""
+    code: int
+    months: int          # rows seen, i.e. the next row's months_since_start
+    totals: np.ndarray   # last LAG_WINDOW EV totals, oldest first, NaN-padded
+    cumulative: float    # running EV total (missing months skipped)
+
+
+EMPTY_TAIL = CountyTail(-1, 0, np.full(LAG_WINDOW, np.nan), 0.0)
+
+
+def parse_dates(dates):
+    """Parse raw dates with the fixed DATE_FORMAT, falling back to inference for odd rows."""
+    parsed = pd.to_datetime(dates, format=DATE_FORMAT, errors='coerce')
+    missed = parsed.isna() & dates.notna()
+    if missed.any():
+        parsed[missed] = pd.to_datetime(dates[missed], errors='coerce')
+    return parsed
+
+
+def percent_bounds(raw):
+    """IQR outlier bounds for 'Percent Electric Vehicles', taken from the raw column."""
+    q1 = raw['Percent Electric Vehicles'].quantile(0.25)
+    q3 = raw['Percent Electric Vehicles'].quantile(0.75)
+    iqr = q3 - q1
+    return q1 - 1.5 * iqr, q3 + 1.5 * iqr
+
+
+def clean(raw, bounds=None):
+    """Notebook cleaning steps: date parsing, null handling, outlier capping, numeric casts.
+
+    ``bounds`` overrides the outlier bounds, e.g. to clean appended rows with the
+    bounds of the full history.
+    """
+    df = raw.copy()
+
+    # IQR bounds come from the raw column, before any rows are dropped
+    lower_bound, upper_bound = bounds if bounds is not None else percent_bounds(df)
+
+    df['Date'] = parse_dates(df['Date'])
+    df = df[df['Date'].notnull() & df[TARGET].notnull()].copy()
+    df['County'] = df['County'].fillna('Unknown')
+    df['State'] = df['State'].fillna('Unknown')
+    df['Percent Electric Vehicles'] = df['Percent Electric Vehicles'].clip(lower_bound, upper_bound)
+
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors='coerce')
+    return df
+
+
+def _shift(values, positions, k):
+    """Shift ``values`` by ``k`` rows within each group of a group-sorted array."""
+    shifted = np.full(len(values), np.nan)
+    shifted[k:] = values[:-k]
+    shifted[positions < k] = np.nan
+    return shifted
+
+
+def engineer_features(df):
+    """Add the model features to a cleaned frame in one sorted pass over all counties.
+
+    Equivalent to the notebook's per-county groupby shift / rolling / pct_change /
+    polyfit cells. Rows are stably sorted by (County, Date) once; every feature is
+    then a NumPy expression over shifted copies of the EV totals, with each row's
+    position inside its county masking values that would cross a county boundary.
+    """
+    df = df.copy()
+    df['year'] = df['Date'].dt.year
+    df['month'] = df['Date'].dt.month
+    df['numeric_date'] = df['Date'].dt.year * 12 + df['Date'].dt.month  # For trend
+    df['county_encoded'] = pd.factorize(df['County'], sort=True)[0]
+
+    order = np.lexsort((df['Date'].values, df['county_encoded'].values))
+    df = df.iloc[order]
+
+    codes = df['county_encoded'].values
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+    group_sizes = np.diff(np.r_[starts, len(codes)])
+    positions = np.arange(len(codes)) - np.repeat(starts, group_sizes)
+    df['months_since_start'] = positions
+
+    ev = df[TARGET].values.astype(float)
+    lags = {k: _shift(ev, positions, k) for k in range(1, LAG_WINDOW + 1)}
+
+    # Cumulative sum restarting at every county; NaN totals stay NaN but are skipped
+    missing = np.isnan(ev)
+    running = np.cumsum(np.where(missing, 0.0, ev))
+    offsets = np.repeat(running[starts] - np.where(missing[starts], 0.0, ev[starts]), group_sizes)
+    cumulative = np.where(missing, np.nan, running - offsets)
+
+    _add_lag_features(df, ev, lags, cumulative, positions >= LAG_WINDOW)
+    return df
+
+
+def _add_lag_features(df, ev, lags, cumulative, has_window):
+    """Lag, rolling-mean, pct-change, cumulative and slope columns; ``lags[k]`` is the total k months back."""
+    for k in (1, 2, 3):
+        df[f'ev_total_lag{k}'] = lags[k]
+    df['ev_total_roll_mean_3'] = (lags[1] + lags[2] + lags[3]) / 3
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for k in (1, 3):
+            pct = ev / lags[k] - 1
+            df[f'ev_total_pct_change_{k}'] = np.where(np.isfinite(pct), pct, 0.0)
+    df['cumulative_ev'] = cumulative
+
+    # 6-month slope of the cumulative curve: weighted sum of the last five totals.
+    # The window is only valid once six non-missing months are available.
+    window_missing = np.isnan(ev).astype(np.int64)
+    for k in range(1, LAG_WINDOW + 1):
+        window_missing += np.isnan(lags[k])
+    recent = np.column_stack([ev] + [lags[k] for k in range(1, LAG_WINDOW)])
+    slope = recent @ SLOPE_WEIGHTS
+    df['ev_growth_slope'] = np.where(has_window & (window_missing == 0), slope, np.nan)
+
+
+def engineer_increment(new, history):
+    """Features for cleaned rows that continue each county's series past ``history``.
+
+    ``history`` maps County -> CountyTail (code, months seen, last ``LAG_WINDOW``
+    totals, running total) as recorded after the rows already processed, so only
+    the new rows are touched. Counties missing from ``history`` start from scratch
+    and take the next free codes. Rows come back sorted by (County, Date) with the
+    same columns as ``engineer_features``.
+    """
+    df = new.copy()
+    df['year'] = df['Date'].dt.year
+    df['month'] = df['Date'].dt.month
+    df['numeric_date'] = df['Date'].dt.year * 12 + df['Date'].dt.month
+
+    codes = {county: tail.code for county, tail in history.items()}
+    next_code = max(codes.values(), default=-1) + 1
+    for offset, county in enumerate(sorted(set(df['County']) - set(codes))):
+        codes[county] = next_code + offset
+    df['county_encoded'] = df['County'].map(codes).astype(np.int64)
+
+    order = np.lexsort((df['Date'].values, df['county_encoded'].values))
+    df = df.iloc[order]
+
+    group_codes = df['county_encoded'].values
+    starts = np.flatnonzero(np.r_[True, group_codes[1:] != group_codes[:-1]])
+    group_sizes = np.diff(np.r_[starts, len(group_codes)])
+    positions = np.arange(len(group_codes)) - np.repeat(starts, group_sizes)
+    tails = [history.get(county, EMPTY_TAIL) for county in df['County'].values[starts]]
+    df['months_since_start'] = positions + np.repeat([tail.months for tail in tails], group_sizes)
+
+    # Each county's stored totals followed by its new ones; lags of the new rows are
+    # shifts of that extended series, so nothing before the stored window is needed
+    ev = df[TARGET].values.astype(float)
+    extended = np.concatenate([np.r_[tail.totals, ev[start:start + size]]
+                               for tail, start, size in zip(tails, starts, group_sizes)])
+    extended_positions = np.concatenate([np.arange(LAG_WINDOW + size) for size in group_sizes])
+    is_new = extended_positions >= LAG_WINDOW
+    lags = {k: _shift(extended, extended_positions, k)[is_new] for k in range(1, LAG_WINDOW + 1)}
+
+    missing = np.isnan(ev)
+    running = np.cumsum(np.where(missing, 0.0, ev))
+    offsets = np.repeat(running[starts] - np.where(missing[starts], 0.0, ev[starts])
+                        - np.array([tail.cumulative for tail in tails]), group_sizes)
+    cumulative = np.where(missing, np.nan, running - offsets)
+
+    _add_lag_features(df, ev, lags, cumulative, df['months_since_start'].values >= LAG_WINDOW)
+    return df
+
+
+def county_tails(engineered, history=None):
+    """``history`` advanced past the rows of ``engineered``, a sorted frame from engineer_features / engineer_increment."""
+    history = dict(history or {})
+    for county, rows in engineered.groupby('County', sort=False):
+        ev = rows[TARGET].values.astype(float)
+        tail = history.get(county, EMPTY_TAIL)
+        history[county] = CountyTail(
+            int(rows['county_encoded'].iloc[0]),
+            int(rows['months_since_start'].iloc[-1]) + 1,
+            np.r_[tail.totals, ev][-LAG_WINDOW:],
+            tail.cumulative + float(np.nansum(ev)),
+        )
+    return history
+
+
+def preprocess(raw):
+    """Raw registration frame -> model-ready frame with the preprocessed_ev_data.csv schema."""
+    df = engineer_features(clean(raw))
+    # Drop early rows with no lag data
+    return df.dropna().reset_index(drop=True)
+
+
+def main(src=RAW_DATA_PATH, dest=PREPROCESSED_DATA_PATH):
+    df = preprocess(pd.read_csv(src))
+    df.to_csv(dest, index=False)
+    print(f"Wrote {len(df):,} rows to '{dest}'")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build preprocessed_ev_data.csv from the raw registration CSV.")
+    parser.add_argument("--src", default=RAW_DATA_PATH)
+    parser.add_argument("--dest", default=PREPROCESSED_DATA_PATH)
+    args = parser.parse_args()
+    main(args.src, args.dest)
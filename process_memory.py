@@ -0,0 +1,101 @@
+"""Per-process memory figures, for checking what replicas of the app really cost.
+
+    python process_memory.py PID [PID ...]
+
+RSS counts every resident page a process maps, including pages it shares with
+other processes (the memory-mapped forest and data cache). PSS splits each shared
+page evenly between the processes mapping it, so summing PSS over all replicas
+gives their true combined footprint. Linux only: other platforms report None.
+"""
+import os
+
+FIELDS = {
+    'Rss': 'rss_mb',
+    'Pss': 'pss_mb',
+    'Shared_Clean': 'shared_mb',
+    'Shared_Dirty': 'shared_mb',
+    'Private_Clean': 'private_mb',
+    'Private_Dirty': 'private_mb',
+}
+
+
+def process_memory(pid='self'):
+    """{'rss_mb', 'pss_mb', 'shared_mb', 'private_mb'} for ``pid``, or None where /proc is unavailable."""
+    try:
+        with open(os.path.join('/proc', str(pid), 'smaps_rollup')) as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    memory = dict.fromkeys(FIELDS.values(), 0.0)
+    for line in lines:
+        name, _, rest = line.partition(':')
+        if name in FIELDS:
+            memory[FIELDS[name]] += int(rest.split()[0]) / 1024
+    return memory
+
+
+def mapped_memory(directory, pid='self'):
+    """{'rss_mb', 'pss_mb'} of ``pid``'s mappings of files under ``directory``, or None without /proc."""
+    prefix = os.path.join(os.path.realpath(directory), '')
+    try:
+        with open(os.path.join('/proc', str(pid), 'smaps')) as f:
+            lines = f.readlines()
+    except OSError:
+        return None
+
+    memory = {'rss_mb': 0.0, 'pss_mb': 0.0}
+    inside = False
+    for line in lines:
+        name, _, rest = line.partition(':')
+        if ' ' not in name:  # a field of the current mapping
+            if inside and name in ('Rss', 'Pss'):
+                memory[FIELDS[name]] += int(rest.split()[0]) / 1024
+        else:  # a mapping header: address perms offset dev inode [path]
+            parts = line.split(None, 5)
+            inside = len(parts) == 6 and parts[5].strip().startswith(prefix)
+    return memory
+
+
+def peak_rss_mb(pid='self'):
+    """High-water mark of the resident set (VmHWM), or None where /proc is unavailable."""
+    try:
+        with open(os.path.join('/proc', str(pid), 'status')) as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss():
+    """Restart this process's VmHWM from its current RSS, so a peak can be taken per task."""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def format_memory(memory):
+    if memory is None:
+        return 'n/a'
+    return 'RSS {rss_mb:.1f} MB, PSS {pss_mb:.1f} MB ({shared_mb:.1f} MB shared)'.format(**memory)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('pids', nargs='*', default=['self'])
+    args = parser.parse_args()
+
+    total_pss = 0.0
+    for pid in args.pids:
+        memory = process_memory(pid)
+        print(f"{pid}: {format_memory(memory)}")
+        total_pss += memory['pss_mb'] if memory else 0.0
+    if len(args.pids) > 1:
+        print(f"total PSS: {total_pss:.1f} MB")
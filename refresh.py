@@ -0,0 +1,291 @@
+"""Incremental monthly refresh of the dataset and the forecasting model.
+
+    python refresh.py init                                  # once, from the current raw CSV
+    python refresh.py update --raw Electric_Vehicle_Population_By_County.csv [--promote]
+
+``init`` records each county's tail state -- code, months seen, last five EV
+totals and running total -- plus the raw file's size and hash.
+
+``update`` takes a new snapshot of the raw CSV. When the snapshot only appends
+rows to the file seen last time, just the appended bytes are parsed. Rows newer
+than each county's last month are cleaned with the stored outlier bounds and
+engineered from the tail state alone, then appended to preprocessed_ev_data.csv.
+
+The model is first scored on the new months, which it has never seen. If that
+error is within ``--drift-threshold`` times the median of earlier refreshes,
+``--extra-trees`` trees are added with ``warm_start``, trained on the last
+``--recent-months`` months. Otherwise the forest is refit on the full dataset
+with its original size and parameters. The result is written next to the model
+as ``forecasting_ev_model.<YYYY-MM>.pkl``. ``--promote`` also installs it as
+forecasting_ev_model.pkl, keeping the old file versioned, and re-exports the
+flattened forest.
+
+Counties seen for the first time get the next free codes; a full rebuild with
+preprocessing.py would renumber them alphabetically.
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from data_loader import DATA_PATH, load_dataset
+from fingerprints import file_fingerprint
+from forecasting import FEATURES, TARGET, predict
+from preprocessing import (CountyTail, NUMERIC_COLUMNS, RAW_DATA_PATH, clean, county_tails,
+                           engineer_features, engineer_increment, percent_bounds)
+
+MODEL_PATH = 'forecasting_ev_model.pkl'
+STATE_DIR = os.path.join('artifacts', 'refresh')
+STATE_VERSION = 1
+
+
+def _prefix_hash(path, size, chunk_size=1 << 20):
+    """file_fingerprint of the first ``size`` bytes of ``path``."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while size > 0:
+            chunk = f.read(min(chunk_size, size))
+            if not chunk:
+                break
+            digest.update(chunk)
+            size -= len(chunk)
+    return digest.hexdigest()[:16]
+
+
+class RefreshState:
+    """Per-county tail state and bookkeeping carried from one refresh to the next."""
+
+    def __init__(self, history, latest, meta):
+        self.history = history  # {County: CountyTail}
+        self.latest = latest    # {County: last month already processed}
+        self.meta = meta
+
+    def save(self, state_dir=STATE_DIR):
+        counties = sorted(self.history)
+        tmp = os.path.join(state_dir, 'state.tmp.npz')
+        os.makedirs(state_dir, exist_ok=True)
+        np.savez(
+            tmp,
+            counties=np.array(counties, dtype=str),
+            codes=np.array([self.history[c].code for c in counties], dtype=np.int64),
+            months=np.array([self.history[c].months for c in counties], dtype=np.int64),
+            totals=np.array([self.history[c].totals for c in counties], dtype=float).reshape(len(counties), -1),
+            cumulative=np.array([self.history[c].cumulative for c in counties], dtype=float),
+            latest=np.array([self.latest[c] for c in counties], dtype='datetime64[ns]'),
+        )
+        os.replace(tmp, os.path.join(state_dir, 'state.npz'))
+        with open(os.path.join(state_dir, 'state.json.tmp'), 'w') as f:
+            json.dump(self.meta, f, indent=2)
+        os.replace(os.path.join(state_dir, 'state.json.tmp'), os.path.join(state_dir, 'state.json'))
+
+    @classmethod
+    def load(cls, state_dir=STATE_DIR):
+        try:
+            with open(os.path.join(state_dir, 'state.json')) as f:
+                meta = json.load(f)
+            arrays = np.load(os.path.join(state_dir, 'state.npz'))
+        except OSError:
+            raise FileNotFoundError(f"No refresh state in '{state_dir}'; run `python refresh.py init` first.") from None
+        if meta.get('version') != STATE_VERSION:
+            raise ValueError(f"Refresh state in '{state_dir}' is from another version; run `python refresh.py init`.")
+        counties = arrays['counties'].tolist()
+        history = {
+            county: CountyTail(int(code), int(months), totals, float(cumulative))
+            for county, code, months, totals, cumulative in zip(
+                counties, arrays['codes'], arrays['months'], arrays['totals'], arrays['cumulative'])
+        }
+        latest = dict(zip(counties, pd.to_datetime(arrays['latest'])))
+        return cls(history, latest, meta)
+
+
+def _latest_by_county(engineered):
+    return engineered.groupby('County', sort=False)['Date'].max().to_dict()
+
+
+def _model_version(dates):
+    return pd.Timestamp(dates.max()).strftime('%Y-%m')
+
+
+def init(raw_path=RAW_DATA_PATH, data_path=DATA_PATH, model_path=MODEL_PATH, state_dir=STATE_DIR):
+    """Record the tail state of ``raw_path``, which ``data_path`` must have been built from."""
+    import joblib
+
+    raw = pd.read_csv(raw_path)
+    bounds = percent_bounds(raw)
+    engineered = engineer_features(clean(raw, bounds))
+    state = RefreshState(county_tails(engineered), _latest_by_county(engineered), {
+        'version': STATE_VERSION,
+        'raw_size': os.path.getsize(raw_path),
+        'raw_hash': file_fingerprint(raw_path),
+        'data_size': os.path.getsize(data_path),
+        'percent_bounds': [float(b) for b in bounds],
+        'model_version': _model_version(engineered['Date']),
+        'base_trees': joblib.load(model_path).n_estimators,
+        'errors': [],  # out-of-sample MAE of the model on each refresh's new months
+        'updated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    })
+    state.save(state_dir)
+    return state
+
+
+def read_snapshot(raw_path, meta):
+    """Rows of ``raw_path`` that may be new, and whether only the appended bytes were read."""
+    size = os.path.getsize(raw_path)
+    old_size = meta['raw_size']
+    if size >= old_size and _prefix_hash(raw_path, old_size) == meta['raw_hash']:
+        with open(raw_path, 'rb') as f:
+            header = f.readline()
+            f.seek(max(old_size - 1, 0))
+            boundary, appended = f.read(1), f.read()
+        if boundary == b'\n':
+            text = (header + appended).decode('utf-8-sig')
+            return pd.read_csv(io.StringIO(text)), True
+    return pd.read_csv(raw_path), False
+
+
+def new_rows(raw, state):
+    """Cleaned rows later than the last processed month of their county."""
+    cleaned = clean(raw, tuple(state.meta['percent_bounds']))
+    latest = cleaned['County'].map(state.latest).astype('datetime64[ns]')
+    return cleaned[latest.isna() | (cleaned['Date'] > latest)]
+
+
+def _versioned_path(model_path, version):
+    root, ext = os.path.splitext(model_path)
+    path, n = f"{root}.{version}{ext}", 1
+    while os.path.exists(path):
+        n += 1
+        path = f"{root}.{version}-{n}{ext}"
+    return path
+
+
+def update_model(model, state, new, data_path, extra_trees=25, recent_months=12,
+                 drift_threshold=1.5, max_trees=400, refit=False):
+    """Warm-start or refit ``model`` for the engineered rows ``new``; returns (model, action, new-month MAE)."""
+    from sklearn.base import clone
+    from sklearn.metrics import mean_absolute_error
+
+    X_new = new[FEATURES].values.astype(np.float32)
+    y_new = new[TARGET].values.astype(float)
+    error = float(mean_absolute_error(y_new, predict(model, X_new)))
+    baseline = float(np.median(state.meta['errors'])) if state.meta['errors'] else None
+    if baseline and error > drift_threshold * baseline:
+        refit, action = True, f"refit (MAE {error:.3f} > {drift_threshold} x {baseline:.3f})"
+    elif refit:
+        action = "refit (requested)"
+    elif model.n_estimators + extra_trees > max_trees:
+        refit, action = True, f"refit (forest would exceed {max_trees} trees)"
+    else:
+        action = f"warm start +{extra_trees} trees"
+
+    df = load_dataset(data_path)  # memory-mapped cache of the rows before this refresh
+    if refit:
+        history = df
+        model = clone(model).set_params(n_estimators=state.meta['base_trees'], warm_start=False)
+    else:
+        cutoff = pd.Timestamp(df['Date'].max()) - pd.DateOffset(months=recent_months)
+        history = df[df['Date'].values > cutoff.to_datetime64()]
+        model.set_params(warm_start=True, n_estimators=model.n_estimators + extra_trees)
+
+    X = np.concatenate([history[FEATURES].values.astype(np.float32), X_new])
+    y = np.concatenate([history[TARGET].values.astype(float), y_new])
+    # Refit the way the notebook did (named columns) so feature_names_in_ is kept
+    model.fit(pd.DataFrame(X, columns=FEATURES), y)
+    model.set_params(warm_start=False)
+    return model, action, error
+
+
+def update(raw_path=RAW_DATA_PATH, data_path=DATA_PATH, model_path=MODEL_PATH, state_dir=STATE_DIR,
+           promote=False, log=print, **model_options):
+    """Append the new months of ``raw_path`` to ``data_path`` and write an updated model."""
+    import joblib
+
+    timings = {}
+    started = time.perf_counter()
+    state = RefreshState.load(state_dir)
+    if os.path.getsize(data_path) != state.meta['data_size']:
+        raise ValueError(f"'{data_path}' changed since the last refresh; run `python refresh.py init` again.")
+
+    raw, appended_only = read_snapshot(raw_path, state.meta)
+    fresh = new_rows(raw, state)
+    timings['read'] = time.perf_counter() - started
+    if fresh.empty:
+        log(f"No new months in '{raw_path}'.")
+        return None
+
+    mark = time.perf_counter()
+    engineered = engineer_increment(fresh, state.history)
+    new = engineered.dropna().reset_index(drop=True)
+    timings['features'] = time.perf_counter() - mark
+    log(f"{len(fresh):,} new rows ({len(new):,} model-ready) for {fresh['County'].nunique()} counties"
+        f"{'' if appended_only else ' (snapshot was re-read in full)'}")
+
+    mark = time.perf_counter()
+    model, action, error = update_model(joblib.load(model_path), state, new, data_path, **model_options)
+    version = _model_version(new['Date'])
+    out = _versioned_path(model_path, version)
+    joblib.dump(model, out)
+    timings['model'] = time.perf_counter() - mark
+    log(f"Model: {action}; {model.n_estimators} trees -> '{out}'")
+
+    # Counts are written as floats, like the rest of the file
+    columns = pd.read_csv(data_path, nrows=0).columns
+    new.astype({col: float for col in NUMERIC_COLUMNS})[columns].to_csv(data_path, mode='a', header=False, index=False)
+
+    if promote:
+        from forest import export
+
+        root, ext = os.path.splitext(model_path)
+        previous = f"{root}.{state.meta['model_version']}{ext}"
+        if not os.path.exists(previous):
+            shutil.copyfile(model_path, previous)
+        shutil.copyfile(out, model_path + '.tmp')
+        os.replace(model_path + '.tmp', model_path)
+        export(model_path)
+        log(f"Promoted to '{model_path}' (previous model kept as '{previous}')")
+
+    state.history = county_tails(engineered, state.history)
+    state.latest.update(_latest_by_county(engineered))
+    state.meta.update({
+        'raw_size': os.path.getsize(raw_path),
+        'raw_hash': file_fingerprint(raw_path),
+        'data_size': os.path.getsize(data_path),
+        'model_version': version if promote else state.meta['model_version'],
+        'errors': state.meta['errors'] + [error],
+        'updated_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+    })
+    state.save(state_dir)
+    timings['total'] = time.perf_counter() - started
+    log("Timings: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in timings.items()))
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', choices=['init', 'update'])
+    parser.add_argument('--raw', default=RAW_DATA_PATH)
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--state', default=STATE_DIR)
+    parser.add_argument('--promote', action='store_true', help="install the new model as --model")
+    parser.add_argument('--refit', action='store_true', help="refit on the full dataset instead of warm-starting")
+    parser.add_argument('--extra-trees', type=int, default=25)
+    parser.add_argument('--recent-months', type=int, default=12)
+    parser.add_argument('--drift-threshold', type=float, default=1.5)
+    parser.add_argument('--max-trees', type=int, default=400)
+    args = parser.parse_args()
+
+    if args.command == 'init':
+        state = init(args.raw, args.data, args.model, args.state)
+        print(f"Recorded tail state for {len(state.history)} counties in '{args.state}'")
+    else:
+        update(args.raw, args.data, args.model, args.state, promote=args.promote, refit=args.refit,
+               extra_trees=args.extra_trees, recent_months=args.recent_months,
+               drift_threshold=args.drift_threshold, max_trees=args.max_trees)
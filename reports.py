@@ -0,0 +1,189 @@
+"""Downloadable forecast reports for one county or for all of them.
+
+A report is a ZIP with
+
+    forecasts.csv      one row per county and forecast month
+    forecasts.xlsx     the same table plus the summary sheet (when openpyxl is installed)
+    summary.csv        current and projected EVs and growth per county
+    charts/<county>.png  the trajectory chart the app shows
+
+The forecasts are passed in, so the app hands over what its forecast cache (or
+the precomputed store) already holds. Charts take most of the time, so for more
+than a few counties they are rendered by a process pool. Each worker loads the
+indexed dataset once. PNGs are written into the ZIP as they come back, with at
+most a few batches in flight, so memory does not grow with the number of
+counties.
+
+    python reports.py [--counties Orange Lake] [--out report.zip] [--workers 4]
+"""
+import io
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import pandas as pd
+
+from charts import trajectory_png
+from data_loader import DATA_PATH, CountyIndex, load_dataset
+
+REPORT_DIR = os.path.join('artifacts', 'reports')
+BATCH_SIZE = 8  # counties per worker task
+
+
+def forecast_table(forecasts):
+    """Long table of ``{county: CountyForecast}``: County, Date, Predicted EV Total, Cumulative EV."""
+    return pd.concat([result.forecast.assign(County=county) for county, result in forecasts.items()],
+                     ignore_index=True)[['County', 'Date', 'Predicted EV Total', 'Cumulative EV']]
+
+
+def summary_table(forecasts):
+    return pd.DataFrame({
+        'County': list(forecasts),
+        'Current EVs': [int(r.current_total) for r in forecasts.values()],
+        'Projected EVs': [int(r.projected_total) for r in forecasts.values()],
+        'Growth %': [None if r.growth_pct is None else round(r.growth_pct, 1) for r in forecasts.values()],
+    })
+
+
+def _excel_engine():
+    try:
+        import openpyxl  # noqa: F401
+    except ImportError:
+        return None
+    return 'openpyxl'
+
+
+def trajectory_chart(index, county, result):
+    """The app's trajectory chart for ``county`` as PNG bytes."""
+    history = index.history(county)
+    historical = pd.DataFrame({
+        'Date': history['Date'].values,
+        'Cumulative EV': history['Cumulative EV'].values,
+        'Source': 'Historical',
+    })
+    combined = pd.concat([historical, result.forecast[['Date', 'Cumulative EV']].assign(Source='Forecast')],
+                         ignore_index=True)
+    return trajectory_png(combined, county, index.latest_date(county), result.current_total, result.projected_total)
+
+
+def chart_name(county):
+    return 'charts/' + re.sub(r'[^\w.-]+', '_', county) + '.png'
+
+
+# === Worker processes ===
+_index = None
+
+
+def _init_worker(data_path, states=None):
+    global _index
+    _index = CountyIndex(load_dataset(data_path, states=states))
+
+
+def _render(batch, index=None):
+    index = _index if index is None else index
+    return [(county, trajectory_chart(index, county, result)) for county, result in batch]
+
+
+def _pool_charts(batches, data_path, workers, states=None):
+    """Yield rendered batches as they finish, keeping at most ``2 * workers`` in flight."""
+    context = multiprocessing.get_context('spawn')  # never fork the threads of a running server
+    with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                             initargs=(data_path, states)) as pool:
+        batches = iter(batches)
+        pending = set()
+        while True:
+            while len(pending) < 2 * workers:
+                batch = next(batches, None)
+                if batch is None:
+                    break
+                pending.add(pool.submit(_render, batch))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def write_report(target, forecasts, index, data_path=DATA_PATH, workers=None, progress=None, states=None):
+    """Write the report ZIP for ``forecasts`` ({county: CountyForecast}) to ``target`` (a path or file).
+
+    ``progress(done, total)`` is called after each rendered batch. A pool is
+    used only when there is more than one batch to render and ``workers`` > 1;
+    its workers load ``data_path`` limited to ``states``, as ``index`` was.
+    """
+    counties = list(forecasts)
+    workers = workers or os.cpu_count() or 1
+    batches = [[(county, forecasts[county]) for county in counties[i:i + BATCH_SIZE]]
+               for i in range(0, len(counties), BATCH_SIZE)]
+
+    table, summary = forecast_table(forecasts), summary_table(forecasts)
+    with zipfile.ZipFile(target, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr('forecasts.csv', table.to_csv(index=False))
+        zf.writestr('summary.csv', summary.to_csv(index=False))
+        engine = _excel_engine()
+        if engine is not None:
+            workbook = io.BytesIO()
+            with pd.ExcelWriter(workbook, engine=engine) as writer:
+                summary.to_excel(writer, sheet_name='Summary', index=False)
+                table.to_excel(writer, sheet_name='Forecasts', index=False)
+            zf.writestr('forecasts.xlsx', workbook.getvalue())
+
+        if workers > 1 and len(batches) > 1:
+            rendered = _pool_charts(batches, data_path, min(workers, len(batches)), states)
+        else:
+            rendered = (_render(batch, index) for batch in batches)
+        done = 0
+        for charts in rendered:
+            for county, png in charts:
+                zf.writestr(chart_name(county), png, compress_type=zipfile.ZIP_STORED)  # PNG is compressed
+            done += len(charts)
+            if progress is not None:
+                progress(done, len(counties))
+
+
+def report_path(data_key, forecast_key, scope, report_dir=REPORT_DIR):
+    """Where the report for this data and forecast version is kept, so it is built once."""
+    scope = re.sub(r'[^\w.-]+', '_', scope)
+    return os.path.join(report_dir, f'ev_report_{scope}_{data_key}_{forecast_key}.zip')
+
+
+def build_report(path, forecasts, index, data_path=DATA_PATH, workers=None, progress=None, states=None):
+    """write_report into ``path`` atomically; an existing report at ``path`` is reused as is."""
+    if os.path.exists(path):
+        return path
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp = f'{path}.{os.getpid()}.tmp'
+    try:
+        write_report(tmp, forecasts, index, data_path, workers, progress, states)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return path
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from forecast_cache import ForecastCache
+    from forecasting import MIN_HISTORY
+    from forest import MODEL_PATH, load_model
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--counties', nargs='+', help="default: every county with enough history")
+    parser.add_argument('--model', default=MODEL_PATH)
+    parser.add_argument('--data', default=DATA_PATH)
+    parser.add_argument('--out', default='ev_report.zip')
+    parser.add_argument('--workers', type=int, help="chart processes (default: one per CPU)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    index = CountyIndex(load_dataset(args.data))
+    counties = args.counties or [c for c, n in zip(index.counties, index.tail_lengths) if n >= MIN_HISTORY]
+    forecasts = ForecastCache(maxsize=len(counties)).get_many(load_model(args.model), index, counties, None, None)
+    write_report(args.out, forecasts, index, args.data, args.workers,
+                 lambda done, total: print(f"\r{done}/{total} charts", end='', flush=True))
+    print(f"\nWrote '{args.out}' ({os.path.getsize(args.out) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,120 @@
+"""Monthly rollups of the preprocessed dataset, materialized once per data version.
+
+The preprocessed CSV has one row per County, State, Vehicle Primary Use and
+month. A county name can exist in several states, and Passenger and Truck rows
+share a month. The rollups sum such rows once, into compact tables keyed by
+integer codes:
+
+    county        County x month, all states and uses summed: the series the app
+                  charts and seeds its forecasts from
+    county_state  (County, State) pair x month; ``pair_county`` / ``pair_state``
+                  give each pair's codes
+    state         State x month
+    total         month, every row of the dataset (the single key 0)
+
+Every table is a ``Rollup``. Its rows are sorted by (key code, month) and held
+in contiguous arrays: the key codes, the month codes and one int64 array per
+measure (MEASURES). ``starts`` / ``stops`` give each key's row range, so one
+key's series is a slice. Month codes count calendar months from the first
+month of the data, and ``months`` holds their month-end dates. A key has no row
+for a month without data, rather than a zero.
+"""
+import numpy as np
+import pandas as pd
+
+MEASURES = {
+    'ev': 'Electric Vehicle (EV) Total',
+    'bev': 'Battery Electric Vehicles (BEVs)',
+    'phev': 'Plug-In Hybrid Electric Vehicles (PHEVs)',
+    'vehicles': 'Total Vehicles',
+}
+
+
+def month_numbers(dates):
+    """Calendar month count (year * 12 + month - 1) of each date."""
+    dates = pd.DatetimeIndex(dates)
+    return np.asarray(dates.year * 12 + dates.month - 1, dtype=np.int64)
+
+
+class Rollup:
+    """One rollup table: rows sorted by (key code, month), with each key's row range."""
+
+    __slots__ = ('codes', 'month', 'measures', 'starts', 'stops')
+
+    def __init__(self, codes, month, measures, n_keys):
+        self.codes = codes
+        self.month = month
+        self.measures = measures
+        keys = np.arange(n_keys)
+        self.starts = np.searchsorted(codes, keys)
+        self.stops = np.searchsorted(codes, keys, side='right')
+
+    @classmethod
+    def aggregate(cls, codes, month, values, n_keys):
+        """Sum ``values`` ({measure: array per row}) over the rows that share (code, month)."""
+        span = int(month.max()) + 1
+        cells, rows = np.unique(codes.astype(np.int64) * span + month, return_inverse=True)
+        measures = {name: np.rint(np.bincount(rows, weights=v, minlength=len(cells))).astype(np.int64)
+                    for name, v in values.items()}
+        return cls((cells // span).astype(np.int32), (cells % span).astype(np.int32), measures, n_keys)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def rows(self, code):
+        return slice(self.starts[code], self.stops[code])
+
+
+class Rollups:
+    """The county, county_state, state and total rollups of a typed preprocessed frame."""
+
+    def __init__(self, df):
+        df = df[df['County'].notna()]
+        county_codes, counties = pd.factorize(np.asarray(df['County'], dtype=object), sort=True)
+        state_codes, states = pd.factorize(np.asarray(df['State'].astype(object).fillna('Unknown')), sort=True)
+        self.counties = counties.tolist()
+        self.states = states.tolist()
+        self._positions = {county: pos for pos, county in enumerate(self.counties)}
+
+        month = month_numbers(df['Date'].values)
+        self.first_month = int(month.min())
+        month = month - self.first_month
+        epoch = (np.arange(month.max() + 1) + self.first_month - 1970 * 12).astype('datetime64[M]')
+        self.months = ((epoch + 1).astype('datetime64[D]') - 1).astype('datetime64[ns]')  # month ends
+
+        pairs, pair_codes = np.unique(county_codes.astype(np.int64) * len(states) + state_codes,
+                                      return_inverse=True)
+        self.pair_county = (pairs // len(states)).astype(np.int32)
+        self.pair_state = (pairs % len(states)).astype(np.int32)
+
+        values = {name: df[col].values.astype(np.float64) for name, col in MEASURES.items()}
+        self.county = Rollup.aggregate(county_codes, month, values, len(counties))
+        self.county_state = Rollup.aggregate(pair_codes, month, values, len(pairs))
+        self.state = Rollup.aggregate(state_codes, month, values, len(states))
+        self.total = Rollup.aggregate(np.zeros(len(month), dtype=np.int32), month, values, 1)
+
+    def position(self, county):
+        try:
+            return self._positions[county]
+        except KeyError:
+            raise KeyError(f"County '{county}' not found in dataset.") from None
+
+    def history(self, county):
+        """One row per month of ``county``: Date, the MEASURES columns and Cumulative EV."""
+        rows = self.county.rows(self.position(county))
+        frame = pd.DataFrame({'Date': self.months[self.county.month[rows]]})
+        for name, col in MEASURES.items():
+            frame[col] = self.county.measures[name][rows]
+        frame['Cumulative EV'] = frame[MEASURES['ev']].cumsum()
+        return frame
+
+    def state_counties(self):
+        """``{state: [county, ...]}`` of the counties with rows in each state."""
+        result = {state: [] for state in self.states}
+        for county, state in zip(self.pair_county, self.pair_state):
+            result[self.states[state]].append(self.counties[county])
+        return result
+
+    def totals(self):
+        """Each measure summed over the whole dataset."""
+        return {name: int(values.sum()) for name, values in self.total.measures.items()}
@@ -0,0 +1,213 @@
+"""Named timing spans for the app's script runs and the forecast hot path.
+
+    with timing.span('forecast'):
+        ...
+
+A span adds its wall time and one call to the process-wide totals (``PROCESS``)
+and to the run that is active in the current context, if any. app.py starts a
+run at the top of every script run and finishes it at the end, or before
+st.stop(). Streamlit runs every rerun on a new thread and context, so the app
+keeps its run in the session and hands it to the next ``start_run``: a run cut
+short by an exception or an interrupting rerun is finished then, releasing the
+profiler and exporting its spans. forecasting.predict is a span too, so every
+``model.predict`` call is counted.
+
+Environment switches, read when a run finishes or starts:
+
+    EV_APP_METRICS_DIR   after every run, rewrite <dir>/ev_app.prom with the process
+                         totals in Prometheus text format (node_exporter textfile
+                         collector) and append the run's spans to <dir>/spans.jsonl
+    EV_APP_PROFILE       profile one script run into this file; it is written only
+                         when it does not exist yet, so delete it to capture another
+    EV_APP_PROFILER      ``cprofile`` (default; pstats file, open with snakeviz or
+                         ``python -m pstats``) or ``sample`` (stacks of the script
+                         thread every 5 ms, written in folded flame-graph format)
+"""
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+
+class Timings:
+    """Call count, total and maximum wall time per span name, in first-seen order."""
+
+    def __init__(self):
+        self.stats = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        with self._lock:
+            stat = self.stats.get(name)
+            if stat is None:
+                self.stats[name] = [1, seconds, seconds]
+            else:
+                stat[0] += 1
+                stat[1] += seconds
+                stat[2] = max(stat[2], seconds)
+
+    def rows(self):
+        with self._lock:
+            return [{'span': name, 'calls': calls, 'seconds': total, 'max_seconds': longest}
+                    for name, (calls, total, longest) in self.stats.items()]
+
+    def prometheus(self, prefix='ev_app'):
+        """Totals as Prometheus counters labelled by span."""
+        rows = self.rows()
+        lines = []
+        for metric, key, kind, help_text in [
+            ('span_calls_total', 'calls', 'counter', 'Number of times the span was entered.'),
+            ('span_seconds_total', 'seconds', 'counter', 'Wall time spent in the span.'),
+            ('span_max_seconds', 'max_seconds', 'gauge', 'Longest single span.'),
+        ]:
+            lines += [f"# HELP {prefix}_{metric} {help_text}", f"# TYPE {prefix}_{metric} {kind}"]
+            lines += [f'{prefix}_{metric}{{span="{row["span"]}"}} {row[key]:.6g}' for row in rows]
+        return "\n".join(lines) + "\n"
+
+
+class Run(Timings):
+    """Spans of one script run."""
+
+    def __init__(self):
+        super().__init__()
+        self.started = time.time()
+        self._start = time.perf_counter()
+        self.wall = None
+        self.profiler = None
+
+    def to_json(self):
+        return json.dumps({'started': self.started, 'wall_seconds': self.wall, 'spans': self.rows()})
+
+
+PROCESS = Timings()
+_current = contextvars.ContextVar('ev_timing_run', default=None)
+_profiling = threading.Lock()  # one profiled run at a time
+
+
+@contextmanager
+def span(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PROCESS.add(name, elapsed)
+        run = _current.get()
+        if run is not None:
+            run.add(name, elapsed)
+
+
+def traced(name, fn, *args):
+    """``fn(*args)`` inside ``span(name)``, bound to the caller's run; for executor.submit."""
+    context = contextvars.copy_context()
+
+    def call():
+        with span(name):
+            return fn(*args)
+    return lambda: context.run(call)
+
+
+def start_run(previous=None):
+    """Begin a run in this context; ``previous`` (default: this context's last run) is finished if still open."""
+    previous = previous if previous is not None else _current.get()
+    if previous is not None and previous.wall is None:
+        finish_run(previous)
+    run = Run()
+    _current.set(run)
+    path = os.environ.get('EV_APP_PROFILE')
+    if path and not os.path.exists(path) and _profiling.acquire(blocking=False):
+        profiler = StackSampler() if os.environ.get('EV_APP_PROFILER') == 'sample' else _CProfiler()
+        profiler.path = path
+        profiler.start()
+        run.profiler = profiler
+    return run
+
+
+def finish_run(run):
+    """Close ``run``: record its wall time as the ``script`` span, write profiles and exports."""
+    if run.wall is not None:
+        return run
+    run.wall = time.perf_counter() - run._start
+    run.add('script', run.wall)
+    PROCESS.add('script', run.wall)
+    if run.profiler is not None:
+        try:
+            run.profiler.stop()
+            run.profiler.write(run.profiler.path)
+        finally:
+            run.profiler = None
+            _profiling.release()
+    export_dir = os.environ.get('EV_APP_METRICS_DIR')
+    if export_dir:
+        export(run, export_dir)
+    return run
+
+
+def export(run, directory):
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, 'ev_app.prom')
+    with open(target + '.tmp', 'w') as f:
+        f.write(PROCESS.prometheus())
+    os.replace(target + '.tmp', target)  # the collector never sees a half-written file
+    with open(os.path.join(directory, 'spans.jsonl'), 'a') as f:
+        f.write(run.to_json() + "\n")
+
+
+# === Profilers ===
+class _CProfiler:
+    """cProfile of the thread that started it (the script thread)."""
+
+    def __init__(self):
+        import cProfile
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def write(self, path):
+        self.profile.dump_stats(path)
+
+
+class StackSampler:
+    """Samples one thread's Python stack every ``interval`` seconds from a helper thread.
+
+    Cheaper than cProfile on call-heavy code and does not skew short functions;
+    the output is one ``frame;frame;... count`` line per distinct stack.
+    """
+
+    def __init__(self, thread_id=None, interval=0.005):
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name='ev-stack-sampler', daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, 'w') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")